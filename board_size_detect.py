@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 標定板尺寸自動偵測
+
+作者: Toby
+描述: 由少量樣本影像估計棋盤格的內角點數量。先在縮小的影像上找出黑色方格 (四邊形)，
+      相鄰的黑色方格在角落相接，依相接的方向推算每個方格的行列位置，得到方格的行列數；
+      再只以估計值與相鄰的少數尺寸呼叫 findChessboardCorners 確認。
+      設定錯誤時只需數十毫秒即可發現並修正，不必等整批影像檢測失敗
+日期: 2026/10/18
+"""
+
+import time
+from collections import Counter, deque
+
+from camera_calibration import cv2, np, read_gray_image
+
+
+# 分析用縮小影像的最長邊 (像素)
+ANALYSIS_SIZE = 800
+
+# 最小的內角點數量 (findChessboardCorners 的限制)
+MIN_CORNERS = 2
+
+# 四邊形數量上限，超過時視為雜亂影像不分析
+MAX_QUADS = 3000
+
+
+def downscale(gray, max_side=ANALYSIS_SIZE):
+    """
+    縮小影像到最長邊不超過 max_side
+    """
+    scale = min(1.0, max_side / max(gray.shape))
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def find_dark_quads(small):
+    """
+    找出影像中的深色四邊形 (棋盤格的黑色方格)
+
+    侵蝕一次讓在角落相接的黑色方格分開 (與 findChessboardCorners 的做法相同)。
+
+    回傳:
+        quads: 頂點座標 (Q,4,2)
+    """
+    block = max(3, (min(small.shape) // 8) | 1)
+    binary = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, block, 5)
+    binary = cv2.erode(binary, np.ones((3, 3), np.uint8), iterations=1)
+    contours, _ = cv2.findContours(binary, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+    quads = []
+    for contour in contours:
+        if cv2.contourArea(contour) < 16:
+            continue
+        approx = cv2.approxPolyDP(contour, 0.1 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            quads.append(approx.reshape(4, 2))
+    return np.array(quads, dtype=np.float64).reshape(-1, 4, 2)
+
+
+def estimate_board_size(gray):
+    """
+    以黑色方格的相接關係估計內角點數量
+
+    每個四邊形的頂點依所在象限 (相對於整體方向) 對應到對角方向的一步 (±1, ±1)；
+    兩個大小相近的四邊形有頂點相接且方向相反時為相鄰的黑色方格。
+    由最大的相連群組推算每個方格的行列位置，行列數減1即為內角點數量。
+
+    參數:
+        gray: 灰階影像
+
+    回傳:
+        board_size: 估計的內角點數量 (寬, 高)，寬為較接近影像水平方向的一邊；無法估計時為 None
+    """
+    quads = find_dark_quads(downscale(gray))
+    if len(quads) < 4 or len(quads) > MAX_QUADS:
+        return None
+
+    centers = quads.mean(axis=1)
+    sides = np.sqrt(np.abs(0.5 * np.sum(quads[:, :, 0] * np.roll(quads[:, :, 1], -1, axis=1)
+                                        - np.roll(quads[:, :, 0], -1, axis=1) * quads[:, :, 1], axis=1)))
+
+    # 整體方向: 所有邊的角度 (以4倍角平均，90度的倍數視為相同)
+    edges = (np.roll(quads, -1, axis=1) - quads).reshape(-1, 2)
+    theta = np.angle(np.exp(4j * np.arctan2(edges[:, 1], edges[:, 0])).mean()) / 4
+    rotation = np.array([[np.cos(theta), np.sin(theta)], [-np.sin(theta), np.cos(theta)]])
+    steps = np.where((quads - centers[:, None]) @ rotation.T >= 0, 1, -1).reshape(-1, 2)
+
+    vertices = quads.reshape(-1, 2)
+    owners = np.repeat(np.arange(len(quads)), 4)
+    limits = 0.5 * sides[owners]
+
+    # 依x排序後只比較x相近的頂點
+    order = np.argsort(vertices[:, 0])
+    sorted_x = vertices[order, 0]
+    neighbors = [[] for _ in range(len(quads))]
+    for position, i in enumerate(order):
+        end = np.searchsorted(sorted_x, sorted_x[position] + limits[i], side="right")
+        for j in order[position + 1:end]:
+            a, b = owners[i], owners[j]
+            if a == b or not 0.5 < sides[a] / sides[b] < 2.0:
+                continue
+            if np.linalg.norm(vertices[i] - vertices[j]) >= min(limits[i], limits[j]):
+                continue
+            if (steps[i] == -steps[j]).all():
+                neighbors[a].append((b, steps[i]))
+                neighbors[b].append((a, steps[j]))
+
+    # 最大的相連群組
+    best = {}
+    visited = set()
+    for start in range(len(quads)):
+        if start in visited:
+            continue
+        component = {start: (0, 0)}
+        visited.add(start)
+        queue = deque([start])
+        while queue:
+            a = queue.popleft()
+            for b, step in neighbors[a]:
+                if b not in component:
+                    component[b] = (component[a][0] + int(step[0]), component[a][1] + int(step[1]))
+                    visited.add(b)
+                    queue.append(b)
+        if len(component) > len(best):
+            best = component
+
+    if len(best) < 4:
+        return None
+    cells = np.array(list(best.values()))
+    columns, rows = cells.max(axis=0) - cells.min(axis=0) + 1
+    if columns - 1 < MIN_CORNERS or rows - 1 < MIN_CORNERS:
+        return None
+    return int(columns - 1), int(rows - 1)
+
+
+def candidate_sizes(estimates, configured=None):
+    """
+    依估計結果產生要確認的尺寸: 出現次數多的估計值優先，之後是各估計值 ±1 的尺寸，最後是目前的設定
+    """
+    candidates = []
+    ranked = [size for size, _ in Counter(estimates).most_common()]
+    for size in ranked:
+        candidates.append(size)
+    for width, height in ranked:
+        for dw, dh in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1), (-1, 1), (1, -1)]:
+            size = (width + dw, height + dh)
+            if min(size) >= MIN_CORNERS and size not in candidates:
+                candidates.append(size)
+    if configured is not None and tuple(configured) not in candidates:
+        candidates.append(tuple(configured))
+    return candidates
+
+
+def detect_board_size(sources, configured=None):
+    """
+    由樣本影像偵測標定板的內角點數量
+
+    參數:
+        sources: 樣本影像來源列表 (影像路徑、已編碼資料或已解碼影像)
+        configured: 目前設定的內角點數量 (寬, 高)，偵測結果只是方向相反時保留設定的方向
+
+    回傳:
+        result: board_size, estimates, trials, seconds 的字典；找不到時 board_size 為 None
+    """
+    start_time = time.perf_counter()
+    images = [image for image in (read_gray_image(source) for source in sources) if image is not None]
+    smalls = [downscale(image) for image in images]
+    estimates = [size for size in (estimate_board_size(image) for image in images) if size is not None]
+
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+    board_size = None
+    trials = 0
+    for size in candidate_sizes(estimates, configured):
+        for small in smalls:
+            trials += 1
+            found, _ = cv2.findChessboardCorners(small, size, flags=flags)
+            if found:
+                board_size = size
+                break
+        if board_size is not None:
+            break
+
+    if board_size is not None and configured is not None and tuple(configured) == board_size[::-1]:
+        board_size = tuple(configured)
+
+    return {
+        "board_size": board_size,
+        "estimates": estimates,
+        "trials": trials,
+        "seconds": time.perf_counter() - start_time
+    }
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 時間預算標定
+
+作者: Toby
+描述: 產線上每個工作站只有固定的時間。在時間預算內依「分散」順序檢測影像，
+      依影像覆蓋率與姿態多樣性排序已檢測的視角，定期重新標定，
+      時間到時回傳目前最好的結果、使用的視角數與信心指標
+日期: 2026/10/18
+"""
+
+import os
+import json
+import time
+import threading
+
+from camera_calibration import (cv2, np, CameraCalibration, collect_image_files, board_size_samples,
+                                default_result_path, print_summary)
+
+
+# 覆蓋率計算的影像網格 (寬, 高)
+COVERAGE_GRID = (8, 6)
+
+# 排序時多樣性相對於覆蓋率的權重
+DIVERSITY_WEIGHT = 0.5
+
+# 下一次標定至少需要的視角成長比例 (幾何排程，總標定成本約為最後一次的常數倍)
+SOLVE_GROWTH = 1.5
+
+# 標定時間預估的安全係數
+SOLVE_TIME_MARGIN = 1.3
+
+
+def spread_order(count):
+    """
+    分散的處理順序 (van der Corput 序列)：連續拍攝的影像通常很相似，
+    依 0, 1/2, 1/4, 3/4, ... 的位置取影像，任何時間點已處理的影像都大致均勻分布在整個拍攝過程中
+
+    參數:
+        count: 影像數量
+
+    回傳:
+        order: 索引列表
+    """
+    order = []
+    seen = set()
+    k = 0
+    while len(order) < count and k < 4 * count:
+        fraction, denominator, n = 0.0, 1.0, k
+        while n:
+            denominator *= 2.0
+            fraction += (n & 1) / denominator
+            n >>= 1
+        index = int(fraction * count)
+        if index not in seen:
+            seen.add(index)
+            order.append(index)
+        k += 1
+    order.extend(index for index in range(count) if index not in seen)
+    return order
+
+
+def view_features(corners, objp, image_size, grid=COVERAGE_GRID):
+    """
+    計算單一視角的覆蓋網格與姿態描述向量
+
+    參數:
+        corners: 角點座標 (N,1,2)
+        objp: 棋盤格三維座標 (N,3)
+        image_size: 影像尺寸 (寬度, 高度)
+        grid: 覆蓋率網格 (寬, 高)
+
+    回傳:
+        cells: 角點落入的網格索引集合
+        descriptor: (中心x, 中心y, 大小, 傾斜x, 傾斜y) 正規化描述向量
+    """
+    width, height = image_size
+    points = corners.reshape(-1, 2)
+    columns = np.clip((points[:, 0] / width * grid[0]).astype(int), 0, grid[0] - 1)
+    rows = np.clip((points[:, 1] / height * grid[1]).astype(int), 0, grid[1] - 1)
+    cells = set((rows * grid[0] + columns).tolist())
+
+    # 單應矩陣的透視項反映標定板相對影像平面的傾斜
+    model = objp[:, :2].astype(np.float64)
+    homography, _ = cv2.findHomography(model, points.astype(np.float64), 0)
+    extent = float(np.abs(model).max()) or 1.0
+    tilt = homography[2, :2] / homography[2, 2] * extent if homography is not None else np.zeros(2)
+
+    center = points.mean(axis=0) / np.array([width, height], dtype=np.float64)
+    size = np.sqrt(cv2.contourArea(cv2.convexHull(points.astype(np.float32))) / (width * height))
+    descriptor = np.array([center[0], center[1], size, tilt[0], tilt[1]], dtype=np.float64)
+    return cells, descriptor
+
+
+def prioritize_views(features, grid=COVERAGE_GRID):
+    """
+    依覆蓋率與多樣性排序視角 (貪婪選擇)
+
+    每一步選擇「新增覆蓋網格比例 + 權重 x 與已選視角的最小描述向量距離」最大的視角。
+
+    參數:
+        features: view_features() 結果的列表
+
+    回傳:
+        order: 視角索引列表 (優先順序由高到低)
+    """
+    total_cells = grid[0] * grid[1]
+    descriptors = np.array([descriptor for _, descriptor in features])
+    remaining = list(range(len(features)))
+    min_distance = np.full(len(features), np.inf)
+    covered = set()
+    order = []
+
+    while remaining:
+        best_index = None
+        best_score = -np.inf
+        for index in remaining:
+            gain = len(features[index][0] - covered) / total_cells
+            diversity = 0.0 if not order else min(min_distance[index], 1.0)
+            score = gain + DIVERSITY_WEIGHT * diversity
+            if score > best_score:
+                best_index, best_score = index, score
+
+        order.append(best_index)
+        remaining.remove(best_index)
+        covered |= features[best_index][0]
+        distance = np.linalg.norm(descriptors - descriptors[best_index], axis=1)
+        min_distance = np.minimum(min_distance, distance)
+
+    return order
+
+
+class AnytimeCalibration:
+    """
+    時間預算內的隨時可中止標定
+
+    檢測與標定交錯進行：視角數量成長到上次標定的 SOLVE_GROWTH 倍時，
+    以優先順序最高的視角重新標定 (以上一次結果為初始值)，
+    只有預估能在截止時間前完成時才開始標定。
+    標定在獨立的物件與執行緒中進行 (OpenCV 計算時會釋放GIL)，截止時間到仍未完成就放棄，
+    目前最好的結果只會被完成的標定取代。
+    """
+
+    def __init__(self, calibrator, budget):
+        """
+        初始化
+
+        參數:
+            calibrator: CameraCalibration 物件 (標定結果寫入此物件)
+            budget: 時間預算 (秒)
+        """
+        self.calibrator = calibrator
+        self.budget = float(budget)
+        self.candidates = []       # (影像名稱, 角點座標)
+        self.features = []         # 對應的 view_features()
+        self.history = []          # 每次標定的 (視角數, fx, fy, cx, cy, RMS)
+        self.seconds_per_view = None
+        self.images_detected = 0
+        self.images_total = 0
+        self.coverage = 0.0
+        self.abandoned_solves = 0
+
+    def _remaining(self, deadline):
+        return deadline - time.perf_counter()
+
+    def _estimate_solve_seconds(self, views):
+        if self.seconds_per_view is None:
+            return 0.0
+        return self.seconds_per_view * views * SOLVE_TIME_MARGIN
+
+    def _solve(self, deadline):
+        """
+        以優先順序最高、且預估能在截止時間前完成的視角重新標定
+
+        回傳:
+            solved: 是否完成一次標定
+        """
+        calibrator = self.calibrator
+        order = prioritize_views(self.features)
+
+        views = len(order)
+        if self.seconds_per_view is not None:
+            affordable = int(self._remaining(deadline) / (self.seconds_per_view * SOLVE_TIME_MARGIN))
+            views = min(views, affordable)
+        previous_views = self.history[-1][0] if self.history else 0
+        if views < calibrator.min_images or views <= previous_views:
+            return False
+
+        selected = order[:views]
+        solver = CameraCalibration(calibrator.get_settings(), verbose=False)
+        solver.image_size = calibrator.image_size
+        for index in selected:
+            name, corners = self.candidates[index]
+            solver.add_view(corners, name)
+        if self.history:
+            solver.camera_matrix = calibrator.camera_matrix.copy()
+            solver.distortion_coeffs = calibrator.distortion_coeffs.copy()
+
+        outcome = {}
+        thread = threading.Thread(
+            target=lambda: outcome.update(ok=solver.calibrate_camera(solver.image_size,
+                                                                     warm_start=bool(self.history))),
+            daemon=True)
+        start_time = time.perf_counter()
+        thread.start()
+        thread.join(max(self._remaining(deadline), 0.0))
+        if thread.is_alive():
+            # 截止時間到仍未完成: 保留上一次的結果
+            self.abandoned_solves += 1
+            return False
+        if not outcome.get("ok"):
+            return False
+        self.seconds_per_view = (time.perf_counter() - start_time) / views
+
+        calibrator.corner_store = solver.corner_store
+        calibrator.camera_matrix = solver.camera_matrix
+        calibrator.distortion_coeffs = solver.distortion_coeffs
+        calibrator.rvecs = solver.rvecs
+        calibrator.tvecs = solver.tvecs
+        calibrator.rms_error = solver.rms_error
+
+        covered = set()
+        for index in selected:
+            covered |= self.features[index][0]
+        self.coverage = len(covered) / (COVERAGE_GRID[0] * COVERAGE_GRID[1])
+
+        matrix = calibrator.camera_matrix
+        self.history.append((views, matrix[0, 0], matrix[1, 1], matrix[0, 2], matrix[1, 2],
+                             calibrator.rms_error))
+        return True
+
+    def run(self, image_files, on_solve=None):
+        """
+        在時間預算內執行檢測與標定
+
+        參數:
+            image_files: 影像檔案路徑列表
+            on_solve: 每次標定完成時呼叫 (可選)，參數為 (self, 已耗時秒數)
+
+        回傳:
+            summary: confidence_summary() 的結果，沒有任何標定結果時為 None
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + self.budget
+        calibrator = self.calibrator
+        self.images_total = len(image_files)
+        # 自動偵測內角點數量時先以平均取樣的影像固定 (計入時間預算)
+        calibrator.ensure_board_size(board_size_samples(image_files))
+
+        def next_images():
+            for position in spread_order(len(image_files)):
+                # 保留下一次標定所需的時間
+                next_views = max(calibrator.min_images,
+                                 int(np.ceil(len(self.candidates) * SOLVE_GROWTH)))
+                if self._remaining(deadline) <= self._estimate_solve_seconds(next_views) or self.abandoned_solves:
+                    return
+                yield image_files[position], image_files[position]
+
+        # 設定檢測時限時以單一看門狗程序依序檢測，下一張影像仍在前一張處理完後才決定
+        calibrator.detection_failures = {}
+        detections = calibrator.iter_views(next_images(), workers=1)
+        try:
+            for _, views in detections:
+                self.images_detected += 1
+                for view_name, corners in views:
+                    self.candidates.append((view_name, corners))
+                    self.features.append(view_features(corners, calibrator.objp, calibrator.image_size))
+
+                solved_views = self.history[-1][0] if self.history else 0
+                if (len(self.candidates) >= calibrator.min_images
+                        and len(self.candidates) >= solved_views * SOLVE_GROWTH):
+                    if self._solve(deadline) and on_solve is not None:
+                        on_solve(self, time.perf_counter() - start_time)
+        finally:
+            detections.close()
+
+        # 時間允許時以所有已檢測的視角做最後一次標定
+        if (self.candidates and not self.abandoned_solves and self._remaining(deadline) > 0
+                and (not self.history or self.history[-1][0] < len(self.candidates))):
+            if self._solve(deadline) and on_solve is not None:
+                on_solve(self, time.perf_counter() - start_time)
+
+        if not self.history:
+            return None
+        summary = self.confidence_summary()
+        summary["elapsed_seconds"] = time.perf_counter() - start_time
+        return summary
+
+    def confidence_summary(self):
+        """
+        目前最佳結果的信心指標
+
+        參數變化率為最後兩次標定的 fx, fy, cx, cy 最大相對變化 (只有一次標定時為 None)。
+        信心為「高」: 參數變化 < 1%、覆蓋率 >= 50% 且 RMS 未超過閾值；
+        「中」: RMS 未超過閾值且參數變化 < 5% (或仍只有一次標定但已用完所有影像)；其餘為「低」。
+
+        回傳:
+            summary: views_used, views_detected, images_detected, images_total,
+                     coverage, parameter_change, abandoned_solves, confidence 的字典
+        """
+        views, *intrinsics, rms = self.history[-1]
+        change = None
+        if len(self.history) >= 2:
+            previous = np.array(self.history[-2][1:5])
+            change = float(np.max(np.abs(np.array(intrinsics) - previous) / np.abs(previous)))
+
+        within_threshold = rms <= self.calibrator.error_threshold
+        all_used = views == len(self.candidates) and self.images_detected == self.images_total
+        if within_threshold and change is not None and change < 0.01 and self.coverage >= 0.5:
+            confidence = "高"
+        elif within_threshold and ((change is not None and change < 0.05) or all_used):
+            confidence = "中"
+        else:
+            confidence = "低"
+
+        return {
+            "views_used": views,
+            "views_detected": len(self.candidates),
+            "images_detected": self.images_detected,
+            "images_total": self.images_total,
+            "coverage": self.coverage,
+            "parameter_change": change,
+            "abandoned_solves": self.abandoned_solves,
+            "confidence": confidence
+        }
+
+
+def run_anytime(calibrator, images_folder, budget):
+    """
+    命令行時間預算模式：時間到時儲存目前最好的結果
+
+    參數:
+        calibrator: CameraCalibration 物件
+        images_folder: 影像資料夾
+        budget: 時間預算 (秒)
+    """
+    image_files = collect_image_files(images_folder)
+    if not image_files:
+        print("錯誤: 在指定資料夾中找不到影像檔案")
+        return
+
+    def on_solve(anytime, elapsed):
+        views, fx, fy, cx, cy, rms = anytime.history[-1]
+        print(f"[{elapsed:6.2f} 秒] 使用 {views} 個視角，RMS {rms:.4f} 像素，"
+              f"fx={fx:.2f} fy={fy:.2f} cx={cx:.2f} cy={cy:.2f}")
+
+    print(f"\n時間預算: {budget:.1f} 秒，共 {len(image_files)} 個影像")
+    verbose = calibrator.verbose
+    calibrator.verbose = False
+    try:
+        anytime = AnytimeCalibration(calibrator, budget)
+        summary = anytime.run(image_files, on_solve)
+    finally:
+        calibrator.verbose = verbose
+
+    if summary is None:
+        print(f"時間內成功檢測的影像不足 {calibrator.min_images} 張，未產生標定結果")
+        return
+
+    change = summary["parameter_change"]
+    print(f"\n耗時 {summary['elapsed_seconds']:.2f} 秒，已檢測 {summary['images_detected']}/{summary['images_total']} 個影像，"
+          f"使用 {summary['views_used']}/{summary['views_detected']} 個視角")
+    print(f"影像覆蓋率: {summary['coverage'] * 100:.0f}%，"
+          f"參數變化率: {'-' if change is None else f'{change * 100:.2f}%'}，信心: {summary['confidence']}")
+    if summary["abandoned_solves"]:
+        print("最後一次標定未能在時間內完成，保留前一次的結果")
+
+    calibrator.print_results()
+    output_file = default_result_path()
+    calibration_data = calibrator.get_result_data()
+    calibration_data["時間預算標定"] = {
+        "時間預算_秒": budget,
+        "實際耗時_秒": round(summary["elapsed_seconds"], 3),
+        "已檢測影像數量": summary["images_detected"],
+        "影像總數": summary["images_total"],
+        "成功檢測視角數量": summary["views_detected"],
+        "影像覆蓋率": round(summary["coverage"], 3),
+        "參數變化率": None if change is None else round(change, 5),
+        "逾時放棄的標定次數": summary["abandoned_solves"],
+        "信心指標": summary["confidence"]
+    }
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(calibration_data, f, ensure_ascii=False, indent=4)
+    print_summary(calibrator, output_file)
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 批次模式
+
+作者: Toby
+描述: 依據清單檔對多台相機的影像資料夾進行批次標定，共用工作執行緒池並支援中斷後續跑
+日期: 2026/10/18
+
+清單檔格式 (JSON)，鍵名與GUI的 ui_settings.json 相同:
+{
+    "defaults": {"board_width": 11, "board_height": 7, "square_size": 30.0},
+    "cameras": [
+        {"name": "cam01", "image_folder": "cam01/image"},
+        {"name": "cam02", "image_folder": "D:/line2/cam02", "distortion_coeffs_count": 8}
+    ]
+}
+"""
+
+import sys
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+try:
+    from camera_calibration import CameraCalibration, collect_image_files, board_size_samples
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# 每台相機輸出資料夾中的檔案名稱
+CHECKPOINT_FILE = "checkpoint.json"
+RESULT_FILE = "camera_calibration.json"
+SUMMARY_FILE = "batch_summary.json"
+
+# 每完成多少張影像的檢測就寫入一次檢查點
+CHECKPOINT_INTERVAL = 10
+
+
+def load_manifest(manifest_path):
+    """
+    讀取批次清單檔
+
+    參數:
+        manifest_path: 清單檔路徑 (JSON)
+
+    回傳:
+        cameras: 相機設定列表，每項包含 name, image_folder, settings
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = manifest.get("defaults", {})
+
+    cameras = []
+    names = set()
+    for index, entry in enumerate(manifest.get("cameras", [])):
+        if "image_folder" not in entry:
+            raise ValueError(f"清單第 {index + 1} 台相機缺少 image_folder")
+
+        name = entry.get("name", f"camera_{index + 1:02d}")
+        if name in names:
+            raise ValueError(f"清單中相機名稱重複: {name}")
+        names.add(name)
+
+        # 相對路徑以清單檔所在位置為基準
+        image_folder = os.path.normpath(os.path.join(manifest_dir, entry["image_folder"]))
+
+        # 相機設定覆寫共用預設值
+        settings = dict(defaults)
+        settings.update({k: v for k, v in entry.items() if k not in ("name", "image_folder")})
+
+        cameras.append({"name": name, "image_folder": image_folder, "settings": settings})
+
+    if not cameras:
+        raise ValueError("清單中沒有任何相機")
+
+    return cameras
+
+
+class CameraJob:
+    """
+    單台相機的批次標定工作
+
+    記錄每張影像的檢測結果，並定期寫入檢查點，
+    中斷後重新執行時只處理尚未檢測的影像。
+    """
+
+    def __init__(self, spec, output_dir):
+        """
+        初始化相機工作
+
+        參數:
+            spec: load_manifest 回傳的相機設定
+            output_dir: 批次輸出資料夾
+        """
+        self.name = spec["name"]
+        self.image_folder = spec["image_folder"]
+        self.settings = spec["settings"]
+        self.effective_settings = None  # 合併 config.ini 後實際使用的參數 (由 prepare 設定)
+        self.job_dir = os.path.join(output_dir, self.name)
+        self.checkpoint_path = os.path.join(self.job_dir, CHECKPOINT_FILE)
+        self.result_file = os.path.join(self.job_dir, RESULT_FILE)
+
+        self.calibrator = None
+        self.image_files = []
+        self.detections = {}      # 檔名 -> [(視角名稱, 角點座標列表)] (未找到角點為空列表)
+        self.image_size = None
+        self.status = "pending"   # pending / detecting / done / failed
+        self.error = None
+        self.summary = {}
+
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._remaining = 0
+
+    def prepare(self, base_settings, restart=False):
+        """
+        建立標定器、載入檢查點並列出待處理影像
+
+        參數:
+            base_settings: 共用的基本參數 (來自 config.ini)
+            restart: 是否忽略既有檢查點重新開始
+
+        回傳:
+            pending: 尚未檢測的影像路徑列表
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+
+        # 以注入設定建立標定器，不輸出逐張影像的訊息
+        settings = dict(base_settings)
+        settings.update(self.settings)
+        self.calibrator = CameraCalibration(settings)
+        self.effective_settings = self.calibrator.get_settings()
+
+        if not restart:
+            self.load_checkpoint()
+        if self.status == "done":
+            return []
+
+        if not os.path.exists(self.image_folder):
+            raise FileNotFoundError(f"影像資料夾不存在: {self.image_folder}")
+
+        self.image_files = collect_image_files(self.image_folder)
+        if not self.image_files:
+            raise FileNotFoundError(f"在資料夾中找不到影像檔案: {self.image_folder}")
+
+        # 自動偵測內角點數量時，在平行檢測前以平均取樣的影像固定一次
+        self.calibrator.ensure_board_size(board_size_samples(self.image_files))
+
+        self.status = "detecting"
+        pending = [path for path in self.image_files if os.path.basename(path) not in self.detections]
+        self._remaining = len(pending)
+        return pending
+
+    def load_checkpoint(self):
+        """
+        載入檢查點 (實際使用的標定參數不同時捨棄，包含 config.ini 的變更)
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return
+
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            print(f"[{self.name}] 檢查點讀取錯誤，重新開始: {e}")
+            return
+
+        if checkpoint.get("settings") != self.effective_settings or checkpoint.get("image_folder") != self.image_folder:
+            print(f"[{self.name}] 標定參數已變更，捨棄舊檢查點")
+            return
+
+        self.detections = checkpoint.get("detections", {})
+        self.image_size = tuple(checkpoint["image_size"]) if checkpoint.get("image_size") else None
+        if checkpoint.get("status") == "done" and os.path.exists(self.result_file):
+            self.status = "done"
+            self.summary = checkpoint.get("summary", {})
+
+        print(f"[{self.name}] 載入檢查點: 已檢測 {len(self.detections)} 張影像")
+
+    def save_checkpoint(self):
+        """
+        寫入檢查點 (先寫暫存檔再取代，避免中斷時損毀)
+        """
+        with self._lock:
+            checkpoint = {
+                "image_folder": self.image_folder,
+                "settings": self.effective_settings,
+                "status": self.status,
+                "image_size": list(self.image_size) if self.image_size else None,
+                "detections": dict(self.detections),
+                "summary": self.summary
+            }
+            self._unsaved = 0
+
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def record_detection(self, image_path, views):
+        """
+        記錄單張影像的檢測結果
+
+        參數:
+            image_path: 影像路徑
+            views: CameraCalibration.detect_views 回傳的視角列表 (未找到角點為空列表)
+        """
+        with self._lock:
+            self.detections[os.path.basename(image_path)] = [
+                (view_name, corners.reshape(-1, 2).tolist()) for view_name, corners in views
+            ]
+            if self.image_size is None and self.calibrator.image_size is not None:
+                self.image_size = self.calibrator.image_size
+            self._unsaved += 1
+            self._remaining -= 1
+            should_save = self._unsaved >= CHECKPOINT_INTERVAL
+            done_count = len(self.detections)
+
+        if should_save:
+            self.save_checkpoint()
+            print(f"[{self.name}] 檢測進度: {done_count}/{len(self.image_files)}")
+
+    def detect_with_watchdog(self, pending, cancel_event=None):
+        """
+        以看門狗程序池檢測所有待檢測影像後標定 (設定檢測時限時使用，整台相機占用一個工作執行緒)
+
+        逾時或崩潰的影像記錄在標定器的 detection_failures，並視為未找到角點。
+
+        參數:
+            pending: 尚未檢測的影像路徑列表
+            cancel_event: threading.Event (可選)，設定後停止檢測並保留進度
+
+        回傳:
+            success: 是否標定成功 (中斷時為 False)
+        """
+        for image_path, views in self.calibrator.iter_views([(path, path) for path in pending], cancel_event):
+            self.record_detection(image_path, views)
+        if not self.detection_complete():
+            return False
+        self.save_checkpoint()
+        return self.solve()
+
+    def detection_complete(self):
+        """
+        是否所有影像都已完成檢測
+        """
+        with self._lock:
+            return self._remaining == 0
+
+    def solve(self):
+        """
+        以已檢測的角點執行標定並儲存結果
+
+        回傳:
+            success: 是否標定成功
+        """
+        calibrator = self.calibrator
+        calibrator.corner_store.clear()
+
+        # 依檔名排序，確保續跑與一次跑完的結果相同
+        successful_images = 0
+        for name in sorted(self.detections):
+            views = self.detections[name]
+            for view_name, corners in views:
+                calibrator.add_view(corners, view_name)
+            if views:
+                successful_images += 1
+
+        view_count = len(calibrator.corner_store)
+        print(f"\n[{self.name}] 檢測完成: {successful_images}/{len(self.detections)} 個影像"
+              + (f"，{view_count} 個標定板視角" if calibrator.max_boards > 1 else ""))
+
+        if view_count < calibrator.min_images:
+            raise RuntimeError(f"成功檢測的視角不足 {calibrator.min_images} 個 ({view_count} 個)")
+        if self.image_size is None:
+            raise RuntimeError("無法取得影像尺寸")
+
+        if not calibrator.calibrate_camera(self.image_size):
+            raise RuntimeError("相機標定失敗")
+        if not calibrator.save_results(self.result_file):
+            raise RuntimeError("保存結果失敗")
+
+        self.summary = {
+            "使用影像數量": view_count,
+            "RMS重投影誤差": float(calibrator.rms_error),
+            "fx_像素焦距": float(calibrator.camera_matrix[0, 0]),
+            "fy_像素焦距": float(calibrator.camera_matrix[1, 1]),
+            "cx_主點": float(calibrator.camera_matrix[0, 2]),
+            "cy_主點": float(calibrator.camera_matrix[1, 2])
+        }
+        self.status = "done"
+        self.save_checkpoint()
+        return True
+
+    def fail(self, error):
+        """
+        標記工作失敗 (保留檢測結果供下次續跑)
+
+        參數:
+            error: 錯誤原因
+        """
+        self.status = "failed"
+        self.error = str(error)
+        print(f"\n[{self.name}] ❌ 標定失敗: {self.error}")
+        if self.calibrator is not None and os.path.isdir(self.job_dir):
+            self.save_checkpoint()
+
+
+class BatchScheduler:
+    """
+    批次標定排程器
+
+    所有相機的影像檢測與標定計算共用同一個執行緒池。
+    OpenCV 在計算期間會釋放GIL，因此執行緒即可平行運算，
+    並可直接共用各相機的標定器物件。
+    """
+
+    def __init__(self, cameras, output_dir, workers=None, restart=False):
+        """
+        初始化排程器
+
+        參數:
+            cameras: load_manifest 回傳的相機設定列表
+            output_dir: 批次輸出資料夾
+            workers: 工作執行緒數量 (預設為CPU核心數)
+            restart: 是否忽略既有檢查點重新開始
+        """
+        self.output_dir = output_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.restart = restart
+        self.jobs = [CameraJob(spec, output_dir) for spec in cameras]
+        self._stop_event = threading.Event()
+
+        # 清單未設定的參數沿用 config.ini
+        self.base_settings = CameraCalibration(verbose=False).get_settings()
+
+    def run(self):
+        """
+        執行批次標定
+
+        回傳:
+            summary_path: 總結檔案路徑
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        print(f"批次標定: {len(self.jobs)} 台相機，{self.workers} 個工作執行緒")
+        print(f"輸出資料夾: {self.output_dir}")
+
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                # 依相機順序排入檢測工作，前面的相機先完成檢測後，
+                # 其標定計算會與後續相機的檢測同時進行
+                for job in self.jobs:
+                    try:
+                        pending = job.prepare(self.base_settings, self.restart)
+                    except Exception as e:
+                        job.fail(e)
+                        continue
+
+                    if job.status == "done":
+                        print(f"[{job.name}] 已完成，略過")
+                    elif not pending:
+                        futures[pool.submit(job.solve)] = (job, None)
+                    elif job.calibrator.detection_timeout > 0:
+                        print(f"[{job.name}] 待檢測 {len(pending)} 張影像 (單張檢測時限 "
+                              f"{job.calibrator.detection_timeout:g} 秒)")
+                        future = pool.submit(job.detect_with_watchdog, pending, self._stop_event)
+                        futures[future] = (job, None)
+                    else:
+                        print(f"[{job.name}] 待檢測 {len(pending)} 張影像")
+                        for image_path in pending:
+                            future = pool.submit(job.calibrator.detect_views, image_path)
+                            futures[future] = (job, image_path)
+
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job, image_path = futures.pop(future)
+                        if job.status == "failed":
+                            continue
+
+                        if image_path is None:
+                            # 標定計算 (或看門狗檢測與標定) 完成
+                            try:
+                                future.result()
+                            except Exception as e:
+                                job.fail(e)
+                            continue
+
+                        try:
+                            views = future.result()
+                        except Exception as e:
+                            print(f"[{job.name}] 檢測錯誤 {os.path.basename(image_path)}: {e}")
+                            views = []
+                        job.record_detection(image_path, views)
+
+                        if job.detection_complete():
+                            job.save_checkpoint()
+                            futures[pool.submit(job.solve)] = (job, None)
+
+            except KeyboardInterrupt:
+                # 取消尚未開始的工作並保存進度，下次執行時自動續跑
+                self._stop_event.set()
+                for future in futures:
+                    future.cancel()
+                for job in self.jobs:
+                    if job.status == "detecting":
+                        job.save_checkpoint()
+                print("\n批次已中斷，進度已保存，重新執行相同指令即可續跑")
+                raise
+
+        return self.write_summary()
+
+    def write_summary(self):
+        """
+        寫入批次總結檔案
+
+        回傳:
+            summary_path: 總結檔案路徑
+        """
+        cameras = []
+        for job in self.jobs:
+            entry = {
+                "名稱": job.name,
+                "影像資料夾": job.image_folder,
+                "狀態": "完成" if job.status == "done" else "失敗"
+            }
+            if job.status == "done":
+                entry.update(job.summary)
+                entry["結果檔案"] = job.result_file
+            else:
+                entry["錯誤"] = job.error or "未完成"
+            cameras.append(entry)
+
+        summary = {
+            "批次時間": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "相機數量": len(self.jobs),
+            "成功數量": sum(1 for job in self.jobs if job.status == "done"),
+            "相機": cameras
+        }
+
+        summary_path = os.path.join(self.output_dir, SUMMARY_FILE)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=4)
+
+        print("\n" + "=" * 60)
+        print("批次標定總結")
+        print("=" * 60)
+        for entry in cameras:
+            if entry["狀態"] == "完成":
+                print(f"  ✅ {entry['名稱']}: RMS {entry['RMS重投影誤差']:.4f} 像素，"
+                      f"使用 {entry['使用影像數量']} 張影像")
+            else:
+                print(f"  ❌ {entry['名稱']}: {entry['錯誤']}")
+        print(f"\n成功 {summary['成功數量']}/{summary['相機數量']} 台，總結已儲存至: {summary_path}")
+
+        return summary_path
+
+
+def main():
+    """
+    批次模式主程式
+    """
+    parser = argparse.ArgumentParser(description="多相機批次內參標定")
+    parser.add_argument("manifest", help="相機清單檔 (JSON)")
+    parser.add_argument("--output", help="輸出資料夾 (預設為 result/batch_<清單檔名>)")
+    parser.add_argument("--workers", type=int, default=None, help="工作執行緒數量 (預設為CPU核心數)")
+    parser.add_argument("--restart", action="store_true", help="忽略既有檢查點，全部重新處理")
+    args = parser.parse_args()
+
+    try:
+        cameras = load_manifest(args.manifest)
+    except Exception as e:
+        print(f"清單檔讀取錯誤: {e}")
+        return
+
+    output_dir = args.output
+    if not output_dir:
+        # 固定的輸出資料夾，重新執行時才能找到檢查點續跑
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        manifest_name = os.path.splitext(os.path.basename(args.manifest))[0]
+        output_dir = os.path.join(script_dir, "result", f"batch_{manifest_name}")
+
+    scheduler = BatchScheduler(cameras, output_dir, workers=args.workers, restart=args.restart)
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 收斂提前停止
+
+作者: Toby
+描述: 依「分散」順序分批檢測影像，每批之後以 calibrateCameraExtended 重新標定，
+      追蹤 fx, fy, cx, cy 與畸變的變化量及標準差；全部穩定在容許範圍內時停止，
+      其餘影像完全不讀取也不解碼
+日期: 2026/10/18
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_calibration import (cv2, np, collect_image_files, board_size_samples,
+                                default_result_path, print_summary)
+from calibration_anytime import spread_order
+
+
+# 預設容許範圍
+DEFAULT_BATCH_SIZE = 5
+DEFAULT_FOCAL_TOLERANCE = 0.005     # fx, fy 的相對變化量與相對標準差
+DEFAULT_CENTER_TOLERANCE = 3.0      # cx, cy 的變化量與標準差 (像素)
+DEFAULT_DISTORTION_TOLERANCE = 0.5  # 畸變造成的影像位置變化 (像素)
+
+# 比較畸變時最多使用的取樣點數
+DISTORTION_SAMPLES = 2000
+
+
+def distortion_change(camera_matrix, previous_coeffs, current_coeffs, pixels):
+    """
+    兩組畸變係數在取樣位置上造成的最大位置差異
+
+    高階係數彼此高度相關，單一係數可能大幅變動而整體畸變幾乎不變，
+    因此比較畸變模型本身的效果：以相同內參投影取樣點，取兩者的最大距離。
+    取樣點使用已檢測的角點位置，沒有資料的影像角落由外插決定，不列入比較。
+
+    參數:
+        camera_matrix: 相機內參矩陣
+        previous_coeffs: 上一次的畸變係數
+        current_coeffs: 目前的畸變係數
+        pixels: 取樣的影像座標 (N,2)
+
+    回傳:
+        change: 最大位置差異 (像素)
+    """
+    normalized = (pixels - camera_matrix[:2, 2]) / np.diag(camera_matrix)[:2]
+    rays = np.hstack([normalized, np.ones((len(normalized), 1))])
+
+    zero = np.zeros(3)
+    before, _ = cv2.projectPoints(rays, zero, zero, camera_matrix, previous_coeffs)
+    after, _ = cv2.projectPoints(rays, zero, zero, camera_matrix, current_coeffs)
+    return float(np.linalg.norm(before.reshape(-1, 2) - after.reshape(-1, 2), axis=1).max())
+
+
+class ConvergenceCalibration:
+    """
+    分批檢測並在參數收斂時提前停止的標定
+
+    收斂條件 (與上一批的結果比較，全部成立):
+    - fx, fy: 相對變化量與相對標準差都不超過 focal_tolerance
+    - cx, cy: 變化量與標準差都不超過 center_tolerance 像素
+    - 畸變: 在已檢測角點位置上的 distortion_change() 不超過 distortion_tolerance 像素
+    """
+
+    def __init__(self, calibrator, batch_size=DEFAULT_BATCH_SIZE, focal_tolerance=DEFAULT_FOCAL_TOLERANCE,
+                 center_tolerance=DEFAULT_CENTER_TOLERANCE, distortion_tolerance=DEFAULT_DISTORTION_TOLERANCE,
+                 workers=None):
+        """
+        初始化
+
+        參數:
+            calibrator: CameraCalibration 物件 (標定結果寫入此物件)
+            batch_size: 每批檢測的影像數量
+            focal_tolerance: fx, fy 的相對容許值
+            center_tolerance: cx, cy 的容許值 (像素)
+            distortion_tolerance: 畸變的容許值 (像素)
+            workers: 每批平行檢測的執行緒數量 (None 表示CPU核心數)
+        """
+        self.calibrator = calibrator
+        self.batch_size = max(1, int(batch_size))
+        self.focal_tolerance = float(focal_tolerance)
+        self.center_tolerance = float(center_tolerance)
+        self.distortion_tolerance = float(distortion_tolerance)
+        self.workers = workers or os.cpu_count() or 1
+        self.history = []          # 每批標定的紀錄字典
+        self.images_decoded = 0
+        self.images_total = 0
+        self.converged = False
+
+    def _check(self, previous_matrix, previous_coeffs):
+        """
+        比較本批與上一批的標定結果
+
+        回傳:
+            record: 本批的變化量、標準差與是否收斂
+        """
+        calibrator = self.calibrator
+        matrix = calibrator.camera_matrix
+        std = calibrator.std_intrinsics
+        intrinsics = np.array([matrix[0, 0], matrix[1, 1], matrix[0, 2], matrix[1, 2]])
+
+        record = {
+            "views": len(calibrator.corner_store),
+            "images_decoded": self.images_decoded,
+            "rms": float(calibrator.rms_error),
+            "intrinsics": intrinsics.tolist(),
+            "focal_std": float(np.max(std[:2] / intrinsics[:2])),
+            "center_std": float(np.max(std[2:4])),
+            "focal_change": None,
+            "center_change": None,
+            "distortion_change": None,
+            "converged": False
+        }
+        if previous_matrix is None:
+            return record
+
+        previous = np.array([previous_matrix[0, 0], previous_matrix[1, 1],
+                             previous_matrix[0, 2], previous_matrix[1, 2]])
+        record["focal_change"] = float(np.max(np.abs(intrinsics[:2] - previous[:2]) / previous[:2]))
+        record["center_change"] = float(np.max(np.abs(intrinsics[2:] - previous[2:])))
+        pixels = calibrator.corner_store.valid_points().reshape(-1, 2).astype(np.float64)
+        step = max(1, len(pixels) // DISTORTION_SAMPLES)
+        record["distortion_change"] = distortion_change(matrix, previous_coeffs, calibrator.distortion_coeffs,
+                                                        pixels[::step])
+        record["converged"] = (max(record["focal_change"], record["focal_std"]) <= self.focal_tolerance
+                               and max(record["center_change"], record["center_std"]) <= self.center_tolerance
+                               and record["distortion_change"] <= self.distortion_tolerance)
+        return record
+
+    def run(self, image_files, on_batch=None):
+        """
+        分批檢測與標定，收斂時停止
+
+        參數:
+            image_files: 影像檔案路徑列表
+            on_batch: 每批標定完成時呼叫 (可選)，參數為 (self, 本批紀錄)
+
+        回傳:
+            success: 是否產生標定結果
+        """
+        calibrator = self.calibrator
+        calibrator.corner_store.clear()
+        # 自動偵測內角點數量時，在平行檢測前以平均取樣的影像固定一次
+        calibrator.ensure_board_size(board_size_samples(image_files))
+        self.images_total = len(image_files)
+        order = spread_order(len(image_files))
+        previous_matrix = previous_coeffs = None
+
+        # 設定檢測時限時所有影像經由同一個看門狗程序池檢測
+        calibrator.detection_failures = {}
+        watchdog_views = None
+        finished = {}
+        if calibrator.detection_timeout > 0:
+            watchdog_views = calibrator.iter_views([(image_files[index], image_files[index]) for index in order],
+                                                   workers=self.workers)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for start in range(0, len(order), self.batch_size):
+                    batch = [image_files[index] for index in order[start:start + self.batch_size]]
+                    if watchdog_views is not None:
+                        # 看門狗依完成順序回傳，收齊整批後依原本順序加入
+                        while any(path not in finished for path in batch):
+                            image_path, views = next(watchdog_views)
+                            finished[image_path] = views
+                        batch_views = [finished.pop(path) for path in batch]
+                    else:
+                        batch_views = executor.map(calibrator.detect_views, batch)
+                    for views in batch_views:
+                        self.images_decoded += 1
+                        for view_name, corners in views:
+                            calibrator.add_view(corners, view_name)
+
+                    if len(calibrator.corner_store) < calibrator.min_images:
+                        continue
+
+                    # 以上一批的結果為初始值，只需少量迭代
+                    if not calibrator.calibrate_camera(calibrator.image_size, warm_start=previous_matrix is not None,
+                                                       extended=True):
+                        return False
+                    record = self._check(previous_matrix, previous_coeffs)
+                    self.history.append(record)
+                    if on_batch is not None:
+                        on_batch(self, record)
+                    if record["converged"]:
+                        self.converged = True
+                        break
+                    previous_matrix = calibrator.camera_matrix.copy()
+                    previous_coeffs = calibrator.distortion_coeffs.copy()
+        finally:
+            if watchdog_views is not None:
+                watchdog_views.close()
+
+        return bool(self.history)
+
+
+def run_converge(calibrator, images_folder, batch_size=DEFAULT_BATCH_SIZE, focal_tolerance=DEFAULT_FOCAL_TOLERANCE,
+                 center_tolerance=DEFAULT_CENTER_TOLERANCE, distortion_tolerance=DEFAULT_DISTORTION_TOLERANCE):
+    """
+    命令行收斂模式：參數穩定後停止檢測並儲存結果
+
+    參數:
+        calibrator: CameraCalibration 物件
+        images_folder: 影像資料夾
+        batch_size, focal_tolerance, center_tolerance, distortion_tolerance: 同 ConvergenceCalibration
+    """
+    image_files = collect_image_files(images_folder)
+    if not image_files:
+        print("錯誤: 在指定資料夾中找不到影像檔案")
+        return
+
+    def on_batch(converge, record):
+        fx, fy, cx, cy = record["intrinsics"]
+        line = (f"[{record['images_decoded']:4d}/{converge.images_total} 影像] {record['views']} 個視角，"
+                f"RMS {record['rms']:.4f}，fx={fx:.2f} fy={fy:.2f} cx={cx:.2f} cy={cy:.2f}，"
+                f"標準差 f {record['focal_std'] * 100:.2f}% c {record['center_std']:.2f}px")
+        if record["focal_change"] is not None:
+            line += (f"，變化 f {record['focal_change'] * 100:.2f}% c {record['center_change']:.2f}px "
+                     f"畸變 {record['distortion_change']:.2f}px")
+        print(line)
+
+    print(f"\n收斂模式: 每批 {batch_size} 個影像，共 {len(image_files)} 個影像")
+    print(f"容許範圍: fx/fy {focal_tolerance * 100:.2f}%，cx/cy {center_tolerance:g} 像素，"
+          f"畸變 {distortion_tolerance:g} 像素")
+    start_time = time.perf_counter()
+    verbose = calibrator.verbose
+    calibrator.verbose = False
+    try:
+        converge = ConvergenceCalibration(calibrator, batch_size, focal_tolerance, center_tolerance,
+                                          distortion_tolerance)
+        success = converge.run(image_files, on_batch)
+    finally:
+        calibrator.verbose = verbose
+
+    if not success:
+        print(f"成功檢測的影像不足 {calibrator.min_images} 張，未產生標定結果")
+        return
+
+    elapsed = time.perf_counter() - start_time
+    if converge.converged:
+        print(f"\n參數已收斂，只解碼 {converge.images_decoded}/{converge.images_total} 個影像 (耗時 {elapsed:.2f} 秒)")
+    else:
+        print(f"\n已用完所有影像仍未達到容許範圍 (耗時 {elapsed:.2f} 秒)，結果使用所有影像")
+
+    calibrator.print_results()
+    output_file = default_result_path()
+    calibration_data = calibrator.get_result_data()
+    calibration_data["收斂提前停止"] = {
+        "是否收斂": converge.converged,
+        "已解碼影像數量": converge.images_decoded,
+        "影像總數": converge.images_total,
+        "每批影像數量": converge.batch_size,
+        "容許範圍": {
+            "焦距相對值": focal_tolerance,
+            "主點_像素": center_tolerance,
+            "畸變_像素": distortion_tolerance
+        },
+        "內參標準差": {
+            name: float(value) for name, value in zip(["fx", "fy", "cx", "cy"], calibrator.std_intrinsics[:4])
+        },
+        "各批紀錄": [
+            {
+                "已解碼影像數量": record["images_decoded"],
+                "視角數量": record["views"],
+                "RMS": round(record["rms"], 5),
+                "焦距相對標準差": round(record["focal_std"], 6),
+                "主點標準差_像素": round(record["center_std"], 4),
+                "焦距相對變化": None if record["focal_change"] is None else round(record["focal_change"], 6),
+                "主點變化_像素": None if record["center_change"] is None else round(record["center_change"], 4),
+                "畸變變化_像素": None if record["distortion_change"] is None else round(record["distortion_change"], 4)
+            }
+            for record in converge.history
+        ]
+    }
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(calibration_data, f, ensure_ascii=False, indent=4)
+    print_summary(calibrator, output_file)
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 手眼標定
+
+作者: Toby
+描述: 雲台/機械手臂上的相機手眼標定 (AX=XB)。沿用內參標定時每張影像的外參 (標定板 -> 相機)，
+      配合依影像名稱對應的雲台/手臂姿態檔，平行執行 OpenCV 所有手眼標定方法並比較各方法的殘差；
+      OpenCV 未提供 calibrateHandEye 時 (opencv 5.x) 改用 NumPy 實作的 Tsai 與 Park 方法。
+      姿態轉換全部以 NumPy 批次計算
+日期: 2026/10/18
+
+姿態檔為 CSV (可有標題列)，每列: 影像名稱, x, y, z, 旋轉 (3或4欄)
+- 平移單位與方格尺寸相同 (mm)，姿態為末端 (雲台/夾爪) 在基座座標系中的位置
+- 旋轉格式以 --rotation 指定:
+  euler: roll, pitch, yaw (度)，R = Rz(yaw)·Ry(pitch)·Rx(roll)
+  rvec:  旋轉向量 (弧度)
+  quat:  四元數 qx, qy, qz, qw
+"""
+
+import sys
+import os
+import csv
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    from camera_calibration import cv2, np, CameraCalibration
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# OpenCV 手眼標定方法
+HAND_EYE_METHODS = {
+    "Tsai": "CALIB_HAND_EYE_TSAI",
+    "Park": "CALIB_HAND_EYE_PARK",
+    "Horaud": "CALIB_HAND_EYE_HORAUD",
+    "Andreff": "CALIB_HAND_EYE_ANDREFF",
+    "Daniilidis": "CALIB_HAND_EYE_DANIILIDIS"
+}
+
+# 各旋轉格式的欄位數
+ROTATION_COLUMNS = {"euler": 3, "rvec": 3, "quat": 4}
+
+
+def rotation_vectors_to_matrices(rvecs):
+    """
+    批次將旋轉向量轉為旋轉矩陣 (Rodrigues 公式)
+
+    參數:
+        rvecs: (N,3) 旋轉向量 (弧度)
+
+    回傳:
+        matrices: (N,3,3) 旋轉矩陣
+    """
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    axis = rvecs / np.where(theta > 1e-12, theta, 1.0)[:, None]
+
+    K = np.zeros((len(rvecs), 3, 3))
+    K[:, 0, 1], K[:, 0, 2] = -axis[:, 2], axis[:, 1]
+    K[:, 1, 0], K[:, 1, 2] = axis[:, 2], -axis[:, 0]
+    K[:, 2, 0], K[:, 2, 1] = -axis[:, 1], axis[:, 0]
+
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    return np.eye(3) + sin * K + (1.0 - cos) * (K @ K)
+
+
+def euler_to_matrices(angles):
+    """
+    批次將 roll, pitch, yaw (度) 轉為旋轉矩陣，R = Rz(yaw)·Ry(pitch)·Rx(roll)
+
+    參數:
+        angles: (N,3) roll, pitch, yaw (度)
+
+    回傳:
+        matrices: (N,3,3) 旋轉矩陣
+    """
+    roll, pitch, yaw = np.radians(np.asarray(angles, dtype=np.float64).reshape(-1, 3)).T
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=1),
+        np.stack([-sp, cp * sr, cp * cr], axis=1)
+    ], axis=1)
+
+
+def quaternions_to_matrices(quaternions):
+    """
+    批次將四元數 (qx, qy, qz, qw) 轉為旋轉矩陣
+
+    參數:
+        quaternions: (N,4) 四元數 (不需事先正規化)
+
+    回傳:
+        matrices: (N,3,3) 旋轉矩陣
+    """
+    q = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)
+    x, y, z, w = (q / np.linalg.norm(q, axis=1, keepdims=True)).T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=1)
+    ], axis=1)
+
+
+def to_homogeneous(rotations, translations):
+    """
+    批次組成齊次轉換矩陣
+
+    參數:
+        rotations: (N,3,3) 旋轉矩陣
+        translations: (N,3) 平移
+
+    回傳:
+        transforms: (N,4,4)
+    """
+    transforms = np.zeros((len(rotations), 4, 4))
+    transforms[:, :3, :3] = rotations
+    transforms[:, :3, 3] = np.asarray(translations, dtype=np.float64).reshape(-1, 3)
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def invert_transforms(transforms):
+    """
+    批次計算剛體轉換的反矩陣 (R^T, -R^T t)
+    """
+    rotations = np.swapaxes(transforms[:, :3, :3], 1, 2)
+    translations = -np.einsum('nij,nj->ni', rotations, transforms[:, :3, 3])
+    return to_homogeneous(rotations, translations)
+
+
+def rotation_angles(rotations):
+    """
+    批次計算旋轉矩陣的旋轉角 (度)
+    """
+    trace = np.trace(rotations, axis1=-2, axis2=-1)
+    return np.degrees(np.arccos(np.clip((trace - 1.0) / 2.0, -1.0, 1.0)))
+
+
+def skew_matrices(vectors):
+    """
+    批次組成外積矩陣 [v]x
+
+    參數:
+        vectors: (N,3)
+
+    回傳:
+        matrices: (N,3,3)，[v]x w = v × w
+    """
+    x, y, z = np.asarray(vectors, dtype=np.float64).reshape(-1, 3).T
+    zero = np.zeros_like(x)
+    return np.stack([
+        np.stack([zero, -z, y], axis=1),
+        np.stack([z, zero, -x], axis=1),
+        np.stack([-y, x, zero], axis=1)
+    ], axis=1)
+
+
+def rotation_matrices_to_vectors(rotations):
+    """
+    批次將旋轉矩陣轉為旋轉向量 (弧度，rotation_vectors_to_matrices 的反運算)
+
+    參數:
+        rotations: (N,3,3) 旋轉矩陣
+
+    回傳:
+        rvecs: (N,3) 旋轉向量
+    """
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+    theta = np.radians(rotation_angles(rotations))
+    sin = np.sin(theta)
+    # 反對稱部分 (R - R^T)/2 = sin(θ) [n]x
+    half_skew = 0.5 * np.stack([rotations[:, 2, 1] - rotations[:, 1, 2],
+                                rotations[:, 0, 2] - rotations[:, 2, 0],
+                                rotations[:, 1, 0] - rotations[:, 0, 1]], axis=1)
+    scale = np.where(sin > 1e-9, theta / np.where(sin > 1e-9, sin, 1.0), 1.0)
+    rvecs = half_skew * scale[:, None]
+
+    # 接近180度時 sin(θ) 趨近於0，改由 R + I (= 2 n n^T) 範數最大的行取得旋轉軸
+    near_pi = (sin <= 1e-6) & (theta > np.pi / 2)
+    if near_pi.any():
+        symmetric = rotations[near_pi] + np.eye(3)
+        columns = np.argmax(np.linalg.norm(symmetric, axis=1), axis=1)
+        axis = symmetric[np.arange(len(symmetric)), :, columns]
+        rvecs[near_pi] = axis / np.linalg.norm(axis, axis=1, keepdims=True) * theta[near_pi, None]
+    return rvecs
+
+
+def load_pose_file(pose_path, rotation="euler"):
+    """
+    讀取雲台/手臂姿態檔
+
+    參數:
+        pose_path: CSV 檔案路徑
+        rotation: 旋轉格式 ("euler", "rvec", "quat")
+
+    回傳:
+        poses: 影像名稱 -> 列索引 的字典
+        transforms: (N,4,4) 末端 -> 基座 的齊次轉換矩陣
+    """
+    if rotation not in ROTATION_COLUMNS:
+        raise ValueError(f"不支援的旋轉格式: {rotation}")
+    columns = 4 + ROTATION_COLUMNS[rotation]
+
+    names = []
+    values = []
+    with open(pose_path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row_number, row in enumerate(csv.reader(f), start=1):
+            row = [cell.strip() for cell in row if cell.strip() != ""]
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                numbers = [float(value) for value in row[1:columns]]
+            except ValueError:
+                if not names:
+                    continue  # 標題列
+                raise ValueError(f"姿態檔第 {row_number} 列格式錯誤: {','.join(row)}")
+            if len(numbers) != columns - 1:
+                raise ValueError(f"姿態檔第 {row_number} 列需要 {columns} 欄 (影像名稱, x, y, z, 旋轉)")
+            names.append(row[0])
+            values.append(numbers)
+
+    if not values:
+        raise ValueError(f"姿態檔沒有任何姿態: {pose_path}")
+
+    values = np.array(values, dtype=np.float64)
+    if rotation == "euler":
+        rotations = euler_to_matrices(values[:, 3:])
+    elif rotation == "rvec":
+        rotations = rotation_vectors_to_matrices(values[:, 3:])
+    else:
+        rotations = quaternions_to_matrices(values[:, 3:])
+
+    poses = {}
+    for index, name in enumerate(names):
+        poses[os.path.basename(name)] = index
+    return poses, to_homogeneous(rotations, values[:, :3])
+
+
+def match_views(view_names, poses):
+    """
+    依影像名稱 (或不含副檔名的名稱) 對應視角與姿態
+
+    每張影像多個標定板時，第2個以後的標定板 (名稱為 "影像名稱#k") 略過：
+    AX=XB 假設所有視角看到的是基座座標系中同一個固定的標定板。
+
+    參數:
+        view_names: 標定視角名稱列表 (與 rvecs/tvecs 順序相同)
+        poses: load_pose_file() 回傳的名稱 -> 列索引 字典
+
+    回傳:
+        view_indices: 有對應姿態的視角索引
+        pose_indices: 對應的姿態列索引
+    """
+    stems = {os.path.splitext(name)[0]: index for name, index in poses.items()}
+    view_indices = []
+    pose_indices = []
+    for view_index, name in enumerate(view_names):
+        _, separator, board_number = name.rpartition("#")
+        if separator and board_number.isdigit():
+            continue
+        pose_index = poses.get(name, stems.get(os.path.splitext(name)[0]))
+        if pose_index is not None:
+            view_indices.append(view_index)
+            pose_indices.append(pose_index)
+    return np.array(view_indices, dtype=int), np.array(pose_indices, dtype=int)
+
+
+def relative_motions(gripper_transforms, target_transforms):
+    """
+    所有影像對 (i<j) 的相對運動: 末端運動 A=G_j^-1 G_i 與相機運動 B=C_j C_i^-1，滿足 AX=XB
+
+    參數:
+        gripper_transforms: (N,4,4) 末端 -> 基座
+        target_transforms: (N,4,4) 標定板 -> 相機
+
+    回傳:
+        A, B: (M,4,4)，M = N(N-1)/2
+    """
+    G, C = gripper_transforms, target_transforms
+    first, second = np.triu_indices(len(G), k=1)
+    return invert_transforms(G[second]) @ G[first], C[second] @ invert_transforms(C[first])
+
+
+def hand_eye_translation(A, B, rotation):
+    """
+    已知旋轉時求手眼平移: (R_A - I) t = R t_B - t_A 的最小平方解 (Tsai 與 Park 相同)
+    """
+    lhs = (A[:, :3, :3] - np.eye(3)).reshape(-1, 3)
+    rhs = (np.einsum('ij,nj->ni', rotation, B[:, :3, 3]) - A[:, :3, 3]).reshape(-1)
+    return np.linalg.lstsq(lhs, rhs, rcond=None)[0]
+
+
+def hand_eye_tsai(A, B):
+    """
+    Tsai-Lenz 方法 (NumPy 實作)
+
+    旋轉以修正 Rodrigues 向量 P = 2 sin(θ/2) n 表示，[P_A + P_B]x P' = P_B - P_A 的最小平方解
+    換算為手眼旋轉，平移再由 hand_eye_translation 求得。
+
+    參數:
+        A, B: relative_motions() 回傳的相對運動
+
+    回傳:
+        X: (4,4) 手眼轉換 (相機 -> 末端)
+    """
+    def modified_rodrigues(rotations):
+        rvecs = rotation_matrices_to_vectors(rotations)
+        theta = np.linalg.norm(rvecs, axis=1, keepdims=True)
+        return rvecs * (2.0 * np.sin(theta / 2.0) / np.where(theta > 1e-12, theta, 1.0))
+
+    P_A = modified_rodrigues(A[:, :3, :3])
+    P_B = modified_rodrigues(B[:, :3, :3])
+    lhs = skew_matrices(P_A + P_B).reshape(-1, 3)
+    P_prime = np.linalg.lstsq(lhs, (P_B - P_A).reshape(-1), rcond=None)[0]
+
+    P = 2.0 * P_prime / np.sqrt(1.0 + P_prime @ P_prime)
+    norm_sq = P @ P
+    rotation = ((1.0 - norm_sq / 2.0) * np.eye(3)
+                + 0.5 * (np.outer(P, P) + np.sqrt(4.0 - norm_sq) * skew_matrices(P)[0]))
+    return to_homogeneous(rotation[None], hand_eye_translation(A, B, rotation)[None])[0]
+
+
+def hand_eye_park(A, B):
+    """
+    Park-Martin 方法 (NumPy 實作)
+
+    旋轉向量滿足 α_i = R β_i，M = Σ β_i α_i^T，R = (M^T M)^(-1/2) M^T；
+    平移再由 hand_eye_translation 求得。
+
+    參數:
+        A, B: relative_motions() 回傳的相對運動
+
+    回傳:
+        X: (4,4) 手眼轉換 (相機 -> 末端)
+    """
+    alpha = rotation_matrices_to_vectors(A[:, :3, :3])
+    beta = rotation_matrices_to_vectors(B[:, :3, :3])
+    M = beta.T @ alpha
+    eigenvalues, eigenvectors = np.linalg.eigh(M.T @ M)
+    if eigenvalues.min() <= 1e-12:
+        raise np.linalg.LinAlgError("相對運動的旋轉軸不足兩個方向")
+    inverse_sqrt = eigenvectors @ np.diag(eigenvalues ** -0.5) @ eigenvectors.T
+    rotation = inverse_sqrt @ M.T
+    return to_homogeneous(rotation[None], hand_eye_translation(A, B, rotation)[None])[0]
+
+
+# OpenCV 未提供 calibrateHandEye 時使用的 NumPy 實作
+NUMPY_HAND_EYE_METHODS = {
+    "Tsai": hand_eye_tsai,
+    "Park": hand_eye_park
+}
+
+
+def hand_eye_residuals(X, gripper_transforms, target_transforms):
+    """
+    計算手眼標定結果的殘差 (向量化)
+
+    - AX=XB: 所有影像對 (i<j) 的 A=G_j^-1 G_i、B=C_j C_i^-1，比較 AX 與 XB 的旋轉角與平移差
+    - 標定板一致性: G_i X C_i (標定板在基座座標系的位置) 應為常數，計算其分散程度
+
+    參數:
+        X: (4,4) 手眼轉換 (相機 -> 末端)
+        gripper_transforms: (N,4,4) 末端 -> 基座
+        target_transforms: (N,4,4) 標定板 -> 相機
+
+    回傳:
+        residuals: 殘差字典
+    """
+    G, C = gripper_transforms, target_transforms
+    A, B = relative_motions(G, C)
+    error = invert_transforms(A @ X) @ (X @ B)
+    pair_rotation = rotation_angles(error[:, :3, :3])
+    pair_translation = np.linalg.norm(error[:, :3, 3], axis=1)
+
+    # 標定板在基座座標系的位置
+    target_in_base = G @ X @ C
+    positions = target_in_base[:, :3, 3]
+    position_spread = np.linalg.norm(positions - positions.mean(axis=0), axis=1)
+    u, _, vt = np.linalg.svd(target_in_base[:, :3, :3].mean(axis=0))
+    mean_rotation = u @ vt
+    rotation_spread = rotation_angles(np.swapaxes(target_in_base[:, :3, :3], 1, 2) @ mean_rotation)
+
+    return {
+        "AX_XB_旋轉RMS_度": float(np.sqrt((pair_rotation ** 2).mean())),
+        "AX_XB_平移RMS_mm": float(np.sqrt((pair_translation ** 2).mean())),
+        "標定板位置RMS_mm": float(np.sqrt((position_spread ** 2).mean())),
+        "標定板姿態RMS_度": float(np.sqrt((rotation_spread ** 2).mean()))
+    }
+
+
+def solve_hand_eye(gripper_transforms, target_transforms, workers=None):
+    """
+    平行執行所有 OpenCV 手眼標定方法 (OpenCV 未提供 calibrateHandEye 時改用 NUMPY_HAND_EYE_METHODS)
+
+    參數:
+        gripper_transforms: (N,4,4) 末端 -> 基座 (眼在手外時傳入 基座 -> 末端)
+        target_transforms: (N,4,4) 標定板 -> 相機
+        workers: 執行緒數量 (None 表示方法數量)
+
+    回傳:
+        results: 方法名稱 -> {"X": (4,4), "殘差": {...}} 的字典 (失敗的方法為 {"錯誤": 訊息})
+    """
+    if len(gripper_transforms) < 3:
+        raise ValueError("手眼標定至少需要3個有姿態的視角")
+
+    if not hasattr(cv2, "calibrateHandEye"):
+        A, B = relative_motions(gripper_transforms, target_transforms)
+
+        def run_numpy(item):
+            name, solver = item
+            try:
+                X = solver(A, B)
+            except np.linalg.LinAlgError as e:
+                return name, {"錯誤": str(e)}
+            return name, {"X": X, "殘差": hand_eye_residuals(X, gripper_transforms, target_transforms)}
+
+        with ThreadPoolExecutor(max_workers=workers or len(NUMPY_HAND_EYE_METHODS)) as executor:
+            return dict(executor.map(run_numpy, NUMPY_HAND_EYE_METHODS.items()))
+
+    R_gripper = list(gripper_transforms[:, :3, :3])
+    t_gripper = list(gripper_transforms[:, :3, 3:4])
+    R_target = list(target_transforms[:, :3, :3])
+    t_target = list(target_transforms[:, :3, 3:4])
+
+    def run(item):
+        name, constant = item
+        try:
+            R, t = cv2.calibrateHandEye(R_gripper, t_gripper, R_target, t_target,
+                                        method=getattr(cv2, constant))
+        except cv2.error as e:
+            return name, {"錯誤": str(e).strip().splitlines()[-1]}
+        X = to_homogeneous(R[None], t.reshape(1, 3))[0]
+        return name, {"X": X, "殘差": hand_eye_residuals(X, gripper_transforms, target_transforms)}
+
+    with ThreadPoolExecutor(max_workers=workers or len(HAND_EYE_METHODS)) as executor:
+        return dict(executor.map(run, HAND_EYE_METHODS.items()))
+
+
+def main():
+    """
+    手眼標定主程式: 內參標定 (沿用每張影像的外參) -> 對應姿態 -> 所有方法平行求解
+    """
+    parser = argparse.ArgumentParser(description="雲台/機械手臂手眼標定")
+    parser.add_argument("poses", help="姿態檔 (CSV: 影像名稱, x, y, z, 旋轉)")
+    parser.add_argument("--images", help="標定影像資料夾 (預設為程式目錄中的image資料夾)")
+    parser.add_argument("--rotation", choices=sorted(ROTATION_COLUMNS), default="euler",
+                        help="姿態檔的旋轉格式 (預設 euler: roll, pitch, yaw 度)")
+    parser.add_argument("--eye-to-hand", action="store_true",
+                        help="相機固定、標定板裝在末端 (預設為相機裝在雲台/手臂上)")
+    parser.add_argument("--output", help="結果檔案 (預設為 result/handeye_<時間戳記>.json)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    images_folder = args.images or os.path.join(script_dir, "image")
+
+    try:
+        poses, gripper_transforms = load_pose_file(args.poses, args.rotation)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"錯誤: {e}")
+        return
+
+    try:
+        calibrator = CameraCalibration()
+    except FileNotFoundError:
+        print("程式終止")
+        return
+
+    if not calibrator.process_images(images_folder) or not calibrator.calibrate_camera(calibrator.image_size):
+        print("內參標定失敗，無法進行手眼標定")
+        return
+
+    view_indices, pose_indices = match_views(calibrator.corner_store.valid_names(), poses)
+    print(f"\n有對應姿態的視角: {len(view_indices)}/{len(calibrator.corner_store)}")
+
+    target_transforms = to_homogeneous(rotation_vectors_to_matrices(calibrator.rvecs[view_indices]),
+                                       calibrator.tvecs[view_indices])
+    gripper_transforms = gripper_transforms[pose_indices]
+    if args.eye_to_hand:
+        gripper_transforms = invert_transforms(gripper_transforms)
+
+    if not hasattr(cv2, "calibrateHandEye"):
+        print(f"目前的 OpenCV 版本不提供 calibrateHandEye，使用 NumPy 實作: {', '.join(NUMPY_HAND_EYE_METHODS)}")
+
+    try:
+        results = solve_hand_eye(gripper_transforms, target_transforms)
+    except (RuntimeError, ValueError) as e:
+        print(f"錯誤: {e}")
+        return
+
+    print("\n" + "=" * 60)
+    print(f"手眼標定結果 ({'相機 -> 基座' if args.eye_to_hand else '相機 -> 末端'})")
+    print("=" * 60)
+    for name, result in results.items():
+        if "錯誤" in result:
+            print(f"{name:<11} 失敗: {result['錯誤']}")
+            continue
+        residuals = result["殘差"]
+        print(f"{name:<11} AX=XB 旋轉 {residuals['AX_XB_旋轉RMS_度']:.4f}°  平移 {residuals['AX_XB_平移RMS_mm']:.3f} mm  "
+              f"標定板位置 {residuals['標定板位置RMS_mm']:.3f} mm")
+
+    solved = {name: result for name, result in results.items() if "X" in result}
+    if not solved:
+        print("所有方法都失敗")
+        return
+    best = min(solved, key=lambda name: solved[name]["殘差"]["標定板位置RMS_mm"])
+    print(f"\n建議使用: {best} (標定板位置殘差最小)")
+    print(f"X:\n{solved[best]['X']}")
+
+    output_file = args.output or os.path.join(
+        script_dir, "result", f"handeye_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    output = {
+        "標定時間": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "類型": "眼在手外 (相機 -> 基座)" if args.eye_to_hand else "眼在手上 (相機 -> 末端)",
+        "姿態檔": args.poses,
+        "使用視角數量": int(len(view_indices)),
+        "建議方法": best,
+        "各方法": {
+            name: ({"錯誤": result["錯誤"]} if "錯誤" in result else
+                   {"轉換矩陣": result["X"].tolist(), "殘差": result["殘差"]})
+            for name, result in results.items()
+        },
+        "內參標定": calibrator.get_result_data()
+    }
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=4)
+    print(f"\n結果已儲存至: {output_file}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
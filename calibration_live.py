@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 即時擷取多行程檢測
+
+作者: Toby
+描述: 擷取端將影格直接寫入固定數量的共享記憶體緩衝區 (環形)，
+      多個檢測行程以零複製的方式讀取同一塊記憶體，不需序列化傳送整張影格；
+      檢測來不及時採用「最新影格優先」策略，捨棄過時的影格
+日期: 2026/10/18
+"""
+
+import time
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from queue import Empty
+
+from camera_calibration import cv2, np, find_chessboard_corners
+
+
+# 緩衝區狀態
+SLOT_FREE = 0
+SLOT_WRITING = 1
+SLOT_READY = 2
+SLOT_BUSY = 3
+
+
+class FrameRing:
+    """
+    共享記憶體影格環形緩衝區
+
+    記憶體配置: [每個緩衝區的狀態 (int64) | 每個緩衝區的影格編號 (int64) | 統計 (捨棄數, 處理數)] + 影格資料。
+    狀態的讀寫都必須持有同一個 multiprocessing 鎖 (呼叫端負責)，影格資料則在取得緩衝區後直接讀寫。
+    """
+
+    def __init__(self, shape, slots, name=None):
+        """
+        建立 (name 為 None) 或連接 (指定 name) 共享記憶體
+
+        參數:
+            shape: 單一影格的形狀 (高, 寬)，dtype 固定為 uint8
+            slots: 緩衝區數量
+            name: 既有共享記憶體名稱 (檢測行程連接時使用)
+        """
+        self.shape = tuple(shape)
+        self.slots = int(slots)
+        frame_bytes = int(np.prod(self.shape))
+        header_items = 2 * self.slots + 2
+        header_bytes = header_items * 8
+        # 影格資料對齊到 64 位元組
+        self.data_offset = (header_bytes + 63) // 64 * 64
+        size = self.data_offset + frame_bytes * self.slots
+
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+
+        header = np.ndarray((header_items,), dtype=np.int64, buffer=self.memory.buf)
+        self.states = header[:self.slots]
+        self.sequences = header[self.slots:2 * self.slots]
+        self.counters = header[2 * self.slots:]
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8,
+                                 buffer=self.memory.buf, offset=self.data_offset)
+        if self.owner:
+            header[:] = 0
+            self.sequences[:] = -1
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def dropped(self):
+        return int(self.counters[0])
+
+    @property
+    def processed(self):
+        return int(self.counters[1])
+
+    def acquire_write(self):
+        """
+        取得可寫入的緩衝區 (需持有鎖)：優先使用空的緩衝區，否則覆寫最舊、尚未被取走的影格
+
+        回傳:
+            slot: 緩衝區索引，所有緩衝區都在檢測中時為 None (新影格被捨棄)
+        """
+        free = np.flatnonzero(self.states == SLOT_FREE)
+        if len(free):
+            slot = int(free[0])
+        else:
+            ready = np.flatnonzero(self.states == SLOT_READY)
+            if not len(ready):
+                self.counters[0] += 1
+                return None
+            slot = int(ready[np.argmin(self.sequences[ready])])
+            self.counters[0] += 1
+        self.states[slot] = SLOT_WRITING
+        return slot
+
+    def publish(self, slot, sequence):
+        """
+        寫入完成，標記為可檢測 (需持有鎖)
+        """
+        self.sequences[slot] = sequence
+        self.states[slot] = SLOT_READY
+
+    def take_latest(self):
+        """
+        取走最新的待檢測影格 (需持有鎖)
+
+        回傳:
+            slot: 緩衝區索引，沒有待檢測影格時為 None
+        """
+        ready = np.flatnonzero(self.states == SLOT_READY)
+        if not len(ready):
+            return None
+        slot = int(ready[np.argmax(self.sequences[ready])])
+        self.states[slot] = SLOT_BUSY
+        return slot
+
+    def release(self, slot):
+        """
+        檢測完成，釋放緩衝區 (需持有鎖)
+        """
+        self.states[slot] = SLOT_FREE
+        self.counters[1] += 1
+
+    def close(self):
+        """
+        解除映射；建立者同時刪除共享記憶體
+        """
+        # 先釋放指向共享記憶體的陣列，否則無法關閉
+        self.states = self.sequences = self.counters = self.frames = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def detection_worker(ring_name, shape, slots, board_size, refine_method, condition, results, stop_event):
+    """
+    檢測行程: 反覆取走最新影格，直接在共享記憶體上檢測角點
+
+    參數:
+        ring_name: 共享記憶體名稱
+        shape: 影格形狀 (高, 寬)
+        slots: 緩衝區數量
+        board_size: 棋盤格內角點數量 (寬, 高)
+        refine_method: 角點精修方式 (REFINE_METHODS 之一)
+        condition: 保護緩衝區狀態的 multiprocessing.Condition
+        results: 回傳 (影格編號, 角點或None) 的 multiprocessing.Queue
+        stop_event: 設定後處理完剩餘影格即結束
+    """
+    ring = FrameRing(shape, slots, name=ring_name)
+    try:
+        while True:
+            with condition:
+                slot = ring.take_latest()
+                while slot is None:
+                    if stop_event.is_set():
+                        return
+                    condition.wait(0.1)
+                    slot = ring.take_latest()
+                sequence = int(ring.sequences[slot])
+
+            corners = find_chessboard_corners(ring.frames[slot], tuple(board_size), refine_method)
+
+            with condition:
+                ring.release(slot)
+            results.put((sequence, corners))
+    finally:
+        ring.close()
+
+
+def collect_live_views(calibrator, capture, workers=2, slots=None, min_motion=20.0, max_views=40,
+                       max_frames=None, realtime=False):
+    """
+    以多個檢測行程處理即時影像，擷取標定視角
+
+    檢測結果的順序不固定，因此與所有已採用的視角比較，平均角點位移都超過 min_motion 才加入。
+
+    參數:
+        calibrator: CameraCalibration 物件 (視角會加入其 corner_store)
+        capture: cv2.VideoCapture
+        workers: 檢測行程數量
+        slots: 緩衝區數量 (預設為檢測行程數 + 2)
+        min_motion: 新視角與已採用視角的最小平均角點位移 (像素)
+        max_views: 最多採用的視角數量
+        max_frames: 最多讀取的影格數 (None 表示讀到結尾)
+        realtime: 影片檔依原始幀率播放 (模擬攝影機；攝影機本身即為即時)
+
+    回傳:
+        stats: 影格數、檢測數、捨棄數與檢測吞吐量的字典
+    """
+    calibrator.corner_store.clear()
+    ret, frame = capture.read()
+    if not ret:
+        return {"frames": 0, "processed": 0, "dropped": 0, "views": 0, "detections_per_second": 0.0}
+
+    shape = frame.shape[:2]
+    calibrator.image_size = (shape[1], shape[0])
+    slots = slots or workers + 2
+    frame_interval = 0.0
+    if realtime:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+
+    ring = FrameRing(shape, slots)
+    context = mp.get_context()
+    condition = context.Condition()
+    results = context.Queue()
+    stop_event = context.Event()
+    processes = [
+        context.Process(target=detection_worker, daemon=True,
+                        args=(ring.name, shape, slots, tuple(calibrator.board_size),
+                              calibrator.corner_refinement, condition, results, stop_event))
+        for _ in range(max(1, int(workers)))
+    ]
+
+    accepted = []
+
+    def handle(sequence, corners):
+        if corners is None or len(accepted) >= max_views:
+            return
+        for previous in accepted:
+            if np.linalg.norm((corners - previous).reshape(-1, 2), axis=1).mean() < min_motion:
+                return
+        accepted.append(corners)
+        calibrator.add_view(corners, f"frame_{sequence:06d}")
+
+    def drain(timeout=0.0):
+        while True:
+            try:
+                handle(*results.get(timeout=timeout))
+            except Empty:
+                return
+
+    frame_index = 0
+    start_time = time.perf_counter()
+    try:
+        for process in processes:
+            process.start()
+
+        while frame is not None and len(accepted) < max_views:
+            with condition:
+                slot = ring.acquire_write()
+            if slot is not None:
+                # 直接轉換到共享記憶體中，不另外複製
+                if frame.ndim == 2:
+                    np.copyto(ring.frames[slot], frame)
+                else:
+                    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=ring.frames[slot])
+                with condition:
+                    ring.publish(slot, frame_index)
+                    condition.notify()
+
+            drain()
+            frame_index += 1
+            if max_frames is not None and frame_index >= max_frames:
+                break
+            if frame_interval:
+                delay = start_time + frame_index * frame_interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ret, frame = capture.read()
+            if not ret:
+                frame = None
+
+        stop_event.set()
+        with condition:
+            condition.notify_all()
+        # 先取出所有結果再等待行程結束，避免行程卡在寫入佇列
+        while any(process.is_alive() for process in processes):
+            drain(timeout=0.1)
+        drain()
+        elapsed = time.perf_counter() - start_time
+        processed, dropped = ring.processed, ring.dropped
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        ring.close()
+
+    return {
+        "frames": frame_index,
+        "processed": processed,
+        "dropped": dropped,
+        "views": len(calibrator.corner_store),
+        "detections_per_second": processed / elapsed if elapsed > 0 else 0.0
+    }
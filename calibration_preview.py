@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 快速預覽
+
+作者: Toby
+描述: 以所有影像的單應矩陣 (一次批次計算) 與 Zhang 閉式解估計近似內參，
+      不需等待完整的非線性最佳化，即可確認拍攝的影像是否合理
+日期: 2026/10/18
+"""
+
+import time
+
+from camera_calibration import np
+
+
+def _normalize_points(points):
+    """
+    將每組點平移到原點並縮放至平均距離 √2 (Hartley 正規化，改善DLT的數值穩定性)
+
+    參數:
+        points: (V, M, 2) 座標
+
+    回傳:
+        normalized: (V, M, 2) 正規化後的座標
+        transforms: (V, 3, 3) 對應的正規化矩陣
+    """
+    mean = points.mean(axis=1)
+    centered = points - mean[:, None, :]
+    scale = np.sqrt(2.0) / np.maximum(np.sqrt((centered ** 2).sum(axis=2)).mean(axis=1), 1e-12)
+
+    transforms = np.zeros((len(points), 3, 3))
+    transforms[:, 0, 0] = scale
+    transforms[:, 1, 1] = scale
+    transforms[:, 0, 2] = -scale * mean[:, 0]
+    transforms[:, 1, 2] = -scale * mean[:, 1]
+    transforms[:, 2, 2] = 1.0
+    return centered * scale[:, None, None], transforms
+
+
+def batch_homographies(model_points, image_points):
+    """
+    批次計算所有影像的單應矩陣 (標定板平面 -> 影像)
+
+    參數:
+        model_points: (M, 2) 標定板平面座標
+        image_points: (V, M, 2) 每張影像的角點座標
+
+    回傳:
+        homographies: (V, 3, 3) 單應矩陣 (H[2,2] = 1)
+    """
+    image_points = np.asarray(image_points, dtype=np.float64)
+    views, count = image_points.shape[:2]
+
+    model, model_transform = _normalize_points(np.asarray(model_points, dtype=np.float64)[None])
+    image, image_transforms = _normalize_points(image_points)
+
+    x = np.broadcast_to(model[..., 0], (views, count))
+    y = np.broadcast_to(model[..., 1], (views, count))
+    u = image[..., 0]
+    v = image[..., 1]
+
+    # DLT: 每個角點兩列方程式，所有影像一起建立 (V, 2M, 9)
+    A = np.zeros((views, 2 * count, 9))
+    A[:, 0::2, 0] = x
+    A[:, 0::2, 1] = y
+    A[:, 0::2, 2] = 1.0
+    A[:, 0::2, 6] = -u * x
+    A[:, 0::2, 7] = -u * y
+    A[:, 0::2, 8] = -u
+    A[:, 1::2, 3] = x
+    A[:, 1::2, 4] = y
+    A[:, 1::2, 5] = 1.0
+    A[:, 1::2, 6] = -v * x
+    A[:, 1::2, 7] = -v * y
+    A[:, 1::2, 8] = -v
+
+    # 最小特徵值的特徵向量即為解；對 9x9 的 A^T A 計算比對整個 A 做 SVD 快得多
+    _, eigenvectors = np.linalg.eigh(np.einsum('vki,vkj->vij', A, A))
+    normalized_h = eigenvectors[:, :, 0].reshape(views, 3, 3)
+
+    homographies = np.linalg.inv(image_transforms) @ normalized_h @ model_transform
+    return homographies / homographies[:, 2:3, 2:3]
+
+
+def homography_rms(homographies, model_points, image_points):
+    """
+    單應矩陣的重投影誤差 (RMS，像素)，可用來檢查角點檢測是否合理
+    """
+    model = np.asarray(model_points, dtype=np.float64)
+    model_h = np.concatenate([model, np.ones((len(model), 1))], axis=1)
+    projected = np.einsum('vij,mj->vmi', homographies, model_h)
+    projected = projected[..., :2] / projected[..., 2:3]
+    return float(np.sqrt(((projected - image_points) ** 2).sum(axis=2).mean()))
+
+
+def zhang_intrinsics(homographies, image_size):
+    """
+    由多個單應矩陣以 Zhang 閉式解求內參 (假設無傾斜)
+
+    參數:
+        homographies: (V, 3, 3) 單應矩陣
+        image_size: 影像尺寸 (寬度, 高度)
+
+    回傳:
+        camera_matrix: 近似內參矩陣 (3,3)
+    """
+    width, height = image_size
+
+    # 先將像素座標縮放到 [-1, 1]，避免方程式係數量級差異過大
+    to_unit = np.array([[2.0 / width, 0.0, -1.0],
+                        [0.0, 2.0 / height, -1.0],
+                        [0.0, 0.0, 1.0]])
+    H = to_unit @ homographies
+    H = H / np.linalg.norm(H[:, :, 0], axis=1)[:, None, None]
+
+    def v(i, j):
+        hi = H[:, :, i]
+        hj = H[:, :, j]
+        return np.stack([
+            hi[:, 0] * hj[:, 0],
+            hi[:, 0] * hj[:, 1] + hi[:, 1] * hj[:, 0],
+            hi[:, 1] * hj[:, 1],
+            hi[:, 2] * hj[:, 0] + hi[:, 0] * hj[:, 2],
+            hi[:, 2] * hj[:, 1] + hi[:, 1] * hj[:, 2],
+            hi[:, 2] * hj[:, 2]
+        ], axis=1)
+
+    # 每張影像兩條限制式，加上無傾斜 (B12 = 0) 的限制
+    skew_row = np.array([[0.0, 1.0, 0.0, 0.0, 0.0, 0.0]]) * np.sqrt(len(H))
+    V = np.concatenate([v(0, 1), v(0, 0) - v(1, 1), skew_row], axis=0)
+    _, eigenvectors = np.linalg.eigh(V.T @ V)
+    B11, B12, B22, B13, B23, B33 = eigenvectors[:, 0]
+
+    denominator = B11 * B22 - B12 ** 2
+    v0 = (B12 * B13 - B11 * B23) / denominator
+    lam = B33 - (B13 ** 2 + v0 * (B12 * B13 - B11 * B23)) / B11
+    if denominator <= 0 or lam / B11 <= 0:
+        raise ValueError("影像的角度變化不足，無法估計內參")
+    alpha = np.sqrt(lam / B11)
+    beta = np.sqrt(lam * B11 / denominator)
+    u0 = -B13 * alpha ** 2 / lam
+
+    unit_matrix = np.array([[alpha, 0.0, u0],
+                            [0.0, beta, v0],
+                            [0.0, 0.0, 1.0]])
+    return np.linalg.inv(to_unit) @ unit_matrix
+
+
+def preview_intrinsics(calibrator):
+    """
+    以已檢測的角點快速估計內參 (不含畸變，僅供預覽)
+
+    參數:
+        calibrator: 已完成角點檢測的 CameraCalibration
+
+    回傳:
+        preview: 包含 fx, fy, cx, cy, views, homography_rms, seconds 的字典
+    """
+    start_time = time.perf_counter()
+
+    views = len(calibrator.corner_store)
+    if views < 2:
+        raise ValueError("至少需要2張成功檢測的影像")
+    if calibrator.image_size is None:
+        raise ValueError("無法取得影像尺寸")
+
+    model_points = calibrator.objp[:, :2]
+    image_points = calibrator.corner_store.valid_points().astype(np.float64)
+
+    homographies = batch_homographies(model_points, image_points)
+    camera_matrix = zhang_intrinsics(homographies, calibrator.image_size)
+
+    return {
+        "fx": float(camera_matrix[0, 0]),
+        "fy": float(camera_matrix[1, 1]),
+        "cx": float(camera_matrix[0, 2]),
+        "cy": float(camera_matrix[1, 2]),
+        "views": views,
+        "homography_rms": homography_rms(homographies, model_points, image_points),
+        "seconds": time.perf_counter() - start_time
+    }
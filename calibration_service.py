@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 本機HTTP服務
+
+作者: Toby
+描述: 提供本機HTTP介面接收標定工作 (本機路徑或上傳影像)，
+      以asyncio處理請求，角點檢測與標定計算在共用的程序池中執行
+日期: 2026/10/18
+
+API (請求與回應皆為JSON):
+    POST /jobs        建立工作，內容為下列其中一種影像來源，加上可選的 "settings"
+                      {"image_folder": "D:/capture/cam01"}
+                      {"image_paths": ["D:/a.png", "D:/b.png"]}
+                      {"images": [{"name": "a.png", "data": "<base64>"}]}
+    GET  /jobs        列出所有工作
+    GET  /jobs/<id>   查詢工作狀態，完成後包含與結果JSON檔案相同格式的 "result"
+    GET  /health      服務狀態
+"""
+
+import sys
+import os
+import json
+import uuid
+import time
+import base64
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from camera_calibration import (np, CameraCalibration, DEFAULT_SETTINGS, REFINE_METHODS, RAW_MODES,
+                                    collect_image_files, detect_boards, board_view_name, board_size_samples)
+    from corner_cache import CornerCache
+    from detection_watchdog import DetectionWatchdog
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# 請求內容大小上限 (上傳影像以base64編碼)
+MAX_BODY_SIZE = 512 * 1024 * 1024
+
+# 保留的已結束工作數量
+MAX_FINISHED_JOBS = 1000
+
+# 角點快取寫入檔案的間隔 (秒)，結束服務時也會寫入
+CACHE_SAVE_INTERVAL = 30.0
+
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def solve_views(settings, views, image_size):
+    """
+    以已檢測的角點執行標定 (在工作程序中執行)
+
+    參數:
+        settings: 標定參數字典
+        views: 每個視角的 (視角名稱, 角點座標) 列表
+        image_size: 影像尺寸 (寬度, 高度)
+
+    回傳:
+        result: 標定結果字典 (與結果JSON檔案格式相同)
+    """
+    calibrator = CameraCalibration(settings)
+    for view_name, corners in views:
+        calibrator.add_view(corners, view_name)
+    if not calibrator.calibrate_camera(image_size):
+        raise RuntimeError("相機標定失敗")
+    return calibrator.get_result_data()
+
+
+class CalibrationJob:
+    """
+    單一標定工作
+    """
+
+    def __init__(self, sources, settings):
+        """
+        參數:
+            sources: 影像來源列表，每項為 (名稱, 檔案路徑或影像資料)
+            settings: 標定參數字典
+        """
+        self.job_id = uuid.uuid4().hex[:12]
+        self.sources = sources
+        self.settings = settings
+        self.status = "queued"     # queued / running / done / failed
+        self.created = time.time()
+        self.finished = None
+        self.done_count = 0
+        self.detected_count = 0
+        self.cached_count = 0
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        """
+        工作狀態 (API回應格式)
+        """
+        data = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "progress": {
+                "processed": self.done_count,
+                "total": len(self.sources),
+                "detected": self.detected_count,
+                "from_cache": self.cached_count
+            },
+            "settings": self.settings,
+            "created": self.created,
+            "finished": self.finished
+        }
+        if self.result is not None:
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class CalibrationService:
+    """
+    本機標定服務
+
+    所有用戶端共用同一個程序池與角點快取：
+    程序池限制同時進行的檢測與標定數量，快取讓重複送出的影像不必重新檢測。
+    """
+
+    def __init__(self, workers=None, concurrent_jobs=2, cache_path=None):
+        """
+        初始化服務
+
+        參數:
+            workers: 工作程序數量 (預設為CPU核心數)
+            concurrent_jobs: 同時執行的工作數量，其餘工作排隊等候
+            cache_path: 角點快取檔案路徑 (None 表示不保存到磁碟)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrent_jobs = concurrent_jobs
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.cache = CornerCache(cache_path)
+        self.jobs = {}
+        self.queue = None
+
+    async def serve(self, host, port):
+        """
+        啟動HTTP服務並持續執行
+
+        參數:
+            host: 監聽位址
+            port: 監聽埠號
+        """
+        self.queue = asyncio.Queue()
+        runners = [asyncio.ensure_future(self._job_runner()) for _ in range(self.concurrent_jobs)]
+        runners.append(asyncio.ensure_future(self._cache_saver()))
+        server = await asyncio.start_server(self._handle_connection, host, port)
+
+        print(f"標定服務已啟動: http://{host}:{port}")
+        print(f"工作程序: {self.workers} 個，同時執行工作: {self.concurrent_jobs} 個，角點快取: {len(self.cache)} 筆")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for runner in runners:
+                runner.cancel()
+            self.pool.shutdown(wait=False)
+            self.cache.save()
+
+    # ---------- HTTP處理 ----------
+
+    async def _handle_connection(self, reader, writer):
+        """
+        處理單一HTTP連線 (每個連線處理一個請求)
+        """
+        try:
+            status, payload = await self._read_and_route(reader)
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        header = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                  f"Content-Type: application/json; charset=utf-8\r\n"
+                  f"Content-Length: {len(body)}\r\n"
+                  f"Connection: close\r\n\r\n")
+        try:
+            writer.write(header.encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_and_route(self, reader):
+        """
+        讀取請求並分派到對應的處理函式
+
+        回傳:
+            status: HTTP狀態碼
+            payload: 回應內容
+        """
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            return 400, {"error": "無效的請求"}
+        method, target = parts[0].upper(), parts[1]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", 0) or 0)
+        if length > MAX_BODY_SIZE:
+            return 413, {"error": "請求內容過大"}
+        body = await reader.readexactly(length) if length else b""
+
+        path = target.split("?", 1)[0].rstrip("/")
+        if path == "/health" and method == "GET":
+            return 200, {
+                "status": "ok",
+                "workers": self.workers,
+                "queued_jobs": self.queue.qsize(),
+                "cached_images": len(self.cache)
+            }
+        if path == "/jobs":
+            if method == "POST":
+                return self._create_job(body)
+            if method == "GET":
+                return 200, {"jobs": [job.to_dict() for job in self.jobs.values()]}
+            return 405, {"error": "不支援的方法"}
+        if path.startswith("/jobs/") and method == "GET":
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job is None:
+                return 404, {"error": "找不到工作"}
+            return 200, job.to_dict()
+        return 404, {"error": "找不到路徑"}
+
+    def _create_job(self, body):
+        """
+        解析請求內容並建立工作
+        """
+        try:
+            request = json.loads(body.decode('utf-8')) if body else {}
+        except ValueError:
+            return 400, {"error": "請求內容必須是JSON"}
+        if not isinstance(request, dict):
+            return 400, {"error": "請求內容必須是JSON物件"}
+        if not isinstance(request.get("settings", {}), dict):
+            return 400, {"error": "settings 必須是JSON物件"}
+
+        settings = dict(DEFAULT_SETTINGS)
+        settings.update(request.get("settings", {}))
+        # 檢測在標定前進行，無效的精修方式或原始影像模式需在建立工作時拒絕
+        if settings["corner_refinement"] not in REFINE_METHODS:
+            return 400, {"error": f"corner_refinement 必須是 {', '.join(REFINE_METHODS)} 其中之一"}
+        if settings["raw_mode"] not in RAW_MODES:
+            return 400, {"error": f"raw_mode 必須是 {', '.join(RAW_MODES)} 其中之一"}
+        if not isinstance(settings["max_boards"], int) or settings["max_boards"] < 1:
+            return 400, {"error": "max_boards 必須是正整數"}
+        if not isinstance(settings["detection_timeout"], (int, float)) or settings["detection_timeout"] < 0:
+            return 400, {"error": "detection_timeout 必須是不小於0的數值"}
+
+        if "image_folder" in request:
+            folder = request["image_folder"]
+            if not isinstance(folder, str) or not os.path.isdir(folder):
+                return 400, {"error": f"影像資料夾不存在: {folder}"}
+            sources = [(os.path.basename(path), path) for path in collect_image_files(folder)]
+        elif "image_paths" in request:
+            paths = request["image_paths"]
+            if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+                return 400, {"error": "image_paths 必須是路徑字串的列表"}
+            sources = [(os.path.basename(path), path) for path in paths]
+        elif "images" in request:
+            try:
+                sources = [(item.get("name", f"image_{i + 1}"), base64.b64decode(item["data"]))
+                           for i, item in enumerate(request["images"])]
+            except (KeyError, ValueError, TypeError, AttributeError):
+                return 400, {"error": "images 必須是 {\"name\", \"data\"(base64)} 的列表"}
+        else:
+            return 400, {"error": "需要 image_folder、image_paths 或 images 其中之一"}
+
+        if not sources:
+            return 400, {"error": "沒有任何影像"}
+
+        job = CalibrationJob(sources, settings)
+        self.jobs[job.job_id] = job
+        self._prune_jobs()
+        self.queue.put_nowait(job)
+        return 202, {"job_id": job.job_id, "status": job.status}
+
+    def _prune_jobs(self):
+        """
+        移除過舊的已結束工作
+        """
+        finished = [job for job in self.jobs.values() if job.status in ("done", "failed")]
+        for job in sorted(finished, key=lambda j: j.finished)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+    # ---------- 工作執行 ----------
+
+    async def _job_runner(self):
+        """
+        從佇列取出工作依序執行
+        """
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            try:
+                job.result = await self._run_job(job)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished = time.time()
+                # 上傳的影像資料不再需要
+                job.sources = [(name, None) for name, _ in job.sources]
+            print(f"工作 {job.job_id}: {job.status}"
+                  f" ({job.detected_count}/{len(job.sources)} 張成功，{job.cached_count} 張來自快取)")
+
+    async def _run_job(self, job):
+        """
+        執行單一工作：檢測角點 (優先使用快取) 並標定
+
+        回傳:
+            result: 標定結果字典
+        """
+        loop = asyncio.get_running_loop()
+        settings = job.settings
+        if settings["auto_board_size"]:
+            # 自動偵測內角點數量: 以平均取樣的影像固定一次，檢測、快取鍵與標定都使用偵測結果
+            calibrator = CameraCalibration(settings, verbose=False)
+            samples = board_size_samples([source for _, source in job.sources])
+            await loop.run_in_executor(None, calibrator.lock_board_size, samples)
+            settings = dict(settings, board_width=calibrator.board_size[0], board_height=calibrator.board_size[1])
+
+        board_size = (int(settings["board_width"]), int(settings["board_height"]))
+        refine_method = settings["corner_refinement"]
+        raw_mode = settings["raw_mode"]
+        max_boards = int(settings["max_boards"])
+        corner_count = board_size[0] * board_size[1]
+
+        timeout = float(settings["detection_timeout"])
+        failures = {}
+
+        def lookup(source):
+            if isinstance(source, (bytes, bytearray)):
+                return CornerCache.data_key(source, board_size, refine_method, raw_mode, max_boards)
+            try:
+                return CornerCache.file_key(source, board_size, refine_method, raw_mode, max_boards)
+            except OSError:
+                return None
+
+        def finish(name, key, boards, image_size):
+            if key is not None and image_size is not None:
+                self.cache.put(key, np.concatenate(boards) if boards else None, image_size)
+            job.done_count += 1
+            if boards:
+                job.detected_count += 1
+            return name, boards, image_size
+
+        async def detect(name, key, source):
+            boards, image_size = await loop.run_in_executor(self.pool, detect_boards, source, board_size,
+                                                            max_boards, refine_method, raw_mode)
+            return finish(name, key, boards, image_size)
+
+        def detect_with_watchdog(misses):
+            # 逾時或崩潰的影像記錄失敗原因，不寫入快取
+            watchdog = DetectionWatchdog(board_size, max_boards, timeout, self.workers, refine_method, raw_mode)
+            keys = {name: key for name, key, _ in misses}
+            results = []
+            for name, boards, image_size, reason in watchdog.run([(name, source) for name, _, source in misses]):
+                if reason is not None:
+                    failures[name] = reason
+                    results.append(finish(name, None, [], None))
+                else:
+                    results.append(finish(name, keys[name], boards, image_size))
+            return results
+
+        results = []
+        misses = []
+        for name, source in job.sources:
+            key = lookup(source)
+            cached = self.cache.get(key) if key is not None else None
+            if key is None:
+                results.append(finish(name, None, [], None))
+            elif cached is not None:
+                job.cached_count += 1
+                corners, image_size = cached
+                # 多個標定板的角點在快取中依序串接
+                boards = [] if corners is None else list(corners.reshape(-1, corner_count, 1, 2))
+                results.append(finish(name, None, boards, image_size))
+            else:
+                misses.append((name, key, source))
+
+        if timeout > 0 and misses:
+            # 設定檢測時限時快取未命中的影像交給看門狗程序池 (在執行緒中等待，不阻塞事件迴圈)
+            results += await loop.run_in_executor(None, detect_with_watchdog, misses)
+        else:
+            results += await asyncio.gather(*(detect(name, key, source) for name, key, source in misses))
+
+        # 依名稱排序，相同影像集合的結果與送出順序無關
+        results = sorted((r for r in results if r[1]), key=lambda r: r[0])
+        views = [(board_view_name(name, index), corners)
+                 for name, boards, _ in results for index, corners in enumerate(boards)]
+        min_images = int(settings["min_images"])
+        if len(views) < min_images:
+            raise RuntimeError(f"成功檢測的視角不足 {min_images} 個 ({len(views)} 個)")
+
+        image_size = results[0][2]
+        result = await loop.run_in_executor(self.pool, solve_views, settings, views, image_size)
+        result["使用影像"] = [name for name, _, _ in results]
+        if failures:
+            result["檢測失敗影像"] = failures
+
+        return result
+
+    async def _cache_saver(self):
+        """
+        定時將角點快取寫入檔案 (有變更時才寫入)
+
+        快取檔案每次都完整重寫，工作完成時不立即寫入，連續的工作只在間隔到時寫入一次。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(CACHE_SAVE_INTERVAL)
+            try:
+                await loop.run_in_executor(None, self.cache.save)
+            except Exception as e:
+                print(f"角點快取寫入錯誤: {e}")
+
+
+def main():
+    """
+    服務主程式
+    """
+    parser = argparse.ArgumentParser(description="相機內參標定本機HTTP服務")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址 (預設只接受本機連線)")
+    parser.add_argument("--port", type=int, default=8765, help="監聽埠號")
+    parser.add_argument("--workers", type=int, default=None, help="工作程序數量 (預設為CPU核心數)")
+    parser.add_argument("--jobs", type=int, default=2, help="同時執行的工作數量")
+    parser.add_argument("--cache", default=None,
+                        help="角點快取檔案 (預設為程式目錄中的 cache/corners.json)")
+    args = parser.parse_args()
+
+    cache_path = args.cache
+    if cache_path is None:
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        cache_path = os.path.join(script_dir, "cache", "corners.json")
+
+    service = CalibrationService(args.workers, args.jobs, cache_path)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n服務已停止")
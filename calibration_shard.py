@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 分片檢測
+
+作者: Toby
+描述: 將大量影像依固定規則分成多個分片，各分片可在不同機器上獨立檢測角點，
+      並各自寫出完整的角點資料庫；最後合併所有分片的資料庫並執行標定。
+      只需要共用的檔案系統，不需要任何服務。
+日期: 2026/10/18
+
+用法:
+    # 各機器執行其中一個分片 (分片編號從0開始)
+    python calibration_shard.py detect D:/archive --shard 0 --shards 4 --db D:/archive_db
+    python calibration_shard.py detect D:/archive --shard 1 --shards 4 --db D:/archive_db
+    ...
+    # 全部完成後合併並標定
+    python calibration_shard.py merge D:/archive_db
+
+    # 在本機以多個程序執行所有分片後合併
+    python calibration_shard.py run D:/archive --shards 4 --db D:/archive_db
+"""
+
+import sys
+import os
+import glob
+import json
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    from camera_calibration import (np, CameraCalibration, collect_image_files, detect_corners,
+                                    default_result_path, print_summary)
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# 角點資料庫格式版本
+DB_FORMAT = 1
+
+# 每完成多少張影像寫入一次資料庫 (中斷後重新執行可續跑)
+CHECKPOINT_INTERVAL = 500
+
+
+def shard_of(name, shards):
+    """
+    影像所屬的分片編號
+
+    以影像相對路徑的雜湊決定，與檔案列舉順序及其他檔案是否存在無關，
+    不同機器上的計算結果一定相同。
+
+    參數:
+        name: 影像相對於資料夾的路徑 (以 / 分隔)
+        shards: 分片總數
+    """
+    digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % shards
+
+
+def list_shard_images(images_folder, shard, shards):
+    """
+    列出屬於指定分片的影像
+
+    回傳:
+        images: (相對路徑, 完整路徑) 列表，依相對路徑排序
+    """
+    images = []
+    for image_path in collect_image_files(images_folder):
+        name = os.path.relpath(image_path, images_folder).replace(os.sep, "/")
+        if shard_of(name, shards) == shard:
+            images.append((name, image_path))
+    return images
+
+
+def shard_db_path(db_dir, shard, shards):
+    """
+    分片角點資料庫的檔案路徑
+    """
+    return os.path.join(db_dir, f"shard_{shard:04d}_of_{shards:04d}.npz")
+
+
+def save_corner_db(db_path, meta, entries, corners_per_view):
+    """
+    寫入角點資料庫 (npz，先寫入暫存檔再取代，中斷時不會留下損壞的檔案)
+
+    參數:
+        db_path: 資料庫檔案路徑
+        meta: 描述資料 (分片、標定板設定等)
+        entries: 影像相對路徑 -> (角點或None, 影像尺寸或None, 修改時間ns, 檔案大小)
+        corners_per_view: 每張影像的角點數量
+    """
+    names = sorted(entries)
+    count = len(names)
+    corners = np.zeros((count, corners_per_view, 2), dtype=np.float32)
+    found = np.zeros(count, dtype=bool)
+    image_sizes = np.zeros((count, 2), dtype=np.int32)
+    file_stats = np.zeros((count, 2), dtype=np.int64)
+
+    for i, name in enumerate(names):
+        view_corners, image_size, mtime_ns, file_size = entries[name]
+        if view_corners is not None:
+            corners[i] = np.asarray(view_corners, dtype=np.float32).reshape(corners_per_view, 2)
+            found[i] = True
+        if image_size is not None:
+            image_sizes[i] = image_size
+        file_stats[i] = (mtime_ns, file_size)
+
+    meta = dict(meta, format=DB_FORMAT, images=count, detected=int(found.sum()),
+                updated=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    temp_path = db_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                 names=np.array(names, dtype=str), corners=corners, found=found,
+                 image_sizes=image_sizes, file_stats=file_stats)
+    os.replace(temp_path, db_path)
+
+
+def load_corner_db(db_path):
+    """
+    讀取角點資料庫
+
+    回傳:
+        meta: 描述資料
+        entries: 影像相對路徑 -> (角點或None, 影像尺寸或None, 修改時間ns, 檔案大小)
+    """
+    with np.load(db_path) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta.get("format") != DB_FORMAT:
+            raise ValueError(f"不支援的資料庫格式: {meta.get('format')}")
+        names = data["names"]
+        corners = data["corners"]
+        found = data["found"]
+        image_sizes = data["image_sizes"]
+        file_stats = data["file_stats"]
+
+    entries = {}
+    for i, name in enumerate(names.tolist()):
+        size = tuple(int(v) for v in image_sizes[i])
+        entries[name] = (corners[i].reshape(-1, 1, 2) if found[i] else None,
+                         size if size != (0, 0) else None,
+                         int(file_stats[i, 0]), int(file_stats[i, 1]))
+    return meta, entries
+
+
+def detect_shard(images_folder, shard, shards, db_dir, settings, workers=None):
+    """
+    檢測一個分片的所有影像並寫出角點資料庫
+
+    既有資料庫中檔案未變更的影像會直接沿用，中斷後重新執行即可續跑。
+
+    參數:
+        images_folder: 影像資料夾 (所有分片相同)
+        shard: 分片編號 (0 ~ shards-1)
+        shards: 分片總數
+        db_dir: 角點資料庫資料夾 (共用檔案系統)
+        settings: 標定參數字典
+        workers: 檢測執行緒數量 (預設為CPU核心數)
+
+    回傳:
+        db_path: 資料庫檔案路徑
+    """
+    if not 0 <= shard < shards:
+        raise ValueError(f"分片編號需介於 0 ~ {shards - 1}")
+    # 角點資料庫每張影像只保存一組固定數量的角點
+    if int(settings.get("max_boards", 1)) > 1:
+        raise ValueError("分片標定不支援每張影像多個標定板，請將 每張影像標定板數量 設為 1")
+
+    board_size = (int(settings["board_width"]), int(settings["board_height"]))
+    refine_method = settings["corner_refinement"]
+    raw_mode = settings["raw_mode"]
+    corners_per_view = board_size[0] * board_size[1]
+    db_path = shard_db_path(db_dir, shard, shards)
+    meta = {"shard": shard, "shards": shards, "settings": settings,
+            "images_folder": os.path.abspath(images_folder)}
+
+    images = list_shard_images(images_folder, shard, shards)
+    print(f"分片 {shard}/{shards}: {len(images)} 張影像")
+
+    entries = {}
+    if os.path.exists(db_path):
+        try:
+            old_meta, old_entries = load_corner_db(db_path)
+            if (old_meta.get("shards") == shards and old_meta.get("shard") == shard
+                    and [old_meta["settings"]["board_width"], old_meta["settings"]["board_height"]] == list(board_size)
+                    and old_meta["settings"].get("corner_refinement") == refine_method
+                    and old_meta["settings"].get("raw_mode", "off") == raw_mode):
+                entries = old_entries
+        except Exception as e:
+            print(f"既有資料庫讀取錯誤，重新檢測: {e}")
+
+    pending = []
+    current = {}
+    for name, image_path in images:
+        stat = os.stat(image_path)
+        current[name] = (stat.st_mtime_ns, stat.st_size)
+        entry = entries.get(name)
+        if entry is None or (entry[2], entry[3]) != current[name]:
+            pending.append((name, image_path))
+
+    # 只保留仍存在且未變更的影像
+    entries = {name: entry for name, entry in entries.items()
+               if name in current and (entry[2], entry[3]) == current[name]}
+    if entries:
+        print(f"沿用既有資料庫: {len(entries)} 張")
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda item: detect_corners(item[1], board_size, refine_method, raw_mode),
+                               pending)
+        for done, ((name, _), (corners, image_size)) in enumerate(zip(pending, results), 1):
+            entries[name] = (corners, image_size) + current[name]
+            if done % CHECKPOINT_INTERVAL == 0:
+                save_corner_db(db_path, meta, entries, corners_per_view)
+                print(f"分片 {shard}/{shards}: 檢測進度 {done}/{len(pending)}")
+
+    save_corner_db(db_path, meta, entries, corners_per_view)
+    detected = sum(1 for entry in entries.values() if entry[0] is not None)
+    print(f"分片 {shard}/{shards} 完成: {detected}/{len(entries)} 張成功，資料庫: {db_path}")
+    return db_path
+
+
+def merge_shards(db_dir, settings=None):
+    """
+    合併所有分片的角點資料庫
+
+    參數:
+        db_dir: 角點資料庫資料夾
+        settings: 標定參數覆寫 (可選，例如改用其他畸變係數項數)
+
+    回傳:
+        calibrator: 已載入所有角點的 CameraCalibration (依影像相對路徑排序)
+        image_count: 所有分片的影像總數
+    """
+    db_files = sorted(glob.glob(os.path.join(db_dir, "shard_*_of_*.npz")))
+    if not db_files:
+        raise RuntimeError(f"找不到分片資料庫: {db_dir}")
+
+    merged = {}
+    base_meta = None
+    seen_shards = set()
+    for db_path in db_files:
+        meta, entries = load_corner_db(db_path)
+        if base_meta is None:
+            base_meta = meta
+        elif meta["shards"] != base_meta["shards"]:
+            raise RuntimeError(f"分片總數不一致: {os.path.basename(db_path)}")
+        elif ((meta["settings"]["board_width"], meta["settings"]["board_height"])
+              != (base_meta["settings"]["board_width"], base_meta["settings"]["board_height"])):
+            raise RuntimeError(f"標定板設定不一致: {os.path.basename(db_path)}")
+        elif meta["settings"].get("corner_refinement") != base_meta["settings"].get("corner_refinement"):
+            raise RuntimeError(f"角點精修方式不一致: {os.path.basename(db_path)}")
+        elif meta["settings"].get("raw_mode", "off") != base_meta["settings"].get("raw_mode", "off"):
+            raise RuntimeError(f"原始影像模式不一致: {os.path.basename(db_path)}")
+        seen_shards.add(meta["shard"])
+        merged.update(entries)
+
+    missing = sorted(set(range(base_meta["shards"])) - seen_shards)
+    if missing:
+        raise RuntimeError(f"缺少分片: {', '.join(str(s) for s in missing)}")
+
+    calibrator_settings = dict(base_meta["settings"])
+    calibrator_settings.update(settings or {})
+    calibrator = CameraCalibration(calibrator_settings)
+
+    for name in sorted(merged):
+        corners, image_size = merged[name][:2]
+        if image_size is not None:
+            if calibrator.image_size is None:
+                calibrator.image_size = image_size
+            elif image_size != calibrator.image_size:
+                raise RuntimeError(f"影像尺寸不一致: {name} {image_size} 與 {calibrator.image_size}")
+        if corners is not None:
+            calibrator.add_view(corners, name)
+
+    print(f"合併 {len(db_files)} 個分片: {len(calibrator.corner_store)}/{len(merged)} 張影像成功檢測")
+    return calibrator, len(merged)
+
+
+def run_local(images_folder, shards, db_dir, workers=None):
+    """
+    在本機以多個程序同時執行所有分片 (與多台機器執行的結果相同)
+
+    參數:
+        images_folder: 影像資料夾
+        shards: 分片總數
+        db_dir: 角點資料庫資料夾
+        workers: 每個分片的檢測執行緒數量
+
+    回傳:
+        success: 所有分片是否都成功
+    """
+    script = os.path.abspath(__file__)
+    commands = []
+    for shard in range(shards):
+        command = [sys.executable, script, "detect", images_folder,
+                   "--shard", str(shard), "--shards", str(shards), "--db", db_dir]
+        if workers:
+            command += ["--workers", str(workers)]
+        commands.append(command)
+
+    processes = [subprocess.Popen(command) for command in commands]
+    return_codes = [process.wait() for process in processes]
+    failed = [shard for shard, code in enumerate(return_codes) if code != 0]
+    if failed:
+        print(f"分片執行失敗: {', '.join(str(s) for s in failed)}")
+    return not failed
+
+
+def solve_merged(db_dir):
+    """
+    合併分片、標定並儲存結果
+    """
+    # 畸變係數項數等非檢測參數沿用目前的 config.ini
+    config_settings = CameraCalibration(verbose=False).get_settings()
+    overrides = {key: value for key, value in config_settings.items()
+                 if key not in ("board_width", "board_height")}
+
+    calibrator, image_count = merge_shards(db_dir, overrides)
+    if len(calibrator.corner_store) < calibrator.min_images:
+        print(f"成功檢測的影像不足 {calibrator.min_images} 張，無法標定")
+        return
+    if not calibrator.calibrate_camera(calibrator.image_size):
+        print("相機標定失敗")
+        return
+
+    calibrator.print_results()
+    output_file = default_result_path()
+    calibrator.save_results(output_file)
+    print_summary(calibrator, output_file)
+
+
+def main():
+    """
+    分片檢測主程式
+    """
+    parser = argparse.ArgumentParser(description="分片角點檢測與合併標定")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    detect_parser = subparsers.add_parser("detect", help="檢測一個分片")
+    detect_parser.add_argument("images", help="影像資料夾")
+    detect_parser.add_argument("--shard", type=int, required=True, help="分片編號 (從0開始)")
+    detect_parser.add_argument("--shards", type=int, required=True, help="分片總數")
+    detect_parser.add_argument("--db", required=True, help="角點資料庫資料夾 (共用檔案系統)")
+    detect_parser.add_argument("--workers", type=int, default=None, help="檢測執行緒數量 (預設為CPU核心數)")
+
+    merge_parser = subparsers.add_parser("merge", help="合併所有分片並標定")
+    merge_parser.add_argument("db", help="角點資料庫資料夾")
+
+    run_parser = subparsers.add_parser("run", help="在本機以多個程序執行所有分片後合併")
+    run_parser.add_argument("images", help="影像資料夾")
+    run_parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="分片總數 (預設為CPU核心數)")
+    run_parser.add_argument("--db", required=True, help="角點資料庫資料夾")
+    run_parser.add_argument("--workers", type=int, default=1, help="每個分片的檢測執行緒數量")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "detect":
+            settings = CameraCalibration(verbose=False).get_settings()
+            detect_shard(args.images, args.shard, args.shards, args.db, settings, args.workers)
+        elif args.command == "merge":
+            solve_merged(args.db)
+        else:
+            if run_local(args.images, args.shards, args.db, args.workers):
+                solve_merged(args.db)
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 雙目標定
+
+作者: Toby
+描述: 依檔名編號配對左右相機影像 (例如 Im_L_1.png / Im_R_1.png)，
+      同時檢測左右影像角點，沿用快取的角點與單目內參，
+      以固定內參執行 stereoCalibrate，輸出 R/T/E/F 與預先計算的校正映射表
+日期: 2026/10/18
+"""
+
+import sys
+import os
+import re
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    from camera_calibration import (cv2, np, CameraCalibration, collect_image_files,
+                                    detect_corners, load_calibration_result)
+    from corner_cache import CornerCache
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# 輸出資料夾中的檔案名稱
+STEREO_RESULT_FILE = "stereo_calibration.json"
+RECTIFY_MAPS_FILE = "rectify_maps.npz"
+LEFT_RESULT_FILE = "camera_left.json"
+RIGHT_RESULT_FILE = "camera_right.json"
+
+# 檔名中的左右標記與編號，例如 Im_L_1、cam_R_012
+SIDE_PATTERN = re.compile(r"(?:^|_)([LR])_(\d+)$", re.IGNORECASE)
+
+
+def index_side_files(image_files, side):
+    """
+    依檔名編號整理單側影像
+
+    參數:
+        image_files: 影像檔案路徑列表
+        side: "L" 或 "R"
+
+    回傳:
+        indexed: 編號 -> 影像路徑
+    """
+    indexed = {}
+    for image_path in image_files:
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        match = SIDE_PATTERN.search(stem)
+        if match and match.group(1).upper() == side:
+            indexed[int(match.group(2))] = image_path
+    return indexed
+
+
+def pair_image_files(left_folder, right_folder=None):
+    """
+    依編號配對左右影像
+
+    參數:
+        left_folder: 左相機影像資料夾
+        right_folder: 右相機影像資料夾 (預設與左相機相同)
+
+    回傳:
+        pairs: (編號, 左影像路徑, 右影像路徑) 列表，依編號排序
+        unmatched: 找不到對應影像的檔案數量
+    """
+    left = index_side_files(collect_image_files(left_folder), "L")
+    right = index_side_files(collect_image_files(right_folder or left_folder), "R")
+    common = sorted(set(left) & set(right))
+    pairs = [(index, left[index], right[index]) for index in common]
+    unmatched = len(left) + len(right) - 2 * len(common)
+    return pairs, unmatched
+
+
+class StereoCalibration:
+    """
+    雙目標定流程
+
+    左右相機各有一個 CameraCalibration：
+    單目內參使用該側所有成功檢測的影像 (不需要另一側也成功)，
+    雙目外參只使用兩側都成功的影像對。
+    """
+
+    def __init__(self, settings, cache=None, intrinsics_cache_path=None, workers=None):
+        """
+        初始化雙目標定
+
+        參數:
+            settings: 標定參數字典 (鍵名與 DEFAULT_SETTINGS 相同)
+            cache: CornerCache 物件 (None 表示不使用角點快取)
+            intrinsics_cache_path: 單目內參快取檔案 (None 表示不快取)
+            workers: 檢測執行緒數量 (預設為CPU核心數)
+        """
+        self.left = CameraCalibration(settings)
+        self.right = CameraCalibration(settings)
+        self.cache = cache
+        self.intrinsics_cache_path = intrinsics_cache_path
+        self.workers = workers or os.cpu_count() or 1
+
+        self.pairs = []
+        self.image_size = None
+        self.pair_indices = []     # 兩側都成功的影像對編號
+        self.left_keys = []        # 左相機有效影像的快取鍵 (作為內參快取的識別)
+        self.right_keys = []
+        self.stereo_left = []      # 兩側都成功的影像對的角點
+        self.stereo_right = []
+
+        # 雙目標定結果
+        self.rms_error = None
+        self.R = None
+        self.T = None
+        self.E = None
+        self.F = None
+        self.rectification = None
+        self.rectify_maps = None
+
+    def _detect(self, image_path):
+        """
+        檢測單一影像 (優先使用角點快取)
+
+        回傳:
+            corners: 角點座標，未找到時為 None
+            image_size: 影像尺寸，無法讀取時為 None
+            key: 快取鍵
+        """
+        board_size = self.left.board_size
+        refine_method = self.left.corner_refinement
+        raw_mode = self.left.raw_mode
+        key = CornerCache.file_key(image_path, board_size, refine_method, raw_mode)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached[0], cached[1], key
+
+        corners, image_size = detect_corners(image_path, board_size, refine_method, raw_mode)
+        if self.cache is not None and image_size is not None:
+            self.cache.put(key, corners, image_size)
+        return corners, image_size, key
+
+    def detect_pairs(self, pairs, executor):
+        """
+        同時檢測所有影像對的左右影像
+
+        參數:
+            pairs: pair_image_files 回傳的影像對列表
+            executor: 執行緒池
+        """
+        self.pairs = pairs
+        self.left.corner_store.clear()
+        self.right.corner_store.clear()
+        self.pair_indices, self.left_keys, self.right_keys = [], [], []
+        self.stereo_left, self.stereo_right = [], []
+
+        # 左右影像同時送出，OpenCV 檢測時會釋放 GIL
+        futures = [(index, left_path, right_path,
+                    executor.submit(self._detect, left_path), executor.submit(self._detect, right_path))
+                   for index, left_path, right_path in pairs]
+
+        for done, (index, left_path, right_path, left_future, right_future) in enumerate(futures, 1):
+            left_corners, left_size, left_key = left_future.result()
+            right_corners, right_size, right_key = right_future.result()
+
+            for size in (left_size, right_size):
+                if size is None:
+                    continue
+                if self.image_size is None:
+                    self.image_size = tuple(size)
+                elif tuple(size) != self.image_size:
+                    raise RuntimeError(f"影像尺寸不一致: {tuple(size)} 與 {self.image_size}")
+
+            if left_corners is not None:
+                self.left.add_view(left_corners, os.path.basename(left_path))
+                self.left_keys.append(left_key)
+            if right_corners is not None:
+                self.right.add_view(right_corners, os.path.basename(right_path))
+                self.right_keys.append(right_key)
+
+            paired = left_corners is not None and right_corners is not None
+            if paired:
+                self.pair_indices.append(index)
+                self.stereo_left.append(left_corners)
+                self.stereo_right.append(right_corners)
+
+            print(f"  {'✅' if paired else '❌'} 影像對 {index}: 左 {'成功' if left_corners is not None else '失敗'}，"
+                  f"右 {'成功' if right_corners is not None else '失敗'} ({done}/{len(pairs)})")
+
+        self.left.image_size = self.image_size
+        self.right.image_size = self.image_size
+
+    def _intrinsics_fingerprint(self, calibrator, keys):
+        """
+        單目內參快取的識別碼：相同的影像、標定板與畸變模型會得到相同的內參
+        """
+        settings = calibrator.get_settings()
+        identity = {
+            "board": [settings["board_width"], settings["board_height"], settings["square_size"]],
+            "distortion_coeffs_count": settings["distortion_coeffs_count"],
+            "corner_refinement": settings["corner_refinement"],
+            "raw_mode": settings["raw_mode"],
+            "image_size": list(self.image_size),
+            "views": sorted(keys)
+        }
+        return hashlib.sha1(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _load_intrinsics_cache(self):
+        if not self.intrinsics_cache_path or not os.path.exists(self.intrinsics_cache_path):
+            return {}
+        try:
+            with open(self.intrinsics_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"內參快取讀取錯誤，忽略快取: {e}")
+            return {}
+
+    def _save_intrinsics_cache(self, entries):
+        if not self.intrinsics_cache_path:
+            return
+        cache_dir = os.path.dirname(self.intrinsics_cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        temp_path = self.intrinsics_cache_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self.intrinsics_cache_path)
+
+    def solve_intrinsics(self, executor, left_result=None, right_result=None):
+        """
+        取得左右相機的單目內參
+
+        優先順序: 指定的結果檔案 -> 內參快取 -> 重新標定 (左右同時計算)
+
+        參數:
+            executor: 執行緒池
+            left_result: 左相機結果檔案路徑 (可選)
+            right_result: 右相機結果檔案路徑 (可選)
+        """
+        cache_entries = self._load_intrinsics_cache()
+        pending = {}
+
+        for label, calibrator, keys, result_path in (("左", self.left, self.left_keys, left_result),
+                                                      ("右", self.right, self.right_keys, right_result)):
+            if result_path:
+                calibrator.camera_matrix, calibrator.distortion_coeffs, data = load_calibration_result(result_path)
+                calibrator.rms_error = data["標定結果"]["RMS重投影誤差"]
+                print(f"{label}相機內參: 使用結果檔案 {result_path}")
+                continue
+
+            if len(calibrator.corner_store) < calibrator.min_images:
+                raise RuntimeError(f"{label}相機成功檢測的影像不足 {calibrator.min_images} 張 "
+                                   f"({len(calibrator.corner_store)} 張)")
+
+            fingerprint = self._intrinsics_fingerprint(calibrator, keys)
+            entry = cache_entries.get(fingerprint)
+            if entry is not None:
+                calibrator.camera_matrix = np.array(entry["camera_matrix"], dtype=np.float64)
+                calibrator.distortion_coeffs = np.array(entry["distortion_coeffs"], dtype=np.float64)
+                calibrator.rms_error = entry["rms_error"]
+                print(f"{label}相機內參: 使用快取 (RMS {calibrator.rms_error:.4f} 像素)")
+                continue
+
+            pending[label] = (calibrator, fingerprint,
+                              executor.submit(calibrator.calibrate_camera, self.image_size))
+
+        for label, (calibrator, fingerprint, future) in pending.items():
+            if not future.result():
+                raise RuntimeError(f"{label}相機標定失敗")
+            print(f"{label}相機內參: 標定完成，使用 {len(calibrator.corner_store)} 張影像，"
+                  f"RMS {calibrator.rms_error:.4f} 像素")
+            cache_entries[fingerprint] = {
+                "camera_matrix": calibrator.camera_matrix.tolist(),
+                "distortion_coeffs": calibrator.distortion_coeffs.tolist(),
+                "rms_error": float(calibrator.rms_error)
+            }
+
+        if pending:
+            self._save_intrinsics_cache(cache_entries)
+
+    def stereo_calibrate(self):
+        """
+        以固定的單目內參計算左右相機的相對位置
+
+        回傳:
+            success: 是否標定成功
+        """
+        if len(self.stereo_left) < self.left.min_images:
+            raise RuntimeError(f"兩側都成功的影像對不足 {self.left.min_images} 對 ({len(self.stereo_left)} 對)")
+
+        # 畸變模型旗標需與單目標定相同，係數才會以相同方式解讀
+        flags = cv2.CALIB_FIX_INTRINSIC | self.left._get_calibration_flags()
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 100, 1e-6)
+
+        (self.rms_error, _, _, _, _,
+         self.R, self.T, self.E, self.F) = cv2.stereoCalibrate(
+            [self.left.objp] * len(self.stereo_left),
+            self.stereo_left,
+            self.stereo_right,
+            self.left.camera_matrix, self.left.distortion_coeffs,
+            self.right.camera_matrix, self.right.distortion_coeffs,
+            self.image_size,
+            criteria=criteria,
+            flags=flags
+        )
+        return True
+
+    def compute_rectification(self):
+        """
+        計算立體校正參數與左右相機的校正映射表
+
+        映射表使用 CV_16SC2 定點格式，remap 時比浮點格式更快且檔案更小。
+        """
+        R1, R2, P1, P2, Q, roi_left, roi_right = cv2.stereoRectify(
+            self.left.camera_matrix, self.left.distortion_coeffs,
+            self.right.camera_matrix, self.right.distortion_coeffs,
+            self.image_size, self.R, self.T,
+            flags=cv2.CALIB_ZERO_DISPARITY, alpha=0
+        )
+        self.rectification = {"R1": R1, "R2": R2, "P1": P1, "P2": P2, "Q": Q,
+                              "roi_left": roi_left, "roi_right": roi_right}
+
+        left_map1, left_map2 = cv2.initUndistortRectifyMap(
+            self.left.camera_matrix, self.left.distortion_coeffs, R1, P1, self.image_size, cv2.CV_16SC2)
+        right_map1, right_map2 = cv2.initUndistortRectifyMap(
+            self.right.camera_matrix, self.right.distortion_coeffs, R2, P2, self.image_size, cv2.CV_16SC2)
+        self.rectify_maps = {"left_map1": left_map1, "left_map2": left_map2,
+                             "right_map1": right_map1, "right_map2": right_map2}
+
+    def get_result_data(self):
+        """
+        取得雙目標定結果資料
+        """
+        rect = self.rectification
+        baseline = float(np.linalg.norm(self.T))
+        return {
+            "標定時間": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "標定板設定": {
+                "內角點數量": f"{self.left.board_size[0]}x{self.left.board_size[1]}",
+                "方格尺寸_mm": self.left.square_size
+            },
+            "影像尺寸": list(self.image_size),
+            "使用影像對數量": len(self.pair_indices),
+            "使用影像對編號": self.pair_indices,
+            "雙目標定結果": {
+                "RMS重投影誤差": float(self.rms_error),
+                "基線長度_mm": baseline,
+                "旋轉矩陣_R": self.R.tolist(),
+                "平移向量_T": self.T.reshape(-1).tolist(),
+                "本質矩陣_E": self.E.tolist(),
+                "基礎矩陣_F": self.F.tolist()
+            },
+            "左相機": {
+                "相機內參矩陣": self.left.camera_matrix.tolist(),
+                "畸變係數": self.left.distortion_coeffs.reshape(-1).tolist(),
+                "單目RMS重投影誤差": float(self.left.rms_error)
+            },
+            "右相機": {
+                "相機內參矩陣": self.right.camera_matrix.tolist(),
+                "畸變係數": self.right.distortion_coeffs.reshape(-1).tolist(),
+                "單目RMS重投影誤差": float(self.right.rms_error)
+            },
+            "立體校正": {
+                "R1": rect["R1"].tolist(),
+                "R2": rect["R2"].tolist(),
+                "P1": rect["P1"].tolist(),
+                "P2": rect["P2"].tolist(),
+                "Q": rect["Q"].tolist(),
+                "左相機有效區域": list(rect["roi_left"]),
+                "右相機有效區域": list(rect["roi_right"]),
+                "校正映射檔": RECTIFY_MAPS_FILE,
+                "映射格式": "CV_16SC2 (map1) + CV_16UC1 (map2)，以 cv2.remap 使用"
+            }
+        }
+
+    def save_results(self, output_dir):
+        """
+        儲存雙目結果、校正映射表與左右單目結果
+
+        參數:
+            output_dir: 輸出資料夾
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        with open(os.path.join(output_dir, STEREO_RESULT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.get_result_data(), f, ensure_ascii=False, indent=4)
+
+        # 未壓縮的 npz，載入時不需解壓縮
+        np.savez(os.path.join(output_dir, RECTIFY_MAPS_FILE), **self.rectify_maps)
+
+        # 單目結果與一般標定結果格式相同，可作為下次的 --left-result / --right-result
+        if self.left.corner_store.count:
+            self.left.save_results(os.path.join(output_dir, LEFT_RESULT_FILE))
+        if self.right.corner_store.count:
+            self.right.save_results(os.path.join(output_dir, RIGHT_RESULT_FILE))
+
+
+def main():
+    """
+    雙目標定主程式
+    """
+    parser = argparse.ArgumentParser(description="雙目相機標定")
+    parser.add_argument("--images", help="包含左右影像的資料夾 (預設為程式目錄中的image資料夾)")
+    parser.add_argument("--right", help="右相機影像資料夾 (左右影像分開存放時使用)")
+    parser.add_argument("--left-result", help="沿用既有的左相機標定結果檔案")
+    parser.add_argument("--right-result", help="沿用既有的右相機標定結果檔案")
+    parser.add_argument("--output", help="輸出資料夾 (預設為 result/stereo_<時間戳記>)")
+    parser.add_argument("--workers", type=int, default=None, help="檢測執行緒數量 (預設為CPU核心數)")
+    parser.add_argument("--no-cache", action="store_true", help="不使用角點與內參快取")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    images_folder = args.images or os.path.join(script_dir, "image")
+
+    pairs, unmatched = pair_image_files(images_folder, args.right)
+    print(f"\n找到 {len(pairs)} 對左右影像")
+    if unmatched:
+        print(f"警告: {unmatched} 個影像找不到對應的另一側影像，將不使用")
+    if not pairs:
+        print("錯誤: 找不到左右配對的影像 (檔名需為 *_L_<編號> 與 *_R_<編號>)")
+        return
+
+    # 標定參數沿用 config.ini
+    try:
+        settings = CameraCalibration(verbose=False).get_settings()
+    except FileNotFoundError:
+        print("程式終止")
+        return
+
+    cache = None
+    intrinsics_cache_path = None
+    if not args.no_cache:
+        cache = CornerCache(os.path.join(script_dir, "cache", "corners.json"))
+        intrinsics_cache_path = os.path.join(script_dir, "cache", "intrinsics.json")
+
+    stereo = StereoCalibration(settings, cache, intrinsics_cache_path, args.workers)
+
+    with ThreadPoolExecutor(max_workers=stereo.workers) as executor:
+        print(f"\n檢測角點 ({stereo.workers} 個執行緒)...")
+        stereo.detect_pairs(pairs, executor)
+        if cache is not None:
+            cache.save()
+
+        print(f"\n兩側都成功的影像對: {len(stereo.pair_indices)}/{len(pairs)}")
+        try:
+            stereo.solve_intrinsics(executor, args.left_result, args.right_result)
+            stereo.stereo_calibrate()
+        except RuntimeError as e:
+            print(f"錯誤: {e}")
+            return
+
+    stereo.compute_rectification()
+
+    output_dir = args.output or os.path.join(
+        script_dir, "result", f"stereo_{datetime.now().strftime('%Y_%m_%d_%H_%M_%S')}")
+    stereo.save_results(output_dir)
+
+    print("\n" + "=" * 60)
+    print("雙目標定結果")
+    print("=" * 60)
+    print(f"使用影像對: {len(stereo.pair_indices)} 對")
+    print(f"雙目RMS重投影誤差: {stereo.rms_error:.4f} 像素")
+    print(f"基線長度: {np.linalg.norm(stereo.T):.2f} mm")
+    print(f"\n旋轉矩陣 R:\n{stereo.R}")
+    print(f"\n平移向量 T:\n{stereo.T.reshape(-1)}")
+    print(f"\n結果已儲存至: {output_dir}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 標定漂移檢查
+
+作者: Toby
+描述: 以已儲存的標定結果檢查相機是否仍符合原本的標定，不需重新標定。
+      對少量新影像檢測角點，固定內參與畸變以 solvePnP 求每張影像的姿態，
+      計算重投影誤差並與誤差警告閾值比較，輸出通過/未通過與漂移統計
+日期: 2026/10/18
+"""
+
+import sys
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from camera_calibration import (cv2, np, CameraCalibration, DEFAULT_SETTINGS, REFINE_METHODS, RAW_MODES,
+                                    collect_image_files, detect_corners, load_calibration_result)
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+def board_from_result(calibration_data):
+    """
+    由結果檔案取得標定板設定
+
+    回傳:
+        board_size: 內角點數量 (寬, 高)
+        objp: 棋盤格三維座標 (N,3)
+    """
+    board = calibration_data["標定板設定"]
+    width, height = (int(v) for v in board["內角點數量"].lower().split("x"))
+    objp = np.zeros((width * height, 3), np.float32)
+    objp[:, :2] = np.mgrid[0:width, 0:height].T.reshape(-1, 2) * float(board["方格尺寸_mm"])
+    return (width, height), objp
+
+
+def verify_view(image_path, board_size, objp, camera_matrix, distortion_coeffs, refine_method="adaptive",
+                raw_mode="off"):
+    """
+    檢測單一影像並以固定內參計算重投影誤差
+
+    回傳:
+        view: 包含 name, image_size, rms, distance, residuals, corners 的字典，
+              未找到角點時 rms 為 None
+    """
+    corners, image_size = detect_corners(image_path, board_size, refine_method, raw_mode)
+    view = {"name": os.path.basename(image_path), "image_size": image_size, "rms": None}
+    if corners is None:
+        return view
+
+    ok, rvec, tvec = cv2.solvePnP(objp, corners, camera_matrix, distortion_coeffs,
+                                  flags=cv2.SOLVEPNP_ITERATIVE)
+    if not ok:
+        return view
+    projected, _ = cv2.projectPoints(objp, rvec, tvec, camera_matrix, distortion_coeffs)
+    residuals = projected.reshape(-1, 2).astype(np.float64) - corners.reshape(-1, 2)
+
+    view.update({
+        "rms": float(np.sqrt((residuals ** 2).sum(axis=1).mean())),
+        "distance": float(np.linalg.norm(tvec)),
+        "residuals": residuals,
+        "corners": corners.reshape(-1, 2).astype(np.float64)
+    })
+    return view
+
+
+def verify_calibration(result_path, image_files, error_threshold, workers=None, refine_method=None,
+                       raw_mode=None):
+    """
+    以固定內參檢查新影像的重投影誤差
+
+    漂移統計 (每張影像的姿態各自求解，整體平移會被姿態吸收，因此看殘差的分布):
+    - RMS變化倍率: 相對於標定時的RMS
+    - 徑向殘差: 殘差在離主點方向的分量，分內圈/外圈平均 (兩者差異大表示焦距或畸變改變，例如鏡頭對焦變動)
+
+    參數:
+        result_path: 標定結果JSON檔案
+        image_files: 檢查用的影像路徑列表
+        error_threshold: 重投影誤差閾值 (像素)
+        workers: 檢測執行緒數量 (None 表示CPU核心數)
+        refine_method: 角點精修方式 (None 表示與標定時相同；較舊的結果檔案沒有記錄，視為 fixed)
+        raw_mode: 原始影像模式 (None 表示與標定時相同)
+
+    回傳:
+        report: 檢查報告字典
+    """
+    camera_matrix, distortion_coeffs, calibration_data = load_calibration_result(result_path)
+    board_size, objp = board_from_result(calibration_data)
+    if refine_method is None:
+        refine_method = calibration_data.get("角點精修方式", "fixed")
+    if raw_mode is None:
+        raw_mode = calibration_data.get("原始影像模式", "off")
+    stored_size = calibration_data.get("影像尺寸")
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        views = list(executor.map(
+            lambda path: verify_view(path, board_size, objp, camera_matrix, distortion_coeffs, refine_method,
+                                     raw_mode),
+            image_files))
+
+    for view in views:
+        if stored_size is not None and view["image_size"] is not None \
+                and list(view["image_size"]) != list(stored_size):
+            raise ValueError(f"影像尺寸 {view['image_size'][0]}x{view['image_size'][1]} 與標定結果 "
+                             f"{stored_size[0]}x{stored_size[1]} 不同: {view['name']}")
+
+    valid = [view for view in views if view["rms"] is not None]
+    report = {
+        "標定結果檔案": result_path,
+        "檢查影像數量": len(views),
+        "成功檢測影像數量": len(valid),
+        "誤差警告閾值": error_threshold,
+        "角點精修方式": refine_method,
+        "原始影像模式": raw_mode,
+        "原始RMS重投影誤差": calibration_data["標定結果"]["RMS重投影誤差"],
+        "未檢測到角點": [view["name"] for view in views if view["rms"] is None]
+    }
+    if not valid:
+        report["通過"] = False
+        return report
+
+    residuals = np.concatenate([view["residuals"] for view in valid])
+    corners = np.concatenate([view["corners"] for view in valid])
+    rms = float(np.sqrt((residuals ** 2).sum(axis=1).mean()))
+
+    # 殘差在徑向 (離主點方向) 的分量
+    offsets = corners - camera_matrix[:2, 2]
+    radius = np.linalg.norm(offsets, axis=1)
+    radial = (residuals * offsets).sum(axis=1) / np.maximum(radius, 1e-9)
+    outer = radius > np.median(radius)
+
+    report.update({
+        "RMS重投影誤差": rms,
+        "RMS變化倍率": rms / report["原始RMS重投影誤差"] if report["原始RMS重投影誤差"] > 0 else None,
+        "最大單張RMS": max(view["rms"] for view in valid),
+        "徑向殘差_內圈_像素": float(radial[~outer].mean()) if (~outer).any() else 0.0,
+        "徑向殘差_外圈_像素": float(radial[outer].mean()) if outer.any() else 0.0,
+        "超過閾值的影像": [view["name"] for view in valid if view["rms"] > error_threshold],
+        "各影像": [{"影像": view["name"], "RMS": view["rms"], "距離_mm": view["distance"]} for view in valid],
+        "通過": rms <= error_threshold
+    })
+    return report
+
+
+def main():
+    """
+    漂移檢查主程式 (通過時結束代碼為0，未通過為1，方便排程執行)
+    """
+    parser = argparse.ArgumentParser(description="以既有標定結果檢查相機是否漂移")
+    parser.add_argument("result", help="標定結果JSON檔案")
+    parser.add_argument("--images", help="檢查用影像資料夾 (預設為程式目錄中的image資料夾)")
+    parser.add_argument("--max-images", type=int, default=None, help="最多使用的影像數量")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="重投影誤差閾值 (像素，預設使用 config.ini 的誤差警告閾值)")
+    parser.add_argument("--refine", choices=REFINE_METHODS, default=None,
+                        help="角點精修方式 (預設與標定結果相同)")
+    parser.add_argument("--raw", choices=RAW_MODES, default=None,
+                        help="原始影像模式 (預設與標定結果相同)")
+    parser.add_argument("--output", help="將檢查報告另存為JSON檔案")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    images_folder = args.images or os.path.join(script_dir, "image")
+    image_files = collect_image_files(images_folder)
+    if args.max_images:
+        image_files = image_files[:args.max_images]
+    if not image_files:
+        print(f"錯誤: 在 {images_folder} 中找不到影像檔案")
+        sys.exit(1)
+
+    error_threshold = args.threshold
+    if error_threshold is None:
+        try:
+            error_threshold = CameraCalibration(verbose=False).error_threshold
+        except FileNotFoundError:
+            error_threshold = DEFAULT_SETTINGS["error_threshold"]
+
+    try:
+        report = verify_calibration(args.result, image_files, error_threshold, refine_method=args.refine,
+                                    raw_mode=args.raw)
+    except (ValueError, KeyError, FileNotFoundError) as e:
+        print(f"錯誤: {e}")
+        sys.exit(1)
+
+    print(f"\n標定結果: {args.result}")
+    print(f"成功檢測: {report['成功檢測影像數量']}/{report['檢查影像數量']} 張影像")
+    if "RMS重投影誤差" in report:
+        print(f"RMS重投影誤差: {report['RMS重投影誤差']:.4f} 像素 "
+              f"(標定時 {report['原始RMS重投影誤差']:.4f}，最大單張 {report['最大單張RMS']:.4f})")
+        if report["RMS變化倍率"] is not None:
+            print(f"RMS變化倍率: {report['RMS變化倍率']:.2f}")
+        print(f"徑向殘差: 內圈 {report['徑向殘差_內圈_像素']:+.3f}，外圈 {report['徑向殘差_外圈_像素']:+.3f} 像素")
+        if report["超過閾值的影像"]:
+            print(f"超過閾值的影像: {', '.join(report['超過閾值的影像'])}")
+    print(f"\n檢查結果: {'通過' if report['通過'] else '未通過'} (閾值 {error_threshold} 像素)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"報告已儲存至: {args.output}")
+
+    sys.exit(0 if report["通過"] else 1)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
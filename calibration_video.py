@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 影片標定
+
+作者: Toby
+描述: 由影片檔或攝影機擷取標定視角。標定板在相鄰影格間移動很小，
+      因此以光流追蹤上一影格的角點 (只在標定板附近的ROI內計算)，
+      再以 cornerSubPix 局部精修並檢查棋盤格幾何，追蹤失敗時才重新完整搜尋
+日期: 2026/10/18
+"""
+
+import sys
+import time
+import argparse
+
+try:
+    from camera_calibration import (cv2, np, CameraCalibration, find_chessboard_corners,
+                                    default_result_path, print_summary)
+    from corner_refine import refine_corners
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+class CornerTracker:
+    """
+    棋盤格角點追蹤器
+
+    每個影格依序嘗試:
+    1. 以上一影格的移動量 (等速假設) 預測角點，直接以小視窗 cornerSubPix 精修
+    2. 預測失敗時，在標定板附近的ROI內以金字塔 Lucas-Kanade 光流 (前向 + 反向檢查) 追蹤
+    3. 追蹤遺失時才以 findChessboardCorners 完整搜尋
+    每次精修後都以上一影格 -> 目前影格的單應矩陣檢查整個棋盤格的幾何是否一致。
+    """
+
+    def __init__(self, board_size, track_window=(5, 5), roi_margin=40,
+                 max_flow_error=1.0, max_geometry_error=1.5, refine_method="adaptive"):
+        """
+        初始化追蹤器
+
+        參數:
+            board_size: 棋盤格內角點數量 (寬, 高)
+            track_window: 追蹤時 cornerSubPix 的半視窗大小 (比完整檢測小，速度較快)
+            roi_margin: 光流ROI在角點範圍外額外保留的像素 (另加上一影格的移動量)
+            max_flow_error: 前向-反向光流的最大誤差 (像素)
+            max_geometry_error: 精修後角點與單應矩陣預測的最大誤差 (像素)
+            refine_method: 完整搜尋時的角點精修方式 (REFINE_METHODS 之一)
+        """
+        self.board_size = tuple(board_size)
+        self.track_window = tuple(track_window)
+        self.roi_margin = roi_margin
+        self.max_flow_error = max_flow_error
+        self.max_geometry_error = max_geometry_error
+        self.refine_method = refine_method
+        self.criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+        self.flow_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+
+        self.predicted_frames = 0  # 等速預測即成功的影格數
+        self.tracked_frames = 0    # 追蹤成功的影格數 (含等速預測)
+        self.full_searches = 0     # 完整搜尋次數
+        self.lost_count = 0        # 追蹤遺失次數
+        self.reset()
+
+    def reset(self):
+        """
+        清除追蹤狀態 (下一影格將完整搜尋)
+        """
+        self.previous_gray = None
+        self.corners = None
+        self.velocity = None
+        self.last_method = None
+
+    def update(self, gray):
+        """
+        處理一個影格
+
+        參數:
+            gray: 灰階影格
+
+        回傳:
+            corners: 角點座標 (N,1,2)，找不到標定板時為 None
+        """
+        corners = None
+        if self.corners is not None:
+            corners = self._track(gray)
+            if corners is not None:
+                self.tracked_frames += 1
+            else:
+                self.lost_count += 1
+
+        if corners is None:
+            self.full_searches += 1
+            corners = find_chessboard_corners(gray, self.board_size, self.refine_method)
+            self.last_method = "detected" if corners is not None else None
+
+        if corners is not None and self.corners is not None:
+            self.velocity = corners - self.corners
+        else:
+            self.velocity = None
+        self.previous_gray = gray
+        self.corners = corners
+        return corners
+
+    def refine_view(self, gray, corners):
+        """
+        將追蹤得到的角點以完整檢測相同的精修方式精修 (要作為標定視角時使用)
+
+        參數:
+            gray: 灰階影格
+            corners: 本影格 update() 回傳的角點
+
+        回傳:
+            corners: 與完整檢測相同精度的角點
+        """
+        if self.last_method == "detected":
+            return corners
+        return refine_corners(gray, corners.copy(), self.board_size, self.refine_method)
+
+    def _refine(self, gray, predicted):
+        """
+        以小視窗精修預測的角點並檢查幾何
+
+        只用於追蹤 (固定使用 track_window 以求速度)；作為標定視角的影格會再由 refine_view 依 refine_method 精修
+
+        回傳:
+            corners: 精修後的角點 (N,1,2)，不可靠時為 None
+        """
+        height, width = gray.shape[:2]
+        if (predicted[..., 0].min() < 0 or predicted[..., 1].min() < 0
+                or predicted[..., 0].max() >= width or predicted[..., 1].max() >= height):
+            return None
+        corners = cv2.cornerSubPix(gray, predicted.astype(np.float32), self.track_window,
+                                   (-1, -1), self.criteria)
+
+        # 幾何檢查: 相鄰影格間整個棋盤格應符合同一個單應變換
+        previous = self.corners.reshape(-1, 2)
+        homography, _ = cv2.findHomography(previous, corners.reshape(-1, 2), 0)
+        if homography is None:
+            return None
+        expected = cv2.perspectiveTransform(previous.reshape(-1, 1, 2), homography)
+        if np.abs(expected - corners).max() > self.max_geometry_error:
+            return None
+        return corners
+
+    def _track(self, gray):
+        """
+        由上一影格追蹤角點
+
+        回傳:
+            corners: 精修後的角點 (N,1,2)，追蹤失敗時為 None
+        """
+        # 等速預測: 平順移動時不需計算光流
+        if self.velocity is not None:
+            corners = self._refine(gray, self.corners + self.velocity)
+            if corners is not None:
+                self.predicted_frames += 1
+                self.last_method = "predicted"
+                return corners
+
+        height, width = gray.shape[:2]
+        previous = self.corners.reshape(-1, 2)
+        motion = 0.0 if self.velocity is None else float(np.abs(self.velocity).max())
+
+        # 只在標定板附近計算光流金字塔
+        margin = self.roi_margin + 2.0 * motion
+        x0 = max(int(previous[:, 0].min() - margin), 0)
+        y0 = max(int(previous[:, 1].min() - margin), 0)
+        x1 = min(int(np.ceil(previous[:, 0].max() + margin)) + 1, width)
+        y1 = min(int(np.ceil(previous[:, 1].max() + margin)) + 1, height)
+        offset = np.array([x0, y0], dtype=np.float32)
+
+        previous_roi = self.previous_gray[y0:y1, x0:x1]
+        current_roi = gray[y0:y1, x0:x1]
+        local = (previous - offset).reshape(-1, 1, 2)
+
+        predicted, status, _ = cv2.calcOpticalFlowPyrLK(
+            previous_roi, current_roi, local, None,
+            winSize=(21, 21), maxLevel=3, criteria=self.flow_criteria)
+        if predicted is None or not status.all():
+            return None
+
+        # 反向追蹤應回到原位置，否則光流不可靠
+        returned, status, _ = cv2.calcOpticalFlowPyrLK(
+            current_roi, previous_roi, predicted, None,
+            winSize=(21, 21), maxLevel=3, criteria=self.flow_criteria)
+        if returned is None or not status.all():
+            return None
+        if np.abs(returned - local).max() > self.max_flow_error:
+            return None
+
+        corners = self._refine(gray, predicted + offset)
+        if corners is not None:
+            self.last_method = "tracked"
+        return corners
+
+
+def open_video_source(source):
+    """
+    開啟影片檔或攝影機
+
+    參數:
+        source: 影片檔路徑，或攝影機編號 (字串形式的整數)
+
+    回傳:
+        capture: cv2.VideoCapture，無法開啟時為 None
+    """
+    capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not capture.isOpened():
+        return None
+    return capture
+
+
+def collect_video_views(calibrator, capture, min_motion=20.0, max_views=40,
+                        max_frames=None, tracking=True, realtime=False):
+    """
+    由影片擷取標定視角
+
+    標定板相對上一個採用的視角移動超過 min_motion 像素才加入新視角，避免大量幾乎相同的影格。
+
+    參數:
+        calibrator: CameraCalibration 物件 (視角會加入其 corner_store)
+        capture: cv2.VideoCapture
+        min_motion: 新視角與上一個採用視角的最小平均角點位移 (像素)
+        max_views: 最多採用的視角數量
+        max_frames: 最多讀取的影格數 (None 表示讀到結尾)
+        tracking: 是否啟用追蹤 (False 時每個影格都完整搜尋)
+        realtime: 影片檔依原始幀率讀取 (模擬攝影機)
+
+    回傳:
+        stats: 影格數、追蹤/完整搜尋次數與平均每影格檢測時間的字典
+    """
+    calibrator.corner_store.clear()
+    tracker = CornerTracker(calibrator.board_size, refine_method=calibrator.corner_refinement)
+    last_view = None
+    frame_index = 0
+    detect_seconds = 0.0
+    frame_interval = 0.0
+    if realtime:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+    start_time = time.perf_counter()
+
+    while max_frames is None or frame_index < max_frames:
+        if frame_interval:
+            delay = start_time + frame_index * frame_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        ret, frame = capture.read()
+        if not ret:
+            break
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        calibrator.image_size = (gray.shape[1], gray.shape[0])
+
+        detect_start = time.perf_counter()
+        if not tracking:
+            tracker.reset()
+        corners = tracker.update(gray)
+        detect_seconds += time.perf_counter() - detect_start
+
+        if corners is not None:
+            motion = np.inf if last_view is None else float(
+                np.linalg.norm((corners - last_view).reshape(-1, 2), axis=1).mean())
+            if motion >= min_motion:
+                corners = tracker.refine_view(gray, corners)
+                calibrator.add_view(corners, f"frame_{frame_index:06d}")
+                last_view = corners
+                if len(calibrator.corner_store) >= max_views:
+                    frame_index += 1
+                    break
+
+        frame_index += 1
+
+    return {
+        "frames": frame_index,
+        "views": len(calibrator.corner_store),
+        "tracked_frames": tracker.tracked_frames,
+        "predicted_frames": tracker.predicted_frames,
+        "full_searches": tracker.full_searches,
+        "lost": tracker.lost_count,
+        "ms_per_frame": detect_seconds * 1000.0 / max(frame_index, 1)
+    }
+
+
+def main():
+    """
+    影片標定主程式
+    """
+    parser = argparse.ArgumentParser(description="由影片或攝影機進行相機內參標定")
+    parser.add_argument("source", help="影片檔路徑，或攝影機編號 (例如 0)")
+    parser.add_argument("--min-motion", type=float, default=20.0,
+                        help="新視角與上一個採用視角的最小平均角點位移 (像素)")
+    parser.add_argument("--max-views", type=int, default=40, help="最多採用的視角數量")
+    parser.add_argument("--max-frames", type=int, default=None, help="最多讀取的影格數")
+    parser.add_argument("--no-tracking", action="store_true", help="停用追蹤，每個影格都完整搜尋 (比較用)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="即時模式: 以指定數量的檢測行程 (共享記憶體傳遞影格) 處理，來不及時捨棄舊影格")
+    parser.add_argument("--realtime", action="store_true", help="影片檔依原始幀率讀取 (模擬攝影機)")
+    args = parser.parse_args()
+
+    try:
+        calibrator = CameraCalibration()
+    except FileNotFoundError:
+        print("程式終止")
+        return
+
+    if calibrator.raw_mode != "off":
+        # 影格由 VideoCapture 解碼為8位元影像，沒有原始資料可用
+        print(f"錯誤: 影片與攝影機標定不支援原始影像模式 ({calibrator.raw_mode})，"
+              f"請將 config.ini 的原始影像模式設為 off")
+        return
+
+    capture = open_video_source(args.source)
+    if capture is None:
+        print(f"錯誤: 無法開啟影片來源 {args.source}")
+        return
+
+    print(f"\n讀取影片: {args.source}")
+    try:
+        if args.workers > 0:
+            from calibration_live import collect_live_views
+            stats = collect_live_views(calibrator, capture, args.workers, min_motion=args.min_motion,
+                                       max_views=args.max_views, max_frames=args.max_frames,
+                                       realtime=args.realtime)
+        else:
+            stats = collect_video_views(calibrator, capture, args.min_motion, args.max_views,
+                                        args.max_frames, tracking=not args.no_tracking,
+                                        realtime=args.realtime)
+    finally:
+        capture.release()
+
+    print(f"\n影格數: {stats['frames']}，採用視角: {stats['views']}")
+    if args.workers > 0:
+        print(f"檢測行程: {args.workers} 個，已檢測 {stats['processed']} 影格，捨棄 {stats['dropped']} 影格"
+              f" (檢測吞吐量 {stats['detections_per_second']:.1f} 影格/秒)")
+    else:
+        print(f"追蹤成功: {stats['tracked_frames']} 影格 (其中 {stats['predicted_frames']} 影格只需等速預測)，"
+              f"完整搜尋: {stats['full_searches']} 次"
+              f" (追蹤遺失 {stats['lost']} 次)")
+        print(f"平均每影格檢測時間: {stats['ms_per_frame']:.2f} ms")
+
+    if stats["views"] < calibrator.min_images:
+        print(f"錯誤: 採用的視角不足 {calibrator.min_images} 個，請移動標定板或降低 --min-motion")
+        return
+
+    if not calibrator.calibrate_camera(calibrator.image_size):
+        print("相機標定失敗")
+        return
+
+    calibrator.print_results()
+    output_file = default_result_path()
+    calibrator.save_results(output_file)
+    print_summary(calibrator, output_file)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 監看資料夾模式
+
+作者: Toby
+描述: 拍攝期間持續監看影像資料夾，新影像寫入後立即檢測角點，
+      達到最少影像數量後以上一次結果為初始值重新標定，即時更新結果
+日期: 2026/10/18
+"""
+
+import os
+import time
+import threading
+
+from camera_calibration import collect_image_files, default_result_path, print_summary
+
+
+class FolderWatcher:
+    """
+    影像資料夾監看器
+
+    以輪詢方式檢查資料夾 (不需額外套件，網路磁碟也適用)，
+    檔案大小連續兩次檢查不變才視為寫入完成，避免讀到拍攝中的檔案。
+    檢測與重新標定都在同一個背景執行緒中依序執行。
+    """
+
+    def __init__(self, calibrator, images_folder, interval=1.0,
+                 on_image=None, on_result=None, on_error=None):
+        """
+        初始化監看器
+
+        參數:
+            calibrator: CameraCalibration 物件 (檢測結果會累加到其 corner_store)
+            images_folder: 監看的影像資料夾
+            interval: 資料夾檢查間隔 (秒)
+            on_image: 每張新影像檢測完成時呼叫 (可選)，參數為 (影像路徑, 角點座標或None)
+            on_result: 每次重新標定完成時呼叫 (可選)，參數為 calibrator
+            on_error: 背景執行緒發生錯誤時呼叫 (可選)，參數為例外物件
+        """
+        self.calibrator = calibrator
+        self.images_folder = images_folder
+        self.interval = interval
+        self.on_image = on_image
+        self.on_result = on_result
+        self.on_error = on_error
+
+        self.processed = set()     # 已檢測的影像路徑
+        self.pending_sizes = {}    # 尚未確認寫入完成的影像 -> 上次看到的檔案大小
+        self.solved_views = 0      # 上次標定時使用的影像數量
+        self.image_count = 0       # 已檢測的影像數量
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # 清除先前的資料，監看期間逐張累加
+        self.calibrator.corner_store.clear()
+        self.calibrator.detection_failures = {}
+
+    def start(self):
+        """
+        啟動背景監看執行緒
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        停止監看 (等待目前的檢測或標定完成)
+
+        參數:
+            timeout: 最長等待時間 (秒)
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        """
+        監看執行緒是否仍在執行
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+                else:
+                    print(f"監看錯誤: {e}")
+            self._stop_event.wait(self.interval)
+
+    def find_ready_files(self):
+        """
+        找出已寫入完成且尚未檢測的影像
+
+        回傳:
+            ready: 影像路徑列表 (依檔名排序)
+        """
+        ready = []
+        for image_path in collect_image_files(self.images_folder):
+            if image_path in self.processed:
+                continue
+            try:
+                size = os.path.getsize(image_path)
+            except OSError:
+                # 檔案可能正在被移動或刪除
+                continue
+
+            if size > 0 and self.pending_sizes.get(image_path) == size:
+                ready.append(image_path)
+                del self.pending_sizes[image_path]
+            else:
+                self.pending_sizes[image_path] = size
+        return ready
+
+    def poll_once(self):
+        """
+        檢查一次資料夾：檢測新影像，有新的有效影像時重新標定
+
+        回傳:
+            new_files: 本次檢測的影像路徑列表
+        """
+        new_files = self.find_ready_files()
+        if not new_files:
+            return new_files
+        calibrator = self.calibrator
+
+        # 設定檢測時限時經由看門狗程序檢測，逾時或崩潰的影像記錄在 detection_failures 後不再重試
+        detections = calibrator.iter_views([(path, path) for path in new_files], self._stop_event)
+        for image_path, views in detections:
+            self.processed.add(image_path)
+            self.image_count += 1
+            for view_name, corners in views:
+                calibrator.add_view(corners, view_name)
+            if self.on_image is not None:
+                self.on_image(image_path, views[0][1] if views else None)
+
+        self.update_result()
+        return new_files
+
+    def update_result(self):
+        """
+        有尚未納入標定的新影像時重新標定
+
+        回傳:
+            updated: 是否產生了新的標定結果
+        """
+        calibrator = self.calibrator
+        views = len(calibrator.corner_store)
+        if views <= self.solved_views or views < calibrator.min_images or calibrator.image_size is None:
+            return False
+
+        # 已有結果時以其作為初始值，只需少量迭代即可收斂
+        if not calibrator.calibrate_camera(calibrator.image_size, warm_start=self.solved_views > 0):
+            return False
+
+        self.solved_views = views
+        if self.on_result is not None:
+            self.on_result(calibrator)
+        return True
+
+
+def run_watch(calibrator, images_folder, interval=1.0):
+    """
+    命令行監看模式：持續更新標定結果，按 Ctrl+C 結束並儲存最後結果
+
+    參數:
+        calibrator: CameraCalibration 物件
+        images_folder: 監看的影像資料夾
+        interval: 資料夾檢查間隔 (秒)
+    """
+    def on_result(result):
+        print(f"\n[即時結果] 使用 {len(result.corner_store)} 張影像，"
+              f"RMS {result.rms_error:.4f} 像素，"
+              f"fx={result.camera_matrix[0, 0]:.2f} fy={result.camera_matrix[1, 1]:.2f} "
+              f"cx={result.camera_matrix[0, 2]:.2f} cy={result.camera_matrix[1, 2]:.2f}")
+
+    watcher = FolderWatcher(calibrator, images_folder, interval, on_result=on_result)
+    print(f"\n監看資料夾中，新影像將即時檢測 (需至少 {calibrator.min_images} 張成功影像才開始標定)")
+    print("按 Ctrl+C 結束監看並儲存結果")
+
+    watcher.start()
+    try:
+        while watcher.is_running():
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("\n\n結束監看...")
+    finally:
+        watcher.stop()
+
+    # 停止時若仍有尚未納入標定的影像，做最後一次標定
+    watcher.update_result()
+
+    if calibrator.camera_matrix is None:
+        print(f"成功檢測的影像不足 {calibrator.min_images} 張，未產生標定結果")
+        return
+
+    calibrator.print_results()
+    output_file = default_result_path()
+    calibrator.save_results(output_file)
+    print_summary(calibrator, output_file)
@@ -8,21 +8,522 @@
 日期: 2025/07/22
 """
 
-import sys
 import os
+import posixpath
+import glob
+import json
+import weakref
+import argparse
+import tempfile
+import importlib
+import itertools
+import configparser
+from datetime import datetime
+
+
+class _LazyModule:
+    """
+    延遲載入的模組代理
+
+    第一次存取屬性時才真正導入模組，
+    讓只需要設定或結果處理的程式不必負擔 OpenCV/NumPy 的載入時間。
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                raise ImportError(f"導入錯誤: {e}，請確保已安裝 opencv-python 和 numpy") from e
+        return getattr(self._module, attr)
+
+
+# 導入所需套件 (延遲載入)
+cv2 = _LazyModule("cv2")
+np = _LazyModule("numpy")
+
+
+# 支援的影像格式
+IMAGE_EXTENSIONS = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.tif']
+
+# 自動偵測內角點數量時使用的樣本影像數量
+BOARD_SIZE_SAMPLES = 3
+
+# 支援的畸變係數項數
+VALID_DISTORTION_COUNTS = [5, 8, 12, 14]
+
+# 角點亞像素精修方式 (見 corner_refine.py)
+#   fixed: 固定 (11,11) 視窗，adaptive: 視窗依方格大小決定，saddle: NumPy 鞍點擬合
+REFINE_METHODS = ("fixed", "adaptive", "saddle")
+
+# 原始影像輸入模式 (見 raw_input.py)
+#   off: 一般影像，mono: 高位元深度單色影像，RGGB/BGGR/GRBG/GBRG: Bayer 原始影像 (感測器左上角的排列)
+RAW_MODES = ("off", "mono", "RGGB", "BGGR", "GRBG", "GBRG")
+
+# 以字典注入設定時的預設值 (鍵名與GUI的 ui_settings.json 相同)
+DEFAULT_SETTINGS = {
+    "board_width": 11,
+    "board_height": 7,
+    "auto_board_size": False,
+    "square_size": 30.0,
+    "focal_length": 50.0,
+    "min_images": 5,
+    "error_threshold": 1.0,
+    "distortion_coeffs_count": 5,
+    "max_boards": 1,
+    "detection_timeout": 0.0,
+    "corner_refinement": "adaptive",
+    "raw_mode": "off",
+    "corner_spill_views": 0,
+    "save_full_matrix": True,
+    "save_full_distortion": True
+}
+
+
+class CalibrationCancelled(Exception):
+    """
+    標定流程被使用者取消
+    """
+
+
+def collect_image_files(images_folder):
+    """
+    收集資料夾中所有支援格式的影像檔案
+    
+    參數:
+        images_folder: 影像資料夾路徑
+        
+    回傳:
+        image_files: 排序後的影像檔案路徑列表
+    """
+    image_files = []
+    for extension in IMAGE_EXTENSIONS:
+        image_files.extend(glob.glob(os.path.join(images_folder, extension)))
+        image_files.extend(glob.glob(os.path.join(images_folder, extension.upper())))
+    
+    # 移除重複項 (相同檔案但副檔名大小寫不同)，並排序以確保處理順序固定
+    return sorted(set(image_files))
+
+
+def board_size_samples(items):
+    """
+    平均取出自動偵測內角點數量使用的樣本 (最多 BOARD_SIZE_SAMPLES 個)
+    
+    參數:
+        items: 影像來源列表
+        
+    回傳:
+        samples: 依原順序排列的樣本列表
+    """
+    count = min(BOARD_SIZE_SAMPLES, len(items))
+    indices = sorted({round(i * (len(items) - 1) / max(count - 1, 1)) for i in range(count)})
+    return [items[index] for index in indices]
+
+
+def settings_from_config(config):
+    """
+    將 config.ini 格式的設定轉換為參數字典
+    
+    參數:
+        config: ConfigParser 物件
+        
+    回傳:
+        settings: 參數字典 (鍵名與 DEFAULT_SETTINGS 相同)
+    """
+    board_size_str = config.get('標定板設定', '內角點數量')
+    width, height = map(int, board_size_str.split(','))
+    
+    return {
+        # 相機設定
+        "focal_length": config.getfloat('相機設定', '物理焦距'),
+        # 標定板設定
+        "board_width": width,
+        "board_height": height,
+        "square_size": config.getfloat('標定板設定', '方格尺寸'),
+        "auto_board_size": config.getboolean('標定板設定', '自動偵測內角點數量', fallback=False),
+        # 程式設定
+        "min_images": config.getint('程式設定', '最少影像數量'),
+        "error_threshold": config.getfloat('程式設定', '誤差警告閾值'),
+        "distortion_coeffs_count": config.getint('程式設定', '畸變係數項數'),
+        "max_boards": config.getint('程式設定', '每張影像標定板數量', fallback=1),
+        "detection_timeout": config.getfloat('程式設定', '單張影像檢測時限', fallback=0.0),
+        "corner_refinement": config.get('程式設定', '角點精修方式', fallback="adaptive").strip(),
+        "raw_mode": config.get('程式設定', '原始影像模式', fallback="off").strip(),
+        "corner_spill_views": config.getint('程式設定', '角點溢出影像數', fallback=0),
+        # 輸出設定
+        "save_full_matrix": config.getboolean('輸出設定', '保存完整矩陣'),
+        "save_full_distortion": config.getboolean('輸出設定', '保存完整畸變係數')
+    }
+
+
+def read_gray_image(source):
+    """
+    讀取影像並轉換為灰階 (棋盤格檢測需要灰階影像)
+    
+    參數:
+        source: 影像檔案路徑、已編碼的影像資料 (bytes)，或已解碼的影像 (numpy陣列)
+        
+    回傳:
+        gray: 灰階影像，無法讀取時為 None
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+    elif isinstance(source, np.ndarray):
+        if source.ndim == 2:
+            return source
+        img = source
+    else:
+        img = cv2.imread(source)
+    if img is None:
+        return None
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def find_chessboard_corners(gray, board_size, refine_method="adaptive", refine_image=None):
+    """
+    在灰階影像中尋找棋盤格角點並提升至亞像素精度
+    
+    參數:
+        gray: 灰階影像
+        board_size: 棋盤格內角點數量 (寬, 高)
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        refine_image: 亞像素精修使用的影像 (可選，與 gray 尺寸相同，例如保留完整位元深度的 float32 影像)
+        
+    回傳:
+        corners: 角點座標 (N,1,2)，未找到時為 None
+    """
+    ret, corners = cv2.findChessboardCorners(
+        gray, 
+        board_size,
+        cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FILTER_QUADS
+    )
+    
+    if not ret:
+        return None
+    
+    # 提升角點精度 (亞像素精度)
+    from corner_refine import refine_corners
+    return refine_corners(gray if refine_image is None else refine_image, corners, board_size, refine_method)
+
+
+def find_all_chessboard_corners(gray, board_size, max_boards, refine_method="adaptive", refine_image=None):
+    """
+    在同一張影像中尋找多個相同規格的棋盤格
+
+    每找到一個棋盤格就將其範圍 (向外延伸一格，涵蓋外圈方格) 填成均勻灰階再搜尋一次，
+    直到找不到或達到數量上限。
+
+    參數:
+        gray: 灰階影像
+        board_size: 棋盤格內角點數量 (寬, 高)
+        max_boards: 最多尋找的棋盤格數量
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        refine_image: 亞像素精修使用的影像 (可選，同 find_chessboard_corners)
+
+    回傳:
+        boards: 角點座標 (N,1,2) 列表，依找到的順序排列
+    """
+    from corner_refine import refine_corners
+
+    boards = []
+    if refine_image is None:
+        refine_image = gray
+    corners = find_chessboard_corners(gray, board_size, refine_method, refine_image)
+    if corners is None or max_boards <= 1:
+        return [corners] if corners is not None else []
+
+    masked = gray.copy()
+    fill_value = int(np.median(gray))
+    width, height = board_size
+
+    while corners is not None:
+        boards.append(corners)
+        if len(boards) >= max_boards:
+            break
+
+        # 由四個角落的內角點沿對角線外推，得到含外圈方格與白邊的外框
+        grid = corners.reshape(height, width, 2)
+        outer = np.array([
+            grid[0, 0] + 1.5 * (grid[0, 0] - grid[1, 1]),
+            grid[0, -1] + 1.5 * (grid[0, -1] - grid[1, -2]),
+            grid[-1, -1] + 1.5 * (grid[-1, -1] - grid[-2, -2]),
+            grid[-1, 0] + 1.5 * (grid[-1, 0] - grid[-2, 1])
+        ])
+        cv2.fillConvexPoly(masked, np.round(outer).astype(np.int32), fill_value)
+
+        # 之後的搜尋先快速檢查，沒有棋盤格時可立即結束
+        ret, corners = cv2.findChessboardCorners(
+            masked,
+            board_size,
+            cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+            + cv2.CALIB_CB_FILTER_QUADS + cv2.CALIB_CB_FAST_CHECK
+        )
+        if ret:
+            # 亞像素精度以原始影像計算
+            corners = refine_corners(refine_image, corners, board_size, refine_method)
+        else:
+            corners = None
+
+    return boards
+
+
+def detect_corners(source, board_size, refine_method="adaptive", raw_mode="off"):
+    """
+    讀取單一影像並檢測棋盤格角點
+    
+    為模組層級函式，可直接交給 multiprocessing 的工作程序執行。
+    
+    參數:
+        source: 影像檔案路徑，或已編碼的影像資料 (bytes)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        raw_mode: 原始影像輸入模式 (RAW_MODES 之一)
+        
+    回傳:
+        corners: 角點座標 (N,1,2)，未找到時為 None
+        image_size: 影像尺寸 (寬度, 高度)，無法讀取時為 None
+    """
+    if raw_mode != "off":
+        from raw_input import detect_raw_corners
+        boards, image_size = detect_raw_corners(source, board_size, raw_mode, refine_method)
+        return (boards[0] if boards else None), image_size
+    gray = read_gray_image(source)
+    if gray is None:
+        return None, None
+    return find_chessboard_corners(gray, tuple(board_size), refine_method), (gray.shape[1], gray.shape[0])
+
+
+def detect_all_corners(source, board_size, max_boards, refine_method="adaptive", raw_mode="off"):
+    """
+    讀取單一影像並檢測其中所有的棋盤格 (每個棋盤格各為一個標定視角)
+
+    參數:
+        source: 影像檔案路徑，或已編碼的影像資料 (bytes)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        max_boards: 最多尋找的棋盤格數量
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        raw_mode: 原始影像輸入模式 (RAW_MODES 之一)
+
+    回傳:
+        boards: 角點座標 (N,1,2) 列表，未找到時為空列表
+        image_size: 影像尺寸 (寬度, 高度)，無法讀取時為 None
+    """
+    if raw_mode != "off":
+        from raw_input import detect_raw_corners
+        return detect_raw_corners(source, board_size, raw_mode, refine_method, max_boards)
+    gray = read_gray_image(source)
+    if gray is None:
+        return [], None
+    boards = find_all_chessboard_corners(gray, tuple(board_size), max_boards, refine_method)
+    return boards, (gray.shape[1], gray.shape[0])
+
+
+def detect_boards(source, board_size, max_boards=1, refine_method="adaptive", raw_mode="off"):
+    """
+    讀取單一影像並檢測最多 max_boards 個棋盤格 (max_boards 為1時與 detect_corners 相同)
+    
+    為模組層級函式，可直接交給 multiprocessing 的工作程序執行。
+    
+    回傳:
+        boards: 角點座標 (N,1,2) 列表，未找到時為空列表
+        image_size: 影像尺寸 (寬度, 高度)，無法讀取時為 None
+    """
+    if max_boards > 1:
+        return detect_all_corners(source, board_size, max_boards, refine_method, raw_mode)
+    corners, image_size = detect_corners(source, board_size, refine_method, raw_mode)
+    return ([corners] if corners is not None else []), image_size
+
+
+def board_view_name(name, board_index):
+    """
+    影像中第 board_index 個棋盤格的視角名稱 (第一個為影像名稱，其餘為 "影像名稱#k")
+    """
+    return name if board_index == 0 else f"{name}#{board_index + 1}"
+
+
+def _remove_file(path):
+    """
+    刪除暫存檔案 (檔案仍被使用或已不存在時略過)
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class CornerStore:
+    """
+    連續記憶體的角點資料存放區
+
+    所有影像的角點存放在同一個預先配置的 (影像數, 角點數, 2) float32 陣列中，
+    容量不足時加倍擴充，避免每張影像各自配置小陣列。
+    每張影像另有有效旗標，可在不搬動資料的情況下排除特定影像。
+    影像數量很多時可溢出到磁碟 (numpy memmap)。
+    只在呼叫 OpenCV 時才產生指向同一塊記憶體的列表 (不複製資料)。
+    """
+
+    def __init__(self, corners_per_view, capacity=64, memmap_path=None, spill_views=None):
+        """
+        初始化角點存放區
+
+        參數:
+            corners_per_view: 每張影像的角點數量
+            capacity: 初始容量 (影像數)
+            memmap_path: 溢出到磁碟時使用的 .npy 檔案路徑 (None 表示只使用記憶體)
+            spill_views: 影像數超過此值時改用 memmap (None 表示有 memmap_path 時一開始就使用)
+        """
+        self.corners_per_view = int(corners_per_view)
+        self.memmap_path = memmap_path
+        self.spill_views = spill_views
+        self.count = 0          # 已加入的影像數量 (包含被排除的影像)
+        self.names = []         # 每張影像的名稱 (可為 None)
+        self.points = None      # (容量, 角點數, 2) 角點座標
+        self.valid = None       # (容量,) 有效旗標
+        self._allocate(max(1, int(capacity)))
+
+    def _use_memmap(self, capacity):
+        if self.memmap_path is None:
+            return False
+        return self.spill_views is None or capacity > self.spill_views
+
+    def _allocate(self, capacity):
+        """
+        配置 (或擴充) 角點陣列，保留已加入的資料
+        """
+        old_points = self.points
+        valid = np.zeros(capacity, dtype=bool)
+
+        if self._use_memmap(capacity):
+            temp_path = self.memmap_path + ".tmp"
+            points = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32,
+                                               shape=(capacity, self.corners_per_view, 2))
+            if old_points is not None:
+                points[:self.count] = old_points[:self.count]
+                valid[:self.count] = self.valid[:self.count]
+            points.flush()
+            # 釋放舊的 memmap 後才能取代檔案 (Windows)
+            del points, old_points
+            self.points = None
+            os.replace(temp_path, self.memmap_path)
+            self.points = np.load(self.memmap_path, mmap_mode='r+')
+        else:
+            points = np.empty((capacity, self.corners_per_view, 2), dtype=np.float32)
+            if old_points is not None:
+                points[:self.count] = old_points[:self.count]
+                valid[:self.count] = self.valid[:self.count]
+            self.points = points
+
+        self.valid = valid
+
+    def set_spill(self, spill_views):
+        """
+        設定是否溢出到磁碟，已加入的角點會搬移到新的存放位置
+
+        參數:
+            spill_views: 影像數超過此值時改用系統暫存資料夾中的 memmap 檔案 (None 表示只使用記憶體)，
+                         暫存檔案在存放區釋放時刪除
+        """
+        if spill_views is None:
+            self.memmap_path = None
+        elif self.memmap_path is None:
+            handle, self.memmap_path = tempfile.mkstemp(prefix="corner_store_", suffix=".npy")
+            os.close(handle)
+            weakref.finalize(self, _remove_file, self.memmap_path)
+        self.spill_views = spill_views
+        self._allocate(self.capacity)
+
+    @property
+    def capacity(self):
+        return self.points.shape[0]
+
+    def __len__(self):
+        """
+        有效影像數量 (標定時實際使用的影像數)
+        """
+        return int(np.count_nonzero(self.valid[:self.count]))
+
+    def append(self, corners, name=None, valid=True):
+        """
+        加入一張影像的角點
+
+        參數:
+            corners: 角點座標，可為 (N,1,2)、(N,2) 或等效的列表
+            name: 影像名稱 (可選)
+            valid: 是否納入標定
+
+        回傳:
+            index: 影像在存放區中的索引
+        """
+        if self.count == self.capacity:
+            self._allocate(self.capacity * 2)
+
+        index = self.count
+        self.points[index] = np.asarray(corners, dtype=np.float32).reshape(self.corners_per_view, 2)
+        self.valid[index] = valid
+        self.names.append(name)
+        self.count += 1
+        return index
+
+    def set_valid(self, index, valid):
+        """
+        設定影像是否納入標定
+
+        參數:
+            index: 影像索引
+            valid: 是否有效
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(f"影像索引超出範圍: {index}")
+        self.valid[index] = valid
+
+    def clear(self):
+        """
+        清除所有影像 (保留已配置的容量)
+        """
+        self.count = 0
+        self.names = []
+        self.valid[:] = False
+
+    def valid_indices(self):
+        """
+        有效影像的索引 (與標定結果的 rvecs/tvecs 順序相同)
+        """
+        return np.flatnonzero(self.valid[:self.count])
+
+    def valid_names(self):
+        """
+        有效影像的名稱列表
+        """
+        return [self.names[i] for i in self.valid_indices()]
+
+    def valid_points(self):
+        """
+        有效影像的角點 (N, 角點數, 2)，全部有效時不複製資料
+        """
+        if len(self) == self.count:
+            return self.points[:self.count]
+        return self.points[self.valid_indices()]
+
+    def image_point_views(self):
+        """
+        OpenCV 使用的角點列表，每項為 (角點數,1,2) 的陣列視圖
+        """
+        points = self.points
+        return [points[i].reshape(-1, 1, 2) for i in self.valid_indices()]
+
+    def object_point_views(self, objp):
+        """
+        OpenCV 使用的3D座標列表 (所有影像共用同一個 objp 陣列)
+
+        參數:
+            objp: 標定板3D座標 (角點數, 3)
+        """
+        return [objp] * len(self)
 
-# 導入所需套件
-try:
-    import cv2
-    import numpy as np
-    import glob
-    import json
-    import configparser
-    from datetime import datetime
-except ImportError as e:
-    print(f"導入錯誤: {e}")
-    print("請確保已安裝 opencv-python 和 numpy")
-    sys.exit(1)
 
 class CameraCalibration:
     """
@@ -33,89 +534,172 @@ class CameraCalibration:
     - 處理標定影像
     - 計算相機內參
     - 儲存標定結果
+    
+    作為函式庫使用時可直接注入設定，不讀取設定檔也不輸出訊息：
+        calibrator = CameraCalibration({"board_width": 9, "board_height": 6, "square_size": 25.0})
     """
     
-    def __init__(self):
+    def __init__(self, config=None, verbose=None):
         """
         初始化相機標定類別
+        
+        參數:
+            config: 標定設定，可為
+                    None - 讀取程式目錄中的 config/config.ini
+                    dict - 參數字典，未提供的鍵使用 DEFAULT_SETTINGS
+                    ConfigParser - 與 config.ini 相同格式的設定
+            verbose: 是否輸出訊息 (預設: 讀取設定檔時輸出，注入設定時不輸出)
         """
-        print("相機內參標定工具")
-        print("=" * 50)
-        print(f"OpenCV版本: {cv2.__version__}")
-        print(f"NumPy版本: {np.__version__}")
+        self.verbose = (config is None) if verbose is None else verbose
         
-        # 載入設定檔
-        self.load_config()
+        self._log("相機內參標定工具")
+        self._log("=" * 50)
+        if self.verbose:
+            self._log(f"OpenCV版本: {cv2.__version__}")
+            self._log(f"NumPy版本: {np.__version__}")
         
-        # 顯示載入的設定
-        print(f"\n設定檔載入成功:")
-        print(f"  物理焦距: {self.focal_length}mm")
-        print(f"  棋盤格內角點: {self.board_size[0]}x{self.board_size[1]}")
-        print(f"  方格尺寸: {self.square_size}mm")
-        print(f"  畸變係數項數: {self.distortion_coeffs_count}項")
+        # 角點資料 (標定板設定載入後建立)
+        self.corner_store = None
         
-        # 初始化物件點陣列 (3D世界座標)
-        self.object_points = []   # 3D真實世界座標系統中的點 
-        self.image_points = []    # D影像座標系統中的點
+        # 載入設定
+        if config is None:
+            self.load_config()
+        elif isinstance(config, configparser.ConfigParser):
+            self._set_settings(settings_from_config(config))
+        else:
+            settings = dict(DEFAULT_SETTINGS)
+            settings.update(config)
+            self._set_settings(settings)
         
-        # 建立標定板的3D座標
-        self.create_object_points()
+        # 顯示載入的設定
+        self._log(f"\n設定檔載入成功:")
+        self._log(f"  物理焦距: {self.focal_length}mm")
+        self._log(f"  棋盤格內角點: {self.board_size[0]}x{self.board_size[1]}")
+        self._log(f"  方格尺寸: {self.square_size}mm")
+        self._log(f"  畸變係數項數: {self.distortion_coeffs_count}項")
         
         # 標定結果
         self.camera_matrix = None       # 相機內參矩陣 
         self.distortion_coeffs = None   # 畸變係數 
-        self.rvecs = None               # 旋轉向量
-        self.tvecs = None               # 平移向量
+        self.rvecs = None               # 旋轉向量 (有效影像數, 3)
+        self.tvecs = None               # 平移向量 (有效影像數, 3)
         self.rms_error = None           # RMS重投影誤差
+        self.image_size = None          # 影像尺寸 (寬度, 高度)
+        self.detection_failures = {}    # 檢測逾時或失敗的影像 {影像名稱: 原因}
+        self.std_intrinsics = None      # 內參與畸變係數的標準差 (extended 標定時)
+    
+    def _log(self, message):
+        """
+        輸出訊息 (verbose 關閉時不輸出)
+        
+        參數:
+            message: 訊息內容
+        """
+        if self.verbose:
+            print(message)
         
-    def load_config(self):
+    def load_config(self, config_path=None):
         """
         從設定檔載入參數
         
         讀取config.ini檔案中的相機設定、標定板設定等參數
+        
+        參數:
+            config_path: 設定檔路徑 (預設為程式目錄中的 config/config.ini)
         """
         config = configparser.ConfigParser()
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        config_path = os.path.join(script_dir, "config", "config.ini")
+        if config_path is None:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            config_path = os.path.join(script_dir, "config", "config.ini")
         
         if not os.path.exists(config_path):
-            print(f"錯誤: 找不到設定檔 {config_path}")
-            print("請確保程式目錄中的config資料夾內存在 config.ini")
+            self._log(f"錯誤: 找不到設定檔 {config_path}")
+            self._log("請確保程式目錄中的config資料夾內存在 config.ini")
             raise FileNotFoundError("找不到設定檔")
         
         config.read(config_path, encoding='utf-8')
         
         try:
-            # 讀取相機設定
-            self.focal_length = config.getfloat('相機設定', '物理焦距')
-            
-            # 讀取標定板設定
-            board_size_str = config.get('標定板設定', '內角點數量')
-            width, height = map(int, board_size_str.split(','))
-            self.board_size = (width, height)
-            self.square_size = config.getfloat('標定板設定', '方格尺寸')
-            
-            # 讀取程式設定
-            self.min_images = config.getint('程式設定', '最少影像數量')
-            self.error_threshold = config.getfloat('程式設定', '誤差警告閾值')
-            
-            # 讀取畸變係數項數設定（預設為5項）
-            self.distortion_coeffs_count = config.getint('程式設定', '畸變係數項數')
-            
-            # 驗證畸變係數項數的有效性
-            valid_counts = [5, 8, 12, 14]
-            if self.distortion_coeffs_count not in valid_counts:
-                print(f"警告: 畸變係數項數 {self.distortion_coeffs_count} 無效，使用預設值 5")
-                self.distortion_coeffs_count = 5
-            
-            # 讀取輸出設定
-            self.save_full_matrix = config.getboolean('輸出設定', '保存完整矩陣')
-            self.save_full_distortion = config.getboolean('輸出設定', '保存完整畸變係數')
-            
+            self._set_settings(settings_from_config(config))
         except Exception as e:
-            print(f"讀取設定檔錯誤: {e}")
-            print("請檢查 config.ini 的格式")
+            self._log(f"讀取設定檔錯誤: {e}")
+            self._log("請檢查 config.ini 的格式")
             raise
+    
+    def _set_settings(self, settings):
+        """
+        以完整的參數字典設定所有標定參數
+        
+        參數:
+            settings: 包含 DEFAULT_SETTINGS 所有鍵的參數字典
+        """
+        self.focal_length = float(settings["focal_length"])
+        self.board_size = (int(settings["board_width"]), int(settings["board_height"]))
+        self.square_size = float(settings["square_size"])
+        self.auto_board_size = bool(settings.get("auto_board_size", False))
+        self.board_size_locked = False  # 本次執行是否已自動偵測並固定內角點數量
+        self.min_images = int(settings["min_images"])
+        self.error_threshold = float(settings["error_threshold"])
+        self.max_boards = max(1, int(settings.get("max_boards", 1)))
+        self.detection_timeout = max(0.0, float(settings.get("detection_timeout", 0.0)))
+        self.corner_refinement = settings.get("corner_refinement", "adaptive")
+        if self.corner_refinement not in REFINE_METHODS:
+            self._log(f"警告: 角點精修方式 {self.corner_refinement} 無效，使用預設值 adaptive")
+            self.corner_refinement = "adaptive"
+        self.raw_mode = settings.get("raw_mode", "off")
+        if self.raw_mode not in RAW_MODES:
+            self._log(f"警告: 原始影像模式 {self.raw_mode} 無效，使用預設值 off")
+            self.raw_mode = "off"
+        self.corner_spill_views = max(0, int(settings.get("corner_spill_views", 0)))
+        self.save_full_matrix = bool(settings["save_full_matrix"])
+        self.save_full_distortion = bool(settings["save_full_distortion"])
+        
+        # 驗證畸變係數項數的有效性
+        self.distortion_coeffs_count = int(settings["distortion_coeffs_count"])
+        if self.distortion_coeffs_count not in VALID_DISTORTION_COUNTS:
+            self._log(f"警告: 畸變係數項數 {self.distortion_coeffs_count} 無效，使用預設值 5")
+            self.distortion_coeffs_count = 5
+        
+        # 標定板參數可能改變，重建3D座標
+        self.create_object_points()
+    
+    def get_settings(self):
+        """
+        取得目前的標定參數
+        
+        回傳:
+            settings: 參數字典 (鍵名與 DEFAULT_SETTINGS 相同)
+        """
+        return {
+            "board_width": self.board_size[0],
+            "board_height": self.board_size[1],
+            "auto_board_size": self.auto_board_size,
+            "square_size": self.square_size,
+            "focal_length": self.focal_length,
+            "min_images": self.min_images,
+            "error_threshold": self.error_threshold,
+            "distortion_coeffs_count": self.distortion_coeffs_count,
+            "max_boards": self.max_boards,
+            "detection_timeout": self.detection_timeout,
+            "corner_refinement": self.corner_refinement,
+            "raw_mode": self.raw_mode,
+            "corner_spill_views": self.corner_spill_views,
+            "save_full_matrix": self.save_full_matrix,
+            "save_full_distortion": self.save_full_distortion
+        }
+    
+    def apply_settings(self, settings):
+        """
+        以字典覆寫目前的標定參數
+        
+        鍵名與GUI的 ui_settings.json 相同，未提供的鍵維持原設定。
+        
+        參數:
+            settings: 參數字典，例如 {"board_width": 9, "board_height": 6, "square_size": 25.0}
+        """
+        merged = self.get_settings()
+        merged.update({key: value for key, value in settings.items() if key in merged})
+        self._set_settings(merged)
         
     def create_object_points(self):
         """
@@ -131,8 +715,98 @@ class CameraCalibration:
         objp *= self.square_size
         
         self.objp = objp
-        print(f"標定板設定: {self.board_size[0]}x{self.board_size[1]} 個內角點")
-        print(f"方格尺寸: {self.square_size}mm")
+        
+        # 角點數量改變時，原有的角點資料不再適用
+        if self.corner_store is None or self.corner_store.corners_per_view != len(objp):
+            self.corner_store = CornerStore(len(objp))
+        self.configure_corner_spill()
+        
+        self._log(f"標定板設定: {self.board_size[0]}x{self.board_size[1]} 個內角點")
+        self._log(f"方格尺寸: {self.square_size}mm")
+    
+    def configure_corner_spill(self):
+        """
+        依角點溢出影像數設定角點存放區 (0 表示只使用記憶體)
+        
+        影像數超過設定值後，角點改存於系統暫存資料夾的 memmap 檔案，已加入的角點保留。
+        """
+        spill_views = self.corner_spill_views or None
+        if self.corner_store.spill_views != spill_views:
+            self.corner_store.set_spill(spill_views)
+    
+    @property
+    def object_points(self):
+        """
+        3D真實世界座標系統中的點 (每張有效影像一項，供OpenCV使用)
+        """
+        return self.corner_store.object_point_views(self.objp)
+    
+    @property
+    def image_points(self):
+        """
+        2D影像座標系統中的點 (每張有效影像一項，供OpenCV使用)
+        """
+        return self.corner_store.image_point_views()
+    
+    def add_view(self, corners, name=None):
+        """
+        加入一張影像的角點檢測結果
+        
+        參數:
+            corners: 角點座標 (N,1,2)
+            name: 影像名稱 (可選)
+            
+        回傳:
+            index: 影像在 corner_store 中的索引
+        """
+        return self.corner_store.append(corners, name)
+    
+    def lock_board_size(self, sources):
+        """
+        以少量樣本影像自動偵測內角點數量，並固定使用於本次執行
+        
+        參數:
+            sources: 樣本影像來源列表 (影像路徑、已編碼資料或已解碼影像)
+            
+        回傳:
+            success: 是否偵測成功 (失敗時保留設定值)
+        """
+        from board_size_detect import detect_board_size
+        
+        self.board_size_locked = True
+        if self.raw_mode != "off":
+            from raw_input import raw_detection_image
+            sources = [raw_detection_image(source, self.raw_mode) for source in sources]
+        
+        configured = self.board_size
+        result = detect_board_size(sources, configured)
+        detected = result["board_size"]
+        if detected is None:
+            self._log(f"警告: 無法自動偵測內角點數量 (耗時 {result['seconds'] * 1000:.0f} ms)，"
+                      f"使用設定值 {configured[0]}x{configured[1]}")
+            return False
+        
+        if detected != configured:
+            self._log(f"自動偵測內角點數量: {detected[0]}x{detected[1]} (設定值為 {configured[0]}x{configured[1]}，"
+                      f"耗時 {result['seconds'] * 1000:.0f} ms)，本次執行使用偵測結果")
+            self.board_size = detected
+            self.create_object_points()
+        else:
+            self._log(f"自動偵測內角點數量: {detected[0]}x{detected[1]} 與設定值相同 "
+                      f"(耗時 {result['seconds'] * 1000:.0f} ms)")
+        return True
+    
+    def ensure_board_size(self, sources):
+        """
+        開啟自動偵測且本次執行尚未固定內角點數量時，以樣本影像偵測並固定 (之後的呼叫不再偵測)
+        
+        多執行緒檢測前應先呼叫，避免多個執行緒同時偵測。
+        
+        參數:
+            sources: 樣本影像來源列表 (同 lock_board_size)
+        """
+        if self.auto_board_size and not self.board_size_locked and sources:
+            self.lock_board_size(sources)
     
     def find_corners_in_image(self, image_path):
         """
@@ -145,80 +819,191 @@ class CameraCalibration:
             success: 是否成功找到角點
             corners: 角點座標
         """
-        # 讀取影像
-        img = cv2.imread(image_path)
-        if img is None:
-            print(f"錯誤: 無法讀取影像 {image_path}")
+        self.ensure_board_size([image_path])
+        corners, image_size = detect_corners(image_path, self.board_size, self.corner_refinement, self.raw_mode)
+        if image_size is None:
+            self._log(f"錯誤: 無法讀取影像 {image_path}")
             return False, None
-            
-        # 轉換為灰階 (棋盤格檢測需要灰階影像)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
-        # 尋找棋盤格角點
-        ret, corners = cv2.findChessboardCorners(
-            gray, 
-            self.board_size,
-            cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FILTER_QUADS
-        )
+        self.image_size = image_size
         
-        if ret:
-            # 提升角點精度 (亞像素精度)
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-            corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
-            
-            print(f"角點檢測成功: {os.path.basename(image_path)}")
-            return True, corners2
+        if corners is not None:
+            self._log(f"角點檢測成功: {os.path.basename(image_path)}")
+            return True, corners
         else:
-            print(f"未找到角點: {os.path.basename(image_path)}")
+            self._log(f"未找到角點: {os.path.basename(image_path)}")
             return False, None
     
-    def process_images(self, images_folder):
+    def detect_views(self, source, name=None):
+        """
+        檢測單一影像中的棋盤格 (最多 max_boards 個)，每個棋盤格各自成為一個視角
+        
+        參數:
+            source: 影像檔案路徑、已編碼的影像資料 (bytes) 或已解碼的影像
+            name: 影像名稱 (預設為檔案路徑的檔名)
+            
+        回傳:
+            views: (視角名稱, 角點座標) 列表，未找到時為空列表；第2個以後的棋盤格名稱為 "影像名稱#k"
+        """
+        if name is None:
+            name = os.path.basename(source)
+        self.ensure_board_size([source])
+        boards, image_size = detect_boards(source, self.board_size, self.max_boards,
+                                           self.corner_refinement, self.raw_mode)
+        if image_size is None:
+            self._log(f"錯誤: 無法讀取影像 {name}")
+            return []
+        
+        self.image_size = image_size
+        
+        if boards:
+            suffix = f" ({len(boards)} 個標定板)" if self.max_boards > 1 else ""
+            self._log(f"角點檢測成功: {name}{suffix}")
+        else:
+            self._log(f"未找到角點: {name}")
+        return [(board_view_name(name, board_index), corners) for board_index, corners in enumerate(boards)]
+
+    def iter_views(self, items, cancel_event=None, workers=None):
+        """
+        檢測多張影像，設定檢測時限時經由看門狗程序池 (逾時或崩潰的影像記錄在 detection_failures)
+
+        參數:
+            items: (名稱, 影像來源) 的列表或產生器，名稱的檔名部分作為視角名稱；
+                   產生器只在需要下一張影像時才取出，可依先前的結果決定是否繼續
+                   (自動偵測內角點數量時，產生器的呼叫端需先呼叫 ensure_board_size)
+            cancel_event: threading.Event (可選)，設定後停止檢測 (由呼叫端決定是否拋出 CalibrationCancelled)
+            workers: 看門狗工作程序數量 (None 表示CPU核心數，未設定檢測時限時依序在本程序檢測)
+
+        回傳 (產生器):
+            (名稱, 視角列表): 視角列表同 detect_views；設定檢測時限時依完成順序產生
+        """
+        if hasattr(items, "__len__"):
+            # 檢測程序使用固定的內角點數量，先以平均取樣的影像偵測
+            self.ensure_board_size(board_size_samples([source for _, source in items]))
+        
+        if self.detection_timeout <= 0:
+            for name, source in items:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield name, self.detect_views(source, posixpath.basename(name.replace("\\", "/")))
+            return
+
+        from detection_watchdog import DetectionWatchdog
+        watchdog = DetectionWatchdog(self.board_size, self.max_boards, self.detection_timeout, workers,
+                                     self.corner_refinement, self.raw_mode)
+        worst_case = (f" (最差情況約 {watchdog.worst_case_seconds(len(items)):.0f} 秒)"
+                      if hasattr(items, "__len__") else "")
+        self._log(f"單張影像檢測時限 {watchdog.timeout:g} 秒，{watchdog.workers} 個檢測程序{worst_case}")
+
+        results = watchdog.run(items, cancel_event)
+        try:
+            for name, boards, image_size, reason in results:
+                view_name = posixpath.basename(name.replace("\\", "/"))
+                if reason is not None:
+                    self.detection_failures[view_name] = reason
+                    self._log(f"檢測失敗: {view_name} - {reason}")
+                    yield name, []
+                    continue
+
+                self.image_size = image_size
+                if boards:
+                    suffix = f" ({len(boards)} 個標定板)" if self.max_boards > 1 else ""
+                    self._log(f"角點檢測成功: {view_name}{suffix}")
+                else:
+                    self._log(f"未找到角點: {view_name}")
+                yield name, [(board_view_name(view_name, board_index), corners)
+                             for board_index, corners in enumerate(boards)]
+        finally:
+            results.close()
+            if watchdog.restarts:
+                self._log(f"重新啟動檢測程序 {watchdog.restarts} 次")
+
+    def process_images(self, images_folder, progress_callback=None, cancel_event=None):
         """
         處理資料夾中的所有影像
         
         參數:
-            images_folder: 包含標定影像的資料夾路徑
+            images_folder: 包含標定影像的資料夾路徑，或 zip/tar 壓縮檔、多頁TIFF檔案 (直接讀取不需解壓縮)
+            progress_callback: 每處理完一張影像呼叫一次 (可選)，
+                               參數為 (已處理數量, 總數量, 影像路徑, 角點座標或None)
+            cancel_event: threading.Event (可選)，設定後於下一張影像前中止並拋出 CalibrationCancelled
         """
-        print(f"\n處理資料夾: {images_folder}")
+        if os.path.isfile(images_folder):
+            from image_archive import is_image_archive, process_archive
+            if is_image_archive(images_folder):
+                self._log(f"\n處理壓縮檔: {images_folder}")
+                if self.auto_board_size:
+                    from image_archive import read_archive_images, load_source
+                    members = itertools.islice(read_archive_images(images_folder), BOARD_SIZE_SAMPLES)
+                    self.lock_board_size([load_source(source, self.raw_mode != "off") for _, source in members])
+                self.corner_store.clear()
+                self.detection_failures = {}
+                successful_images, total_images = process_archive(self, images_folder, progress_callback,
+                                                                  cancel_event)
+                if not total_images:
+                    self._log("錯誤: 在壓縮檔中找不到影像檔案")
+                    return False
+                return self._finish_processing(successful_images, total_images)
         
-        # 支援的影像格式
-        image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.tif']
+        self._log(f"\n處理資料夾: {images_folder}")
         
         # 收集所有影像檔案
-        image_files = []
-        for extension in image_extensions:
-            image_files.extend(glob.glob(os.path.join(images_folder, extension)))
-            image_files.extend(glob.glob(os.path.join(images_folder, extension.upper())))
-        
-        # 移除重複項 (相同檔案但副檔名大小寫不同)
-        image_files = list(set(image_files))
+        image_files = collect_image_files(images_folder)
         
         if not image_files:
-            print("錯誤: 在指定資料夾中找不到影像檔案")
+            self._log("錯誤: 在指定資料夾中找不到影像檔案")
             return False
             
-        print(f"找到 {len(image_files)} 個影像檔案")
+        self._log(f"找到 {len(image_files)} 個影像檔案")
+        
+        if self.auto_board_size:
+            # 平均取樣，偵測結果固定使用於本次執行
+            self.lock_board_size(board_size_samples(image_files))
         
         # 清除先前的資料
-        self.object_points = []
-        self.image_points = []
+        self.corner_store.clear()
+        self.detection_failures = {}
+        
+        if self.detection_timeout > 0:
+            # 每張影像在獨立程序中檢測，逾時或崩潰的影像標記失敗後繼續
+            from detection_watchdog import process_with_watchdog
+            successful_images = process_with_watchdog(self, image_files, progress_callback, cancel_event)
+            return self._finish_processing(successful_images, len(image_files))
         
         successful_images = 0
         
         # 處理每個影像
-        for image_path in image_files:
-            success, corners = self.find_corners_in_image(image_path)
+        for index, image_path in enumerate(image_files):
+            if cancel_event is not None and cancel_event.is_set():
+                self._log("影像處理已取消")
+                raise CalibrationCancelled("影像處理已取消")
+            
+            # 同一張影像中的每個棋盤格各自成為一個視角
+            views = self.detect_views(image_path)
+            for view_name, corners in views:
+                self.add_view(corners, view_name)
             
-            if success:
-                # 如果成功找到角點，加入標定資料
-                self.object_points.append(self.objp)
-                self.image_points.append(corners)
+            if views:
                 successful_images += 1
+            
+            if progress_callback is not None:
+                progress_callback(index + 1, len(image_files), image_path, views[0][1] if views else None)
+        
+        return self._finish_processing(successful_images, len(image_files))
+    
+    def _finish_processing(self, successful_images, total_images):
+        """
+        顯示影像處理結果並檢查視角數量是否足夠
         
-        print(f"\n處理完成: {successful_images}/{len(image_files)} 個影像")
+        回傳:
+            success: 是否可以進行標定
+        """
+        self._log(f"\n處理完成: {successful_images}/{total_images} 個影像")
+        if self.max_boards > 1:
+            self._log(f"共 {len(self.corner_store)} 個標定板視角")
         
-        if successful_images < self.min_images:
-            print(f"警告: 建議至少 {self.min_images} 個成功檢測的影像進行標定")
+        if len(self.corner_store) < self.min_images:
+            self._log(f"警告: 建議至少 {self.min_images} 個成功檢測的影像進行標定")
             return False
             
         return successful_images > 0
@@ -290,63 +1075,84 @@ class CameraCalibration:
         
         return distortion_dict
     
-    def calibrate_camera(self, image_size):
+    def calibrate_camera(self, image_size, warm_start=False, extended=False):
         """
         執行相機標定計算
         
         參數:
             image_size: 影像尺寸 (寬度, 高度)
+            warm_start: 是否以上一次的標定結果作為初始值 (加入少量新影像後重新計算時可加快收斂)
+            extended: 是否以 calibrateCameraExtended 同時估計內參的標準差 (存於 std_intrinsics)
         """
-        print(f"\n開始相機標定計算...")
-        print(f"使用 {self.distortion_coeffs_count} 項畸變係數")
+        self._log(f"\n開始相機標定計算...")
+        self._log(f"使用 {self.distortion_coeffs_count} 項畸變係數")
         
-        if len(self.object_points) == 0:
-            print("錯誤: 沒有有效的標定資料")
+        if len(self.corner_store) == 0:
+            self._log("錯誤: 沒有有效的標定資料")
             return False
         
         # 根據畸變係數項數設定標定參數
         flags = self._get_calibration_flags()
         
+        initial_matrix = None
+        initial_distortion = None
+        if warm_start and self.camera_matrix is not None:
+            flags |= cv2.CALIB_USE_INTRINSIC_GUESS
+            initial_matrix = self.camera_matrix.copy()
+            initial_distortion = self.distortion_coeffs.copy()
+        
         # 執行相機標定
-        ret, self.camera_matrix, self.distortion_coeffs, self.rvecs, self.tvecs = cv2.calibrateCamera(
-            self.object_points,
-            self.image_points,
-            image_size,
-            None,
-            None,
-            flags=flags
-        )
+        if extended:
+            # 標準差順序: fx, fy, cx, cy, 之後與畸變係數陣列相同
+            ret, self.camera_matrix, self.distortion_coeffs, rvecs, tvecs, std_intrinsics, _, _ = \
+                cv2.calibrateCameraExtended(
+                    self.object_points,
+                    self.image_points,
+                    image_size,
+                    initial_matrix,
+                    initial_distortion,
+                    flags=flags
+                )
+            self.std_intrinsics = np.asarray(std_intrinsics, dtype=np.float64).ravel()
+        else:
+            ret, self.camera_matrix, self.distortion_coeffs, rvecs, tvecs = cv2.calibrateCamera(
+                self.object_points,
+                self.image_points,
+                image_size,
+                initial_matrix,
+                initial_distortion,
+                flags=flags
+            )
+            self.std_intrinsics = None
+        
+        # 每張影像的外參合併為連續陣列 (順序與 corner_store.valid_indices() 相同)
+        self.rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+        self.tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1, 3)
         
         # 儲存RMS誤差
         self.rms_error = ret
         
-        print(f"標定完成!")
-        print(f"重投影誤差 (RMS): {ret:.4f} 像素")
+        self._log(f"標定完成!")
+        self._log(f"重投影誤差 (RMS): {ret:.4f} 像素")
         
         if ret > self.error_threshold:
-            print("警告: 重投影誤差較大，請檢查標定板品質或增加更多影像")
+            self._log("警告: 重投影誤差較大，請檢查標定板品質或增加更多影像")
         elif ret < 0.5:
-            print("優秀: 重投影誤差非常小，標定品質良好")
+            self._log("優秀: 重投影誤差非常小，標定品質良好")
         else:
-            print("良好: 重投影誤差在可接受範圍內")
+            self._log("良好: 重投影誤差在可接受範圍內")
             
         return True
     
-    def save_results(self, output_path):
+    def get_result_data(self):
         """
-        儲存標定結果到檔案
+        取得標定結果資料 (與結果JSON檔案的內容相同)
         
-        參數:
-            output_path: 輸出檔案路徑
+        回傳:
+            calibration_data: 標定結果字典，尚未標定時為 None
         """
         if self.camera_matrix is None:
-            print("錯誤: 尚未進行標定，無法儲存結果")
-            return False
-        
-        # 確保輸出目錄存在
-        output_dir = os.path.dirname(output_path)
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+            return None
         
         # 準備儲存的資料
         calibration_data = {
@@ -370,9 +1176,19 @@ class CameraCalibration:
                 },
                 "畸變係數": self._generate_distortion_dict()
             },
-            "使用影像數量": len(self.object_points)
+            "使用影像數量": len(self.corner_store),
+            "角點精修方式": self.corner_refinement
         }
         
+        if self.detection_failures:
+            calibration_data["檢測失敗影像"] = dict(self.detection_failures)
+        
+        if self.raw_mode != "off":
+            calibration_data["原始影像模式"] = self.raw_mode
+        
+        if self.image_size is not None:
+            calibration_data["影像尺寸"] = [int(self.image_size[0]), int(self.image_size[1])]
+        
         # 根據設定儲存完整陣列
         if self.save_full_matrix:
             calibration_data["標定結果"]["相機內參矩陣"]["完整矩陣"] = self.camera_matrix.tolist()
@@ -380,14 +1196,33 @@ class CameraCalibration:
         if self.save_full_distortion:
             calibration_data["標定結果"]["畸變係數"]["完整係數陣列"] = self.distortion_coeffs.tolist()
         
+        return calibration_data
+    
+    def save_results(self, output_path):
+        """
+        儲存標定結果到檔案
+        
+        參數:
+            output_path: 輸出檔案路徑
+        """
+        calibration_data = self.get_result_data()
+        if calibration_data is None:
+            self._log("錯誤: 尚未進行標定，無法儲存結果")
+            return False
+        
+        # 確保輸出目錄存在
+        output_dir = os.path.dirname(output_path)
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        
         # 以JSON格式儲存
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(calibration_data, f, ensure_ascii=False, indent=4)
-            print(f"標定結果已儲存至: {output_path}")
+            self._log(f"標定結果已儲存至: {output_path}")
             return True
         except Exception as e:
-            print(f"儲存檔案錯誤: {e}")
+            self._log(f"儲存檔案錯誤: {e}")
             return False
     
     def print_results(self):
@@ -403,7 +1238,7 @@ class CameraCalibration:
         print("="*60)
         
         # 顯示使用的圖片數量和畸變係數項數
-        print(f"\n使用圖片數量: {len(self.object_points)} 張")
+        print(f"\n使用圖片數量: {len(self.corner_store)} 張")
         print(f"畸變係數項數: {self.distortion_coeffs_count} 項")
         
         # 顯示RMS重投影誤差
@@ -433,12 +1268,105 @@ class CameraCalibration:
         print(self.distortion_coeffs)
 
 
+def default_result_path():
+    """
+    取得預設的結果檔案路徑 (程式目錄的result資料夾，以時間戳記命名)
+    
+    回傳:
+        output_file: 結果檔案路徑
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    result_dir = os.path.join(script_dir, "result")
+    # 確保result資料夾存在
+    os.makedirs(result_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+    return os.path.join(result_dir, f"camera_calibration_{timestamp}.json")
+
+
+def load_calibration_result(result_path):
+    """
+    讀取已儲存的標定結果檔案
+
+    未保存完整陣列時，由個別參數重建內參矩陣與畸變係數。
+
+    參數:
+        result_path: 結果JSON檔案路徑
+
+    回傳:
+        camera_matrix: 相機內參矩陣 (3,3)
+        distortion_coeffs: 畸變係數 (1,N)
+        calibration_data: 結果檔案的完整內容
+    """
+    with open(result_path, 'r', encoding='utf-8') as f:
+        calibration_data = json.load(f)
+
+    result = calibration_data["標定結果"]
+    matrix_data = result["相機內參矩陣"]
+    if "完整矩陣" in matrix_data:
+        camera_matrix = np.array(matrix_data["完整矩陣"], dtype=np.float64)
+    else:
+        camera_matrix = np.array([
+            [matrix_data["fx_像素焦距"], 0.0, matrix_data["cx_主點"]],
+            [0.0, matrix_data["fy_像素焦距"], matrix_data["cy_主點"]],
+            [0.0, 0.0, 1.0]
+        ], dtype=np.float64)
+
+    distortion_data = result["畸變係數"]
+    if "完整係數陣列" in distortion_data:
+        distortion_coeffs = np.array(distortion_data["完整係數陣列"], dtype=np.float64)
+    else:
+        distortion_coeffs = np.array([value for key, value in distortion_data.items()
+                                      if key != "完整係數陣列"], dtype=np.float64)
+
+    return camera_matrix, distortion_coeffs.reshape(1, -1), calibration_data
+
+
 def main():
     """
     主程式
     
     執行相機內參標定的完整流程
     """
+    parser = argparse.ArgumentParser(description="相機內參標定工具")
+    parser.add_argument("--images",
+                        help="標定影像資料夾，或 zip/tar 壓縮檔、多頁TIFF (預設為程式目錄中的image資料夾)")
+    parser.add_argument("--watch", action="store_true",
+                        help="監看資料夾模式: 新影像加入時立即檢測並即時更新標定結果，按 Ctrl+C 結束")
+    parser.add_argument("--interval", type=float, default=1.0, help="監看模式的資料夾檢查間隔 (秒)")
+    parser.add_argument("--preview", action="store_true",
+                        help="快速預覽: 只以閉式解估計近似內參 (不含畸變)，不執行完整標定")
+    parser.add_argument("--budget", type=float, metavar="SECONDS",
+                        help="時間預算模式: 依覆蓋率與多樣性排序影像並定期標定，時間到時輸出目前最好的結果")
+    parser.add_argument("--converge", action="store_true",
+                        help="收斂模式: 分批檢測並標定，內參與畸變穩定在容許範圍內時停止，其餘影像不讀取")
+    parser.add_argument("--batch-size", type=int, default=5, help="收斂模式每批檢測的影像數量")
+    parser.add_argument("--focal-tolerance", type=float, default=0.005,
+                        help="收斂模式 fx/fy 的相對變化量與相對標準差容許值")
+    parser.add_argument("--center-tolerance", type=float, default=3.0,
+                        help="收斂模式 cx/cy 的變化量與標準差容許值 (像素)")
+    parser.add_argument("--distortion-tolerance", type=float, default=0.5,
+                        help="收斂模式畸變造成的影像位置變化容許值 (像素)")
+    parser.add_argument("--debug-images", metavar="DIR",
+                        help="在背景輸出標註影像 (檢測角點、重投影點、殘差向量) 到指定資料夾")
+    parser.add_argument("--debug-format", choices=["jpg", "png"], default="jpg",
+                        help="除錯影像格式: jpg (最快) 或 png (無損，低壓縮等級)")
+    parser.add_argument("--debug-max", type=int, default=50, help="最多輸出的除錯影像數量")
+    parser.add_argument("--auto-board", action="store_true",
+                        help="由樣本影像自動偵測標定板內角點數量 (與設定值不同時本次執行使用偵測結果)")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="單張影像檢測時限: 每張影像在獨立程序中檢測，逾時或崩潰時標記失敗並繼續"
+                             " (預設使用 config.ini 的單張影像檢測時限，0 表示不限制)")
+    parser.add_argument("--refine", choices=REFINE_METHODS,
+                        help="角點亞像素精修方式: fixed (固定11x11視窗)、adaptive (視窗依方格大小決定)、"
+                             "saddle (NumPy鞍點擬合) (預設使用 config.ini 的角點精修方式)")
+    parser.add_argument("--raw", choices=RAW_MODES,
+                        help="原始影像模式: mono (16位元單色)，或 Bayer 排列 RGGB/BGGR/GRBG/GBRG"
+                             " (以綠色像素產生半解析度亮度影像，不做去馬賽克) (預設使用 config.ini 的原始影像模式)")
+    parser.add_argument("--spill-views", type=int, metavar="N",
+                        help="角點溢出影像數: 影像數超過N後角點改存於暫存資料夾的 memmap 檔案"
+                             " (預設使用 config.ini 的角點溢出影像數，0 表示只使用記憶體)")
+    args = parser.parse_args()
+    
     print("\n開始相機內參標定...")
     
     # 建立標定物件 (自動載入設定檔)
@@ -451,9 +1379,21 @@ def main():
         print(f"初始化錯誤: {e}")
         return
     
-    # 使用程式目錄中的image資料夾
+    if args.timeout is not None:
+        calibrator.detection_timeout = max(0.0, args.timeout)
+    if args.auto_board:
+        calibrator.auto_board_size = True
+    if args.refine is not None:
+        calibrator.corner_refinement = args.refine
+    if args.raw is not None:
+        calibrator.raw_mode = args.raw
+    if args.spill_views is not None:
+        calibrator.corner_spill_views = max(0, args.spill_views)
+        calibrator.configure_corner_spill()
+    
+    # 預設使用程式目錄中的image資料夾
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    images_folder = os.path.join(script_dir, "image")
+    images_folder = args.images or os.path.join(script_dir, "image")
     
     print(f"\n使用影像資料夾: {images_folder}")
     
@@ -464,48 +1404,98 @@ def main():
         print(f"完整路徑: {images_folder}")
         return
     
+    if os.path.isfile(images_folder) and (args.watch or args.budget is not None or args.converge):
+        # 這些模式需要隨時取得資料夾中的任一張影像 (監看新檔案、平均取樣)，無法循序讀取壓縮檔
+        print("錯誤: --watch、--budget 與 --converge 需要影像資料夾，不支援壓縮檔或多頁TIFF輸入")
+        print("請先解壓縮到資料夾，或不使用這些選項直接標定壓縮檔")
+        return
+    
+    if args.watch:
+        from calibration_watch import run_watch
+        run_watch(calibrator, images_folder, args.interval)
+        return
+    
+    if args.budget is not None:
+        from calibration_anytime import run_anytime
+        run_anytime(calibrator, images_folder, args.budget)
+        return
+    
+    if args.converge:
+        from calibration_converge import run_converge
+        run_converge(calibrator, images_folder, args.batch_size, args.focal_tolerance,
+                     args.center_tolerance, args.distortion_tolerance)
+        return
+    
     # 處理影像
     success = calibrator.process_images(images_folder)
     if not success:
         print("影像處理失敗，程式終止")
         return
     
-    # 取得影像尺寸 (從第一個成功的影像)
-    for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp']:
-        files = glob.glob(os.path.join(images_folder, ext))
-        if files:
-            sample_img = cv2.imread(files[0])
-            if sample_img is not None:
-                image_size = (sample_img.shape[1], sample_img.shape[0])
-                break
-    else:
+    # 取得影像尺寸 (檢測時已記錄)
+    image_size = calibrator.image_size
+    if image_size is None:
         print("錯誤: 無法取得影像尺寸")
         return
     
+    if args.preview:
+        from calibration_preview import preview_intrinsics
+        try:
+            preview = preview_intrinsics(calibrator)
+        except ValueError as e:
+            print(f"無法產生快速預覽: {e}")
+            return
+        print(f"\n快速預覽 (閉式解，不含畸變，耗時 {preview['seconds'] * 1000:.0f} ms):")
+        print(f"  fx={preview['fx']:.2f} fy={preview['fy']:.2f} cx={preview['cx']:.2f} cy={preview['cy']:.2f}")
+        print(f"  單應矩陣重投影誤差: {preview['homography_rms']:.4f} 像素 (過大表示角點檢測可能有誤)")
+        return
+    
     # 執行標定
     calibration_success = calibrator.calibrate_camera(image_size)
     if not calibration_success:
         print("相機標定失敗")
         return
     
+    # 除錯影像在背景繪製與寫入，不影響標定結果的輸出
+    debug_writer = None
+    if args.debug_images:
+        from debug_images import DebugImageWriter, queue_calibration_debug
+        debug_writer = DebugImageWriter(args.debug_images, image_format=args.debug_format,
+                                        max_images=args.debug_max)
+        queue_calibration_debug(calibrator, images_folder, debug_writer)
+    
     # 顯示結果
     calibrator.print_results()
     
     # 儲存結果到result資料夾，以時間戳記命名
-    result_dir = os.path.join(script_dir, "result")
-    # 確保result資料夾存在
-    os.makedirs(result_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    output_file = os.path.join(result_dir, f"camera_calibration_{timestamp}.json")
+    output_file = default_result_path()
     calibrator.save_results(output_file)
     
+    print_summary(calibrator, output_file)
+    
+    if debug_writer is not None:
+        stats = debug_writer.close()
+        print(f"\n除錯影像: 已寫入 {stats['written']} 張至 {args.debug_images}"
+              f" (略過 {stats['dropped']} 張，失敗 {stats['failed']} 張)")
+
+
+def print_summary(calibrator, output_file):
+    """
+    顯示標定總結
+    
+    參數:
+        calibrator: 已完成標定的 CameraCalibration
+        output_file: 結果檔案路徑
+    """
     print(f"\n標定完成！結果已儲存至: {output_file}")
     print(f"\n總結:")
     print(f"  焦距: {calibrator.focal_length}mm")
     print(f"  棋盤格尺寸: {calibrator.board_size[0]}x{calibrator.board_size[1]} 個內角點")
     print(f"  畸變係數項數: {calibrator.distortion_coeffs_count} 項")
-    print(f"  使用影像: {len(calibrator.object_points)} 張")
+    print(f"  使用影像: {len(calibrator.corner_store)} 張")
     print(f"  RMS重投影誤差: {calibrator.rms_error:.4f} 像素")
+    if calibrator.detection_failures:
+        print(f"  檢測失敗影像: {len(calibrator.detection_failures)} 張 (原因見結果檔案)")
 
 
 if __name__ == "__main__":
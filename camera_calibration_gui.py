@@ -14,15 +14,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
 import json
 import threading
-import configparser
+import multiprocessing
+import queue
+import time
 from datetime import datetime
-import glob
 
 # 導入原有的標定類別
 try:
-    from camera_calibration import CameraCalibration
-    import cv2
-    import numpy as np
+    from camera_calibration import (CameraCalibration, CalibrationCancelled, REFINE_METHODS, RAW_MODES,
+                                    collect_image_files, cv2, np)
+    from thumbnail_browser import ThumbnailPanel
+    from calibration_watch import FolderWatcher
+    from calibration_preview import preview_intrinsics
 except ImportError as e:
     print(f"導入錯誤: {e}")
     print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
@@ -56,18 +59,85 @@ class CameraCalibrationGUI:
         # 初始化變數
         self.is_calibrating = False
         self.calibrator = None
+        self.watcher = None
+        self.backend_ready = False
+        
+        # 背景執行緒透過佇列更新介面，由主執行緒定期取出處理
+        self.ui_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.progress_start_time = None
         
         # 載入UI設定
         self.load_ui_settings()
         
+        # 建立UI介面
+        self.create_widgets()
+        
+        # 視窗先顯示，OpenCV/NumPy 載入與資料夾檢查 (網路磁碟可能很慢) 在背景進行，
+        # 完成前標定按鈕保持停用
+        self.calibrate_btn.config(state="disabled", text="載入中...")
+        self.status_label.config(text="正在載入 OpenCV/NumPy...")
+        self.start_background_loading()
+        
+        # 開始處理背景執行緒的介面更新
+        self.process_ui_queue()
+    
+    def start_background_loading(self):
+        """
+        啟動背景載入執行緒
+        """
+        current_folder = self.folder_var.get()
+        if current_folder:
+            current_folder = os.path.normpath(current_folder)
+        recent_folders = list(self.ui_settings.get("recent_folders", []))
+        threading.Thread(target=self.background_loading_thread,
+                         args=(current_folder, recent_folders), daemon=True).start()
+    
+    def background_loading_thread(self, current_folder, recent_folders):
+        """
+        背景載入執行緒: 建立資料夾、檢查最近路徑與計算影像數量，最後導入 OpenCV/NumPy
+        
+        參數:
+            current_folder: 目前的圖像資料夾
+            recent_folders: 最近使用的資料夾列表
+        """
         # 確保必要資料夾存在
         self.ensure_directories()
         
-        # 建立UI介面
-        self.create_widgets()
+        existing_folders = {folder for folder in recent_folders + [current_folder]
+                            if folder and os.path.exists(folder)}
+        self.ui_queue.put(("folders", existing_folders))
         
         # 更新圖片數量顯示
-        self.update_image_count()
+        self.image_count_thread(current_folder)
+        
+        try:
+            versions = (cv2.__version__, np.__version__)
+            error = None
+        except ImportError as e:
+            versions, error = None, str(e)
+        self.ui_queue.put(("ready", (versions, error)))
+    
+    def on_backend_ready(self, versions, error):
+        """
+        背景載入完成: 顯示版本並啟用標定按鈕
+        
+        參數:
+            versions: (OpenCV版本, NumPy版本)，載入失敗時為 None
+            error: 載入失敗的錯誤訊息
+        """
+        if error is not None:
+            self.result_text.insert(tk.END, f"❌ {error}\n")
+            self.calibrate_btn.config(text="無法標定")
+            self.status_label.config(text="❌ 無法載入 OpenCV/NumPy")
+            return
+        
+        self.backend_ready = True
+        # 插入在標題之後，與原本的版面相同
+        self.result_text.insert("3.0", f"OpenCV版本: {versions[0]}\nNumPy版本: {versions[1]}\n\n")
+        if not self.is_calibrating:
+            self.calibrate_btn.config(state="normal", text="開始標定")
+            self.status_label.config(text="準備就緒")
     
     def ensure_directories(self):
         """
@@ -94,10 +164,16 @@ class CameraCalibrationGUI:
         default_settings = {
             "board_width": 11,
             "board_height": 7,
+            "auto_board_size": False,
             "square_size": 30.0,
             "focal_length": 50.0,
             "error_threshold": 1.0,
             "distortion_coeffs_count": 8,
+            "max_boards": 1,
+            "detection_timeout": 0.0,
+            "corner_refinement": "adaptive",
+            "raw_mode": "off",
+            "corner_spill_views": 0,
             "save_full_matrix": True,
             "save_full_distortion": True,
             "image_folder": self.images_folder,  # 預設圖像路徑
@@ -184,8 +260,15 @@ class CameraCalibrationGUI:
         self.image_count_label = ttk.Label(folder_frame, text="", font=('Microsoft YaHei', 9))
         self.image_count_label.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E))
         
-        # 初始化路徑選單
-        self.update_folder_combo()
+        # 監看資料夾：拍攝期間新影像加入時即時檢測並更新標定結果
+        self.watch_var = tk.BooleanVar(value=False)
+        watch_check = ttk.Checkbutton(folder_frame, text="👁️ 監看資料夾 (新影像加入時即時檢測並更新標定結果)",
+                                      variable=self.watch_var, command=self.toggle_watch)
+        watch_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        # 初始化路徑選單 (先假設最近路徑都存在，背景檢查完成後再更新)
+        self.update_folder_combo(existing_folders=set(self.ui_settings.get("recent_folders", []))
+                                 | {self.folder_var.get()})
         self.update_current_path_display()
         
         # 參數設定區域（左右排列）
@@ -222,6 +305,10 @@ class CameraCalibrationGUI:
         height_entry.pack(side=tk.LEFT)
         ttk.Label(board_frame, text=" (寬 × 高)").pack(side=tk.LEFT, padx=(5, 0))
         
+        # 自動偵測內角點數量 (與輸入值不同時本次標定使用偵測結果)
+        self.auto_board_var = tk.BooleanVar(value=self.ui_settings["auto_board_size"])
+        ttk.Checkbutton(board_frame, text="自動偵測", variable=self.auto_board_var).pack(side=tk.LEFT, padx=(10, 0))
+        
         # 方格尺寸
         ttk.Label(required_frame, text="方格尺寸 (mm):").grid(row=2, column=0, sticky=tk.W, pady=2)
         self.square_size_var = tk.DoubleVar(value=self.ui_settings["square_size"])
@@ -246,9 +333,41 @@ class CameraCalibrationGUI:
                                        values=[5, 8, 12, 14], state="readonly", width=12)
         distortion_combo.grid(row=1, column=1, sticky=tk.W, padx=(10, 0), pady=2)
         
+        # 每張影像標定板數量
+        ttk.Label(advanced_frame, text="每張影像標定板數量:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.max_boards_var = tk.IntVar(value=self.ui_settings["max_boards"])
+        boards_spinbox = ttk.Spinbox(advanced_frame, from_=1, to=16, textvariable=self.max_boards_var, width=13)
+        boards_spinbox.grid(row=2, column=1, sticky=tk.W, padx=(10, 0), pady=2)
+        
+        # 單張影像檢測時限 (0 表示不限制)
+        ttk.Label(advanced_frame, text="單張影像檢測時限 (秒，0=不限):").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.detection_timeout_var = tk.DoubleVar(value=self.ui_settings["detection_timeout"])
+        timeout_entry = ttk.Entry(advanced_frame, textvariable=self.detection_timeout_var, width=15)
+        timeout_entry.grid(row=3, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=2)
+        
+        # 角點亞像素精修方式
+        ttk.Label(advanced_frame, text="角點精修方式:").grid(row=4, column=0, sticky=tk.W, pady=2)
+        self.corner_refinement_var = tk.StringVar(value=self.ui_settings["corner_refinement"])
+        refinement_combo = ttk.Combobox(advanced_frame, textvariable=self.corner_refinement_var,
+                                        values=list(REFINE_METHODS), state="readonly", width=12)
+        refinement_combo.grid(row=4, column=1, sticky=tk.W, padx=(10, 0), pady=2)
+        
+        # 原始影像模式 (16位元單色或 Bayer 原始影像)
+        ttk.Label(advanced_frame, text="原始影像模式:").grid(row=5, column=0, sticky=tk.W, pady=2)
+        self.raw_mode_var = tk.StringVar(value=self.ui_settings["raw_mode"])
+        raw_mode_combo = ttk.Combobox(advanced_frame, textvariable=self.raw_mode_var,
+                                      values=list(RAW_MODES), state="readonly", width=12)
+        raw_mode_combo.grid(row=5, column=1, sticky=tk.W, padx=(10, 0), pady=2)
+        
+        # 角點溢出影像數 (超過後角點改存於暫存檔案，0 表示只使用記憶體)
+        ttk.Label(advanced_frame, text="角點溢出影像數 (0=不溢出):").grid(row=6, column=0, sticky=tk.W, pady=2)
+        self.corner_spill_var = tk.IntVar(value=self.ui_settings["corner_spill_views"])
+        spill_entry = ttk.Entry(advanced_frame, textvariable=self.corner_spill_var, width=15)
+        spill_entry.grid(row=6, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=2)
+        
         # 輸出設定
         output_frame = ttk.Frame(advanced_frame)
-        output_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        output_frame.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
         
         self.save_matrix_var = tk.BooleanVar(value=self.ui_settings["save_full_matrix"])
         matrix_check = ttk.Checkbutton(output_frame, text="保存完整矩陣", 
@@ -266,13 +385,22 @@ class CameraCalibrationGUI:
         execute_frame.columnconfigure(0, weight=1)
         row += 1
         
+        # 按鈕區域
+        button_frame = ttk.Frame(execute_frame)
+        button_frame.grid(row=0, column=0, pady=5)
+        
         # 開始標定按鈕
-        self.calibrate_btn = ttk.Button(execute_frame, text="開始標定", 
+        self.calibrate_btn = ttk.Button(button_frame, text="開始標定", 
                                        command=self.start_calibration, style="Accent.TButton")
-        self.calibrate_btn.grid(row=0, column=0, pady=5)
+        self.calibrate_btn.pack(side=tk.LEFT)
         
-        # 進度條
-        self.progress = ttk.Progressbar(execute_frame, mode='indeterminate')
+        # 取消按鈕
+        self.cancel_btn = ttk.Button(button_frame, text="取消", 
+                                    command=self.cancel_calibration, state="disabled")
+        self.cancel_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 進度條 (依已處理的影像數量顯示)
+        self.progress = ttk.Progressbar(execute_frame, mode='determinate')
         self.progress.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=5)
         
         # 狀態標籤
@@ -286,22 +414,37 @@ class CameraCalibrationGUI:
         result_frame.rowconfigure(0, weight=1)
         main_frame.rowconfigure(row, weight=1)
         
+        # 結果分頁：文字結果與影像縮圖
+        result_notebook = ttk.Notebook(result_frame)
+        result_notebook.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
         # 結果文字框
-        self.result_text = scrolledtext.ScrolledText(result_frame, height=15, width=70,
+        self.result_text = scrolledtext.ScrolledText(result_notebook, height=15, width=70,
                                                     font=('Consolas', 9))
-        self.result_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        result_notebook.add(self.result_text, text="標定訊息")
+        
+        # 影像縮圖瀏覽 (顯示檢測結果與角點)
+        self.thumbnail_panel = ThumbnailPanel(result_notebook,
+                                              os.path.join(self.script_dir, "cache", "thumbnails"))
+        result_notebook.add(self.thumbnail_panel, text="影像瀏覽")
         
         # 初始化結果顯示
         self.result_text.insert(tk.END, "相機內參標定工具 - GUI版本\n")
         self.result_text.insert(tk.END, "=" * 50 + "\n")
-        self.result_text.insert(tk.END, f"OpenCV版本: {cv2.__version__}\n")
-        self.result_text.insert(tk.END, f"NumPy版本: {np.__version__}\n\n")
         self.result_text.insert(tk.END, "請設定參數並點擊'開始標定'按鈕...\n")
     
-    def update_folder_combo(self):
+    def update_folder_combo(self, existing_folders=None):
         """
         更新資料夾下拉選單
+        
+        參數:
+            existing_folders: 已確認存在的資料夾集合 (None 表示直接檢查路徑)
         """
+        if existing_folders is None:
+            folder_exists = os.path.exists
+        else:
+            folder_exists = existing_folders.__contains__
+        
         # 取得預設路徑和最近使用的路徑
         default_folder = self.images_folder
         recent_folders = self.ui_settings.get("recent_folders", [])
@@ -314,7 +457,7 @@ class CameraCalibrationGUI:
         
         # 添加最近使用的路徑
         for folder in recent_folders:
-            if folder != default_folder and os.path.exists(folder):
+            if folder != default_folder and folder_exists(folder):
                 # 直接顯示完整路徑，避免解析問題
                 folder_options.append(f"📁 {folder}")
         
@@ -344,7 +487,7 @@ class CameraCalibrationGUI:
                         break
             
             # 如果沒找到匹配項，添加當前路徑到選項中
-            if not found_match and current_folder and os.path.exists(current_folder):
+            if not found_match and current_folder and folder_exists(current_folder):
                 new_option = f"📁 {current_folder}"
                 folder_options.append(new_option)
                 self.folder_combo['values'] = folder_options
@@ -394,6 +537,9 @@ class CameraCalibrationGUI:
             new_folder = os.path.normpath(new_folder)
             print(f"DEBUG - on_folder_changed: 標準化路徑='{new_folder}'")
         
+        # 切換資料夾時停止監看
+        self.stop_watch()
+        
         # 更新路徑變數
         self.folder_var.set(new_folder)
         print(f"DEBUG - on_folder_changed: 設定folder_var='{new_folder}'")
@@ -425,6 +571,9 @@ class CameraCalibrationGUI:
             # 標準化路徑
             selected_folder = os.path.normpath(selected_folder)
             
+            # 切換資料夾時停止監看
+            self.stop_watch()
+            
             # 更新路徑
             self.folder_var.set(selected_folder)
             
@@ -464,65 +613,120 @@ class CameraCalibrationGUI:
     
     def update_image_count(self):
         """
-        更新圖片數量顯示
+        更新圖片數量顯示 (在背景執行緒收集影像，避免網路磁碟阻塞介面)
+        """
+        current_folder = self.folder_var.get()
+        print(f"DEBUG - update_image_count: 當前路徑='{current_folder}'")
+        
+        # 標準化路徑
+        if current_folder:
+            current_folder = os.path.normpath(current_folder)
+        
+        self.image_count_label.config(text="⏳ 正在檢查圖像...", foreground="gray")
+        threading.Thread(target=self.image_count_thread, args=(current_folder,), daemon=True).start()
+    
+    def image_count_thread(self, current_folder):
+        """
+        背景執行緒: 檢查資料夾並收集支援格式的影像
+        
+        參數:
+            current_folder: 標準化後的資料夾路徑
         """
         try:
-            current_folder = self.folder_var.get()
-            print(f"DEBUG - update_image_count: 當前路徑='{current_folder}'")
-            
-            # 標準化路徑
-            if current_folder:
-                current_folder = os.path.normpath(current_folder)
-                print(f"DEBUG - update_image_count: 標準化路徑='{current_folder}'")
-            
-            print(f"DEBUG - update_image_count: 路徑存在={os.path.exists(current_folder) if current_folder else False}")
-            
             if not current_folder or not os.path.exists(current_folder):
-                self.image_count_label.config(text="❌ 選擇的資料夾不存在", foreground="red")
-                return
-            
-            # 支援的影像格式
-            image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.tiff', '*.tif']
-            image_files = []
-            
-            for extension in image_extensions:
-                image_files.extend(glob.glob(os.path.join(current_folder, extension)))
-                image_files.extend(glob.glob(os.path.join(current_folder, extension.upper())))
-            
-            # 移除重複項
-            image_files = list(set(image_files))
-            count = len(image_files)
-            
-            if count == 0:
-                self.image_count_label.config(text="❌ 未找到標定圖像", foreground="red")
-            elif count < 5:
-                self.image_count_label.config(text=f"⚠️ 找到 {count} 張圖像 (建議至少5張)", foreground="orange")
+                image_files = None
             else:
-                self.image_count_label.config(text=f"✅ 找到 {count} 張標定圖像", foreground="green")
-        
+                image_files = collect_image_files(current_folder)
+            self.ui_queue.put(("image_count", (current_folder, image_files, None)))
         except Exception as e:
-            self.image_count_label.config(text=f"❌ 檢查圖像錯誤: {e}", foreground="red")
+            self.ui_queue.put(("image_count", (current_folder, None, e)))
     
-    def generate_config_ini(self):
+    def apply_image_count(self, folder, image_files, error):
+        """
+        在主執行緒更新圖片數量與縮圖 (資料夾已切換時捨棄過時的結果)
+        
+        參數:
+            folder: 收集影像的資料夾
+            image_files: 影像路徑列表，資料夾不存在時為 None
+            error: 收集影像時的錯誤
+        """
+        current_folder = self.folder_var.get()
+        if current_folder:
+            current_folder = os.path.normpath(current_folder)
+        if folder != current_folder:
+            return
+        
+        if error is not None:
+            self.image_count_label.config(text=f"❌ 檢查圖像錯誤: {error}", foreground="red")
+            return
+        
+        if image_files is None:
+            self.image_count_label.config(text="❌ 選擇的資料夾不存在", foreground="red")
+            self.thumbnail_panel.set_images([])
+            return
+        
+        count = len(image_files)
+        self.thumbnail_panel.set_images(image_files)
+        
+        if count == 0:
+            self.image_count_label.config(text="❌ 未找到標定圖像", foreground="red")
+        elif count < 5:
+            self.image_count_label.config(text=f"⚠️ 找到 {count} 張圖像 (建議至少5張)", foreground="orange")
+        else:
+            self.image_count_label.config(text=f"✅ 找到 {count} 張標定圖像", foreground="green")
+    
+    def get_calibration_settings(self):
+        """
+        取得UI輸入的標定參數
+        
+        回傳:
+            settings: 參數字典，可直接注入 CameraCalibration
+        """
+        return {
+            "board_width": self.board_width_var.get(),
+            "board_height": self.board_height_var.get(),
+            "auto_board_size": self.auto_board_var.get(),
+            "square_size": self.square_size_var.get(),
+            "focal_length": self.focal_length_var.get(),
+            "min_images": 5,
+            "error_threshold": self.error_threshold_var.get(),
+            "distortion_coeffs_count": self.distortion_var.get(),
+            "max_boards": self.max_boards_var.get(),
+            "detection_timeout": self.detection_timeout_var.get(),
+            "corner_refinement": self.corner_refinement_var.get(),
+            "raw_mode": self.raw_mode_var.get(),
+            "corner_spill_views": self.corner_spill_var.get(),
+            "save_full_matrix": self.save_matrix_var.get(),
+            "save_full_distortion": self.save_distortion_var.get()
+        }
+    
+    def generate_config_ini(self, settings):
         """
         根據UI輸入生成config.ini檔案
+        
+        參數:
+            settings: get_calibration_settings 回傳的參數字典
         """
         # 直接寫入字符串格式，避免ConfigParser的格式問題
         config_content = f"""[相機設定]
 # 相機物理焦距（單位：毫米）
 # 請輸入您相機鏡頭的實際焦距，例如：50, 85, 135等
-物理焦距 = {self.focal_length_var.get()}
+物理焦距 = {settings["focal_length"]}
 
 [標定板設定]
 # 棋盤格內角點數量（注意：這是內角點，不是方格數量）
 # 例如：8x6的棋盤格有7x5個內角點，9x7的棋盤格有8x6個內角點
 # 格式：寬度,高度
-內角點數量 = {self.board_width_var.get()},{self.board_height_var.get()}
+內角點數量 = {settings["board_width"]},{settings["board_height"]}
 
 # 棋盤格方格的實際尺寸（單位：mm）
 # 請使用尺子精確測量您標定板上每個方格的邊長
 # 這個數值的準確性直接影響校正結果的品質
-方格尺寸 = {self.square_size_var.get()}
+方格尺寸 = {settings["square_size"]}
+
+# 是否由樣本影像自動偵測內角點數量（true/false）
+# 開啟時先以少量影像偵測，與上面的設定值不同時本次執行使用偵測結果
+自動偵測內角點數量 = {str(settings["auto_board_size"]).lower()}
 
 [程式設定]
 # 最少需要成功檢測的影像數量才能進行校正
@@ -530,7 +734,7 @@ class CameraCalibrationGUI:
 
 # 重投影誤差警告閾值（像素）
 # 超過此值會顯示警告訊息
-誤差警告閾值 = {self.error_threshold_var.get()}
+誤差警告閾值 = {settings["error_threshold"]}
 
 # 畸變係數數量設定（支援5、8、12、14項）
 # 重要提醒：高階畸變係數需要更多圖片來避免過度擬合
@@ -555,14 +759,38 @@ class CameraCalibrationGUI:
 #      - 建議圖片數量：40-60張
 #      - 警告：容易過度擬合，需要更多樣化的拍攝角度
 #      - 如果RMS反而變大，建議改用12項
-畸變係數項數 = {self.distortion_var.get()}
+畸變係數項數 = {settings["distortion_coeffs_count"]}
+
+# 每張影像最多檢測的標定板數量（同規格棋盤格）
+# 大於1時，找到一個標定板後會將其遮蔽並繼續搜尋，每個標定板各自成為一個標定視角
+每張影像標定板數量 = {settings["max_boards"]}
+
+# 單張影像的角點檢測時限（秒，0 表示不限制）
+# 大於0時每張影像在獨立程序中檢測，逾時或造成程序崩潰的影像會標記失敗，其餘影像繼續處理
+單張影像檢測時限 = {settings["detection_timeout"]}
+
+# 角點亞像素精修方式（fixed、adaptive、saddle）
+# fixed：固定 11x11 視窗（舊版做法），方格小於約23像素時可能被相鄰角點拉偏
+# adaptive：視窗依影像中的方格大小決定，較早終止迭代
+# saddle：以二次曲面擬合角點附近亮度的鞍點，一次計算整個標定板，精度通常最高
+角點精修方式 = {settings["corner_refinement"]}
+
+# 原始影像模式（off、mono、RGGB、BGGR、GRBG、GBRG）
+# off：一般影像；mono：16位元（或10/12位元）單色影像，以原始位元深度讀取
+# RGGB/BGGR/GRBG/GBRG：Bayer 原始影像（感測器左上角的排列），不做去馬賽克，
+#   以綠色像素產生半解析度亮度影像檢測，角點換算回全解析度座標
+原始影像模式 = {settings["raw_mode"]}
+
+# 角點溢出影像數（0 表示只使用記憶體）
+# 影像數量非常多時，超過此數量後角點改存於系統暫存資料夾的 memmap 檔案，減少記憶體用量
+角點溢出影像數 = {settings["corner_spill_views"]}
 
 [輸出設定]
 # 是否在結果中保存相機內參矩陣的完整陣列
-保存完整矩陣 = {str(self.save_matrix_var.get()).lower()}
+保存完整矩陣 = {str(settings["save_full_matrix"]).lower()}
 
 # 是否在結果中保存畸變係數的完整陣列
-保存完整畸變係數 = {str(self.save_distortion_var.get()).lower()}
+保存完整畸變係數 = {str(settings["save_full_distortion"]).lower()}
 """
         
         # 寫入檔案
@@ -594,6 +822,18 @@ class CameraCalibrationGUI:
                 messagebox.showerror("輸入錯誤", "誤差警告閾值必須大於0")
                 return False
             
+            if self.max_boards_var.get() < 1:
+                messagebox.showerror("輸入錯誤", "每張影像標定板數量必須至少為1")
+                return False
+            
+            if self.detection_timeout_var.get() < 0:
+                messagebox.showerror("輸入錯誤", "單張影像檢測時限不可小於0")
+                return False
+            
+            if self.corner_spill_var.get() < 0:
+                messagebox.showerror("輸入錯誤", "角點溢出影像數不可小於0")
+                return False
+            
             # 檢查圖像資料夾
             current_folder = self.folder_var.get()
             if not current_folder or not os.path.exists(current_folder):
@@ -608,42 +848,113 @@ class CameraCalibrationGUI:
     
     def update_status(self, message):
         """
-        更新狀態顯示
+        更新狀態顯示 (可由背景執行緒呼叫)
         
         參數:
             message: 狀態訊息
         """
-        self.status_label.config(text=message)
-        self.root.update_idletasks()
+        self.ui_queue.put(("status", message))
     
     def add_result_text(self, text):
         """
-        添加結果文字
+        添加結果文字 (可由背景執行緒呼叫)
         
         參數:
             text: 要添加的文字
         """
-        self.result_text.insert(tk.END, text)
-        self.result_text.see(tk.END)
-        self.root.update_idletasks()
+        self.ui_queue.put(("text", text))
+    
+    def update_progress(self, done, total, image_path, corners):
+        """
+        更新影像處理進度 (由背景執行緒的 process_images 呼叫)
+        
+        參數:
+            done: 已處理數量
+            total: 總數量
+            image_path: 影像路徑
+            corners: 角點座標 (未找到角點為 None)
+        """
+        self.ui_queue.put(("image_result", (image_path, corners)))
+        self.ui_queue.put(("progress", (done, total, os.path.basename(image_path))))
     
-    def calibration_thread(self):
+    def process_ui_queue(self):
+        """
+        在主執行緒中處理背景執行緒送來的介面更新
+        
+        一次取出佇列中所有事件，文字合併後只插入一次，避免大量日誌拖慢介面。
+        """
+        texts = []
+        status = None
+        progress = None
+        finished = False
+        
+        try:
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == "text":
+                    texts.append(payload)
+                elif kind == "status":
+                    status = payload
+                elif kind == "progress":
+                    progress = payload
+                    done, total, image_name = payload
+                    
+                    # 依平均處理時間估計剩餘時間
+                    elapsed = time.time() - self.progress_start_time
+                    remaining = elapsed / done * (total - done)
+                    status = f"處理標定影像 {done}/{total}: {image_name} (預估剩餘 {remaining:.0f} 秒)"
+                elif kind == "image_result":
+                    image_path, corners = payload
+                    self.thumbnail_panel.add_image(image_path)
+                    self.thumbnail_panel.set_result(image_path, corners, self.calibrator.image_size)
+                elif kind == "finished":
+                    finished = True
+                elif kind == "folders":
+                    self.update_folder_combo(existing_folders=payload)
+                elif kind == "image_count":
+                    self.apply_image_count(*payload)
+                elif kind == "ready":
+                    self.on_backend_ready(*payload)
+        except queue.Empty:
+            pass
+        
+        if texts:
+            self.result_text.insert(tk.END, "".join(texts))
+            self.result_text.see(tk.END)
+        
+        if progress is not None:
+            done, total, _ = progress
+            self.progress.config(maximum=total, value=done)
+        
+        if status is not None:
+            self.status_label.config(text=status)
+        
+        if finished:
+            # 恢復UI狀態
+            self.is_calibrating = False
+            self.calibrate_btn.config(state="normal", text="開始標定")
+            self.cancel_btn.config(state="disabled")
+        
+        self.root.after(50, self.process_ui_queue)
+    
+    def calibration_thread(self, settings, current_folder):
         """
         標定執行緒
+        
+        只透過 update_status/add_result_text/update_progress 更新介面，不直接操作 Tk 元件。
+        
+        參數:
+            settings: 標定參數字典
+            current_folder: 圖像資料夾路徑
         """
         try:
             self.add_result_text("\n" + "="*50 + "\n")
             self.add_result_text("開始相機內參標定...\n")
             self.add_result_text("="*50 + "\n")
             
-            # 生成config.ini
-            self.update_status("生成設定檔...")
-            self.generate_config_ini()
-            self.add_result_text("✅ 設定檔已生成\n")
-            
-            # 建立標定物件
+            # 建立標定物件 (直接注入UI設定)
             self.update_status("初始化標定器...")
-            self.calibrator = CameraCalibration()
+            self.calibrator = CameraCalibration(settings)
             self.add_result_text(f"✅ 標定器初始化完成\n")
             self.add_result_text(f"   物理焦距: {self.calibrator.focal_length}mm\n")
             self.add_result_text(f"   棋盤格內角點: {self.calibrator.board_size[0]}x{self.calibrator.board_size[1]}\n")
@@ -651,32 +962,47 @@ class CameraCalibrationGUI:
             self.add_result_text(f"   畸變係數項數: {self.calibrator.distortion_coeffs_count}項\n\n")
             
             # 處理影像
-            current_folder = self.folder_var.get()
             self.update_status("處理標定影像...")
             self.add_result_text(f"處理標定影像...\n")
             self.add_result_text(f"圖像資料夾: {current_folder}\n")
-            success = self.calibrator.process_images(current_folder)
+            self.progress_start_time = time.time()
+            success = self.calibrator.process_images(current_folder,
+                                                     progress_callback=self.update_progress,
+                                                     cancel_event=self.cancel_event)
             
             if not success:
                 self.add_result_text("❌ 影像處理失敗\n")
                 raise Exception("影像處理失敗")
             
-            self.add_result_text(f"✅ 成功處理 {len(self.calibrator.object_points)} 張影像\n\n")
+            detected_size = tuple(self.calibrator.board_size)
+            if detected_size != (settings["board_width"], settings["board_height"]):
+                self.add_result_text(f"🔍 自動偵測內角點數量: {detected_size[0]}x{detected_size[1]} "
+                                     f"(輸入值為 {settings['board_width']}x{settings['board_height']})\n")
+            self.add_result_text(f"✅ 成功處理 {len(self.calibrator.corner_store)} 張影像\n\n")
+            if self.calibrator.detection_failures:
+                self.add_result_text(f"⚠️ 檢測失敗 {len(self.calibrator.detection_failures)} 張影像:\n")
+                for name, reason in self.calibrator.detection_failures.items():
+                    self.add_result_text(f"   {name}: {reason}\n")
+                self.add_result_text("\n")
             
-            # 取得影像尺寸
-            self.update_status("分析影像尺寸...")
-            for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp']:
-                files = glob.glob(os.path.join(current_folder, ext))
-                if files:
-                    sample_img = cv2.imread(files[0])
-                    if sample_img is not None:
-                        image_size = (sample_img.shape[1], sample_img.shape[0])
-                        break
-            else:
+            # 取得影像尺寸 (檢測時已記錄)
+            image_size = self.calibrator.image_size
+            if image_size is None:
                 raise Exception("無法取得影像尺寸")
             
+            # 快速預覽 (閉式解，不含畸變)，完整標定計算期間先顯示近似內參
+            try:
+                preview = preview_intrinsics(self.calibrator)
+                self.add_result_text(f"⚡ 快速預覽 ({preview['seconds'] * 1000:.0f} ms，不含畸變，僅供參考):\n")
+                self.add_result_text(f"   fx={preview['fx']:.2f} fy={preview['fy']:.2f} "
+                                     f"cx={preview['cx']:.2f} cy={preview['cy']:.2f}，"
+                                     f"單應矩陣誤差 {preview['homography_rms']:.3f} 像素\n\n")
+                self.update_status(f"執行相機標定... (預覽 fx={preview['fx']:.0f} fy={preview['fy']:.0f})")
+            except ValueError as e:
+                self.add_result_text(f"⚠️ 無法產生快速預覽: {e}\n\n")
+                self.update_status("執行相機標定...")
+            
             # 執行標定
-            self.update_status("執行相機標定...")
             self.add_result_text("執行相機標定計算...\n")
             calibration_success = self.calibrator.calibrate_camera(image_size)
             
@@ -687,7 +1013,7 @@ class CameraCalibrationGUI:
             self.add_result_text("\n" + "="*50 + "\n")
             self.add_result_text("📊 標定結果\n")
             self.add_result_text("="*50 + "\n")
-            self.add_result_text(f"使用圖片數量: {len(self.calibrator.object_points)} 張\n")
+            self.add_result_text(f"使用圖片數量: {len(self.calibrator.corner_store)} 張\n")
             self.add_result_text(f"畸變係數項數: {self.calibrator.distortion_coeffs_count} 項\n")
             self.add_result_text(f"RMS重投影誤差: {self.calibrator.rms_error:.4f} 像素\n\n")
             
@@ -721,65 +1047,197 @@ class CameraCalibrationGUI:
             self.add_result_text("\n🎉 標定完成！\n")
             
             # 保存UI設定
-            self.save_current_settings()
+            self.save_current_settings(settings, current_folder)
             
+        except CalibrationCancelled:
+            self.add_result_text("\n⏹️ 標定已取消\n")
+            self.update_status("標定已取消")
+        
         except Exception as e:
             self.add_result_text(f"\n❌ 標定過程發生錯誤: {str(e)}\n")
             self.update_status(f"標定失敗: {str(e)}")
         
         finally:
-            # 恢復UI狀態
-            self.is_calibrating = False
-            self.calibrate_btn.config(state="normal", text="開始標定")
-            self.progress.stop()
+            # 通知主執行緒恢復UI狀態
+            self.ui_queue.put(("finished", None))
     
-    def save_current_settings(self):
+    def save_current_settings(self, settings, current_folder):
         """
-        保存當前UI設定到記憶檔案
+        保存當前UI設定到記憶檔案 (可由背景執行緒呼叫)
+        
+        參數:
+            settings: 本次標定使用的參數字典
+            current_folder: 本次標定使用的圖像資料夾
         """
         try:
             self.ui_settings.update({
-                "board_width": self.board_width_var.get(),
-                "board_height": self.board_height_var.get(),
-                "square_size": self.square_size_var.get(),
-                "focal_length": self.focal_length_var.get(),
-                "error_threshold": self.error_threshold_var.get(),
-                "distortion_coeffs_count": self.distortion_var.get(),
-                "save_full_matrix": self.save_matrix_var.get(),
-                "save_full_distortion": self.save_distortion_var.get(),
-                "image_folder": self.folder_var.get()
+                "board_width": settings["board_width"],
+                "board_height": settings["board_height"],
+                "auto_board_size": settings["auto_board_size"],
+                "square_size": settings["square_size"],
+                "focal_length": settings["focal_length"],
+                "error_threshold": settings["error_threshold"],
+                "distortion_coeffs_count": settings["distortion_coeffs_count"],
+                "max_boards": settings["max_boards"],
+                "detection_timeout": settings["detection_timeout"],
+                "corner_refinement": settings["corner_refinement"],
+                "raw_mode": settings["raw_mode"],
+                "corner_spill_views": settings["corner_spill_views"],
+                "save_full_matrix": settings["save_full_matrix"],
+                "save_full_distortion": settings["save_full_distortion"],
+                "image_folder": current_folder
             })
             
             # 加入當前資料夾到最近使用清單
-            current_folder = self.folder_var.get()
             if current_folder and current_folder != self.images_folder:
                 self.add_to_recent_folders(current_folder)
             
             self.save_ui_settings()
             self.add_result_text("✅ UI設定已記憶\n")
+            
+            # 同步生成config.ini，讓命令行版本沿用相同設定
+            self.generate_config_ini(settings)
         except Exception as e:
             print(f"保存UI設定錯誤: {e}")
     
+    def toggle_watch(self):
+        """
+        監看資料夾核取方塊切換時的處理
+        """
+        if self.watch_var.get():
+            self.start_watch()
+        else:
+            self.stop_watch()
+    
+    def start_watch(self):
+        """
+        開始監看目前的圖像資料夾
+        """
+        if self.is_calibrating or not self.backend_ready or not self.validate_inputs():
+            self.watch_var.set(False)
+            return
+        
+        settings = self.get_calibration_settings()
+        current_folder = self.folder_var.get()
+        
+        self.calibrator = CameraCalibration(settings)
+        self.watcher = FolderWatcher(self.calibrator, current_folder,
+                                     on_image=lambda path, corners: self.ui_queue.put(("image_result", (path, corners))),
+                                     on_result=self.on_watch_result,
+                                     on_error=lambda e: self.add_result_text(f"❌ 監看錯誤: {e}\n"))
+        self.watch_settings = settings
+        
+        # 更新UI狀態 (監看期間不可另外執行標定)
+        self.is_calibrating = True
+        self.calibrate_btn.config(state="disabled", text="監看中...")
+        self.progress.config(value=0)
+        self.result_text.delete(1.0, tk.END)
+        self.thumbnail_panel.reset_states()
+        self.add_result_text(f"👁️ 開始監看資料夾: {current_folder}\n")
+        self.add_result_text(f"   成功檢測 {self.calibrator.min_images} 張影像後開始標定，之後每加入新影像即時更新\n\n")
+        self.update_status("監看資料夾中...")
+        
+        self.watcher.start()
+    
+    def on_watch_result(self, calibrator):
+        """
+        監看模式重新標定完成 (由監看執行緒呼叫)
+        
+        參數:
+            calibrator: 已更新結果的 CameraCalibration
+        """
+        matrix = calibrator.camera_matrix
+        self.add_result_text(f"[即時結果] 使用 {len(calibrator.corner_store)} 張影像，"
+                             f"RMS {calibrator.rms_error:.4f} 像素，"
+                             f"fx={matrix[0, 0]:.2f} fy={matrix[1, 1]:.2f} "
+                             f"cx={matrix[0, 2]:.2f} cy={matrix[1, 2]:.2f}\n")
+        self.update_status(f"監看中: 已使用 {len(calibrator.corner_store)} 張影像，RMS {calibrator.rms_error:.4f} 像素")
+    
+    def stop_watch(self):
+        """
+        停止監看，並在背景執行緒完成最後一次標定與保存
+        """
+        if self.watcher is None:
+            return
+        
+        watcher = self.watcher
+        self.watcher = None
+        self.watch_var.set(False)
+        self.update_status("正在停止監看...")
+        threading.Thread(target=self.finish_watch_thread, args=(watcher,), daemon=True).start()
+    
+    def finish_watch_thread(self, watcher):
+        """
+        結束監看執行緒：等待監看停止、補做最後一次標定並保存結果
+        
+        參數:
+            watcher: 要停止的 FolderWatcher
+        """
+        try:
+            watcher.stop()
+            watcher.update_result()
+            
+            calibrator = watcher.calibrator
+            if calibrator.camera_matrix is None:
+                self.add_result_text(f"\n⚠️ 成功檢測的影像不足 {calibrator.min_images} 張，未產生標定結果\n")
+                self.update_status("監看已停止")
+                return
+            
+            result_dir = os.path.join(self.script_dir, "result")
+            timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            output_file = os.path.join(result_dir, f"camera_calibration_{timestamp}.json")
+            if calibrator.save_results(output_file):
+                self.add_result_text(f"\n✅ 標定結果已保存至: {os.path.basename(output_file)}\n")
+            else:
+                self.add_result_text("\n❌ 保存結果失敗\n")
+            
+            self.update_status("監看已停止，標定完成！")
+            self.save_current_settings(self.watch_settings, watcher.images_folder)
+        
+        except Exception as e:
+            self.add_result_text(f"\n❌ 停止監看時發生錯誤: {str(e)}\n")
+            self.update_status(f"標定失敗: {str(e)}")
+        
+        finally:
+            self.ui_queue.put(("finished", None))
+    
     def start_calibration(self):
         """
         開始標定流程
         """
-        if self.is_calibrating:
+        if self.is_calibrating or not self.backend_ready:
             return
         
         # 驗證輸入
         if not self.validate_inputs():
             return
         
+        # 在主執行緒讀取UI輸入，背景執行緒不存取 Tk 變數
+        settings = self.get_calibration_settings()
+        current_folder = self.folder_var.get()
+        
         # 更新UI狀態
         self.is_calibrating = True
+        self.cancel_event.clear()
         self.calibrate_btn.config(state="disabled", text="標定中...")
-        self.progress.start()
+        self.cancel_btn.config(state="normal")
+        self.progress.config(value=0)
         self.result_text.delete(1.0, tk.END)
+        self.thumbnail_panel.reset_states()
         
         # 啟動標定執行緒
-        calibration_thread = threading.Thread(target=self.calibration_thread, daemon=True)
+        calibration_thread = threading.Thread(target=self.calibration_thread,
+                                              args=(settings, current_folder), daemon=True)
         calibration_thread.start()
+    
+    def cancel_calibration(self):
+        """
+        取消標定流程 (目前影像處理完畢後立即中止)
+        """
+        if self.is_calibrating:
+            self.cancel_event.set()
+            self.cancel_btn.config(state="disabled")
+            self.status_label.config(text="正在取消...")
 
 
 def main():
@@ -805,4 +1263,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包成執行檔時，檢測程序 (單張影像檢測時限) 需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
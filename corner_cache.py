@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 角點快取
+
+作者: Toby
+描述: 以影像內容識別與棋盤格尺寸為鍵保存角點檢測結果，相同影像不必重複檢測
+日期: 2026/10/18
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+from camera_calibration import np
+
+
+def boards_suffix(max_boards):
+    """
+    快取鍵的標定板數量部分 (單一標定板時為空字串，沿用既有的快取鍵)
+    """
+    return f"|boards{max_boards}" if max_boards > 1 else ""
+
+
+class CornerCache:
+    """
+    角點檢測結果快取 (執行緒安全)
+
+    鍵由影像識別 (檔案路徑+修改時間+大小，或上傳資料的雜湊) 與棋盤格尺寸組成，
+    影像被修改或改用其他標定板時自動失效。
+    可選擇保存到JSON檔案，下次執行時沿用。
+    """
+
+    def __init__(self, cache_path=None, max_items=100000):
+        """
+        初始化角點快取
+
+        參數:
+            cache_path: 快取檔案路徑 (None 表示只存在記憶體中)
+            max_items: 最多保存的影像數量，超過時移除最久未使用的項目
+        """
+        self.cache_path = cache_path
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()   # 定時寫入與結束時寫入不會同時寫同一個暫存檔
+        self._dirty = False
+
+        if cache_path and os.path.exists(cache_path):
+            self.load()
+
+    @staticmethod
+    def file_key(image_path, board_size, refine_method="adaptive", raw_mode="off", max_boards=1):
+        """
+        取得影像檔案的快取鍵
+
+        參數:
+            image_path: 影像檔案路徑
+            board_size: 棋盤格內角點數量 (寬, 高)
+            refine_method: 角點亞像素精修方式 (不同方式的角點不共用快取)
+            raw_mode: 原始影像模式 (同一檔案以不同模式讀取的角點不共用快取)
+            max_boards: 每張影像的標定板數量上限 (大於1時快取值為所有標定板的角點依序串接)
+        """
+        stat = os.stat(image_path)
+        return (f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|"
+                f"{board_size[0]}x{board_size[1]}|{refine_method}|{raw_mode}{boards_suffix(max_boards)}")
+
+    @staticmethod
+    def data_key(data, board_size, refine_method="adaptive", raw_mode="off", max_boards=1):
+        """
+        取得影像資料 (bytes) 的快取鍵
+
+        參數:
+            data: 已編碼的影像資料
+            board_size: 棋盤格內角點數量 (寬, 高)
+            refine_method: 角點亞像素精修方式 (不同方式的角點不共用快取)
+            raw_mode: 原始影像模式 (同一資料以不同模式讀取的角點不共用快取)
+            max_boards: 每張影像的標定板數量上限 (大於1時快取值為所有標定板的角點依序串接)
+        """
+        return (f"sha1:{hashlib.sha1(data).hexdigest()}|{board_size[0]}x{board_size[1]}|"
+                f"{refine_method}|{raw_mode}{boards_suffix(max_boards)}")
+
+    def get(self, key):
+        """
+        查詢快取
+
+        參數:
+            key: 快取鍵
+
+        回傳:
+            entry: (角點座標或None, 影像尺寸)，沒有快取時為 None
+        """
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            self._items.move_to_end(key)
+        corners, image_size = entry
+        return (corners.copy() if corners is not None else None), image_size
+
+    def put(self, key, corners, image_size):
+        """
+        加入快取
+
+        參數:
+            key: 快取鍵
+            corners: 角點座標 (未找到角點為 None)
+            image_size: 影像尺寸 (寬度, 高度)
+        """
+        if corners is not None:
+            corners = np.asarray(corners, dtype=np.float32).reshape(-1, 1, 2)
+        with self._lock:
+            self._items[key] = (corners, tuple(image_size) if image_size else None)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+            self._dirty = True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def load(self):
+        """
+        從快取檔案載入
+        """
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"角點快取讀取錯誤，忽略快取: {e}")
+            return
+
+        with self._lock:
+            for key, entry in data.items():
+                corners = entry.get("corners")
+                if corners is not None:
+                    corners = np.array(corners, dtype=np.float32).reshape(-1, 1, 2)
+                image_size = tuple(entry["image_size"]) if entry.get("image_size") else None
+                self._items[key] = (corners, image_size)
+            self._dirty = False
+
+    def save(self):
+        """
+        寫入快取檔案 (有變更時才寫入)
+        """
+        if not self.cache_path:
+            return
+
+        with self._save_lock:
+            self._write()
+
+    def _write(self):
+        """
+        實際寫入快取檔案 (呼叫端需持有 _save_lock)
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                key: {
+                    "corners": corners.reshape(-1, 2).tolist() if corners is not None else None,
+                    "image_size": list(image_size) if image_size else None
+                }
+                for key, (corners, image_size) in self._items.items()
+            }
+            self._dirty = False
+
+        cache_dir = os.path.dirname(self.cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.cache_path)
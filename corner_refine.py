@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 角點亞像素精修
+
+作者: Toby
+描述: 依影像中實際的方格大小 (像素) 決定 cornerSubPix 的搜尋視窗，並放寬終止條件提早結束；
+      另提供以 NumPy 一次處理整個視角所有角點的鞍點擬合精修 (二次曲面的鞍點)。
+      固定 (11,11) 視窗在方格小於約 23 像素時會涵蓋相鄰角點，角點可能被拉偏數個像素；
+      方格很大時又只用到角點附近一小塊。直接執行本程式可比較各方法的時間與標定結果
+日期: 2026/10/18
+"""
+
+import os
+import sys
+import time
+import argparse
+
+try:
+    from camera_calibration import (cv2, np, REFINE_METHODS, collect_image_files, read_gray_image,
+                                    CameraCalibration)
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保 camera_calibration.py 位於同一資料夾")
+    sys.exit(1)
+
+
+# 固定視窗 (先前版本的做法)
+FIXED_WINDOW = (11, 11)
+FIXED_CRITERIA = (30, 0.001)
+
+# cornerSubPix 的半視窗為方格邊長的比例 (小於0.5，不涵蓋相鄰角點；透視造成方格大小不一時仍留有餘裕)
+WINDOW_RATIO = 0.4
+MIN_HALF_WINDOW = 2
+MAX_HALF_WINDOW = 15
+ADAPTIVE_CRITERIA = (20, 0.01)
+
+# 鞍點擬合只需角點附近的小範圍 (範圍越大二次曲面越不符合實際的亮度分布)
+SADDLE_RATIO = 0.15
+SADDLE_MAX_HALF_WINDOW = 8
+SADDLE_ITERATIONS = 5
+SADDLE_EPS = 0.01
+
+
+def measure_square_size(corners, board_size):
+    """
+    由角點估計方格邊長 (像素)
+
+    取水平與垂直方向相鄰角點距離的中位數，較小者為準 (斜拍時較短的方向)。
+
+    參數:
+        corners: 角點座標 (N,1,2)
+        board_size: 棋盤格內角點數量 (寬, 高)
+
+    回傳:
+        square_size: 方格邊長 (像素)
+    """
+    width, height = board_size
+    grid = corners.reshape(height, width, 2).astype(np.float64)
+    lengths = []
+    if width > 1:
+        lengths.append(np.median(np.linalg.norm(np.diff(grid, axis=1), axis=2)))
+    if height > 1:
+        lengths.append(np.median(np.linalg.norm(np.diff(grid, axis=0), axis=2)))
+    return float(min(lengths))
+
+
+def half_window_size(square_size, ratio=WINDOW_RATIO, max_half=MAX_HALF_WINDOW):
+    """
+    依方格邊長決定半視窗大小 (像素)
+    """
+    return int(np.clip(round(ratio * square_size), MIN_HALF_WINDOW, max_half))
+
+
+def refine_subpix(gray, corners, board_size):
+    """
+    以依方格大小決定的視窗執行 cornerSubPix
+
+    參數:
+        gray: 灰階影像
+        corners: findChessboardCorners 的角點座標 (N,1,2)
+        board_size: 棋盤格內角點數量 (寬, 高)
+
+    回傳:
+        corners: 精修後的角點座標 (N,1,2)
+    """
+    half = half_window_size(measure_square_size(corners, board_size))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,) + ADAPTIVE_CRITERIA
+    return cv2.cornerSubPix(gray, corners, (half, half), (-1, -1), criteria)
+
+
+def _saddle_fit_matrix(half):
+    """
+    加權二次曲面 f = a x^2 + b xy + c y^2 + d x + e y + g 的最小平方投影矩陣
+
+    每個視窗位置的取樣相同，投影矩陣只需計算一次，所有角點共用。
+
+    回傳:
+        offsets: 視窗內的取樣位置 (K,2)
+        projection: (5,K)，乘上取樣值得到 a, b, c, d, e
+    """
+    steps = np.arange(-half, half + 1, dtype=np.float64)
+    ox, oy = np.meshgrid(steps, steps)
+    ox, oy = ox.ravel(), oy.ravel()
+    sigma = max(half / 2.0, 1.0)
+    weights = np.exp(-(ox * ox + oy * oy) / (2.0 * sigma * sigma))
+    design = np.stack([ox * ox, ox * oy, oy * oy, ox, oy, np.ones_like(ox)], axis=1)
+    weighted = design * weights[:, None]
+    projection = np.linalg.solve(design.T @ weighted, weighted.T)
+    return np.stack([ox, oy], axis=1), projection[:5]
+
+
+def _sample_bilinear(gray, x, y):
+    """
+    雙線性內插取樣 (直接由 uint8 影像取值，不轉換整張影像)
+    """
+    height, width = gray.shape[:2]
+    x = np.clip(x, 0.0, width - 1.001)
+    y = np.clip(y, 0.0, height - 1.001)
+    x0 = x.astype(np.intp)
+    y0 = y.astype(np.intp)
+    fx = x - x0
+    fy = y - y0
+    top = gray[y0, x0] * (1.0 - fx) + gray[y0, x0 + 1] * fx
+    bottom = gray[y0 + 1, x0] * (1.0 - fx) + gray[y0 + 1, x0 + 1] * fx
+    return top * (1.0 - fy) + bottom * fy
+
+
+def refine_saddle(gray, corners, board_size, iterations=SADDLE_ITERATIONS):
+    """
+    鞍點擬合精修: 一次處理整個視角的所有角點
+
+    以每個角點為中心取樣 (N,K) 的亮度，乘上共用的投影矩陣得到每個角點的二次曲面係數，
+    鞍點 (梯度為零的位置) 由 2x2 線性方程式的閉式解求得，向量化計算所有角點。
+    移動量小於 SADDLE_EPS 像素時提前結束；擬合結果不是鞍點或移動超過1像素的角點維持原位置。
+
+    參數:
+        gray: 灰階影像
+        corners: findChessboardCorners 的角點座標 (N,1,2)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        iterations: 最多迭代次數
+
+    回傳:
+        corners: 精修後的角點座標 (N,1,2) float32
+    """
+    half = half_window_size(measure_square_size(corners, board_size), SADDLE_RATIO, SADDLE_MAX_HALF_WINDOW)
+    offsets, projection = _saddle_fit_matrix(half)
+    points = corners.reshape(-1, 2).astype(np.float64)
+
+    for _ in range(iterations):
+        samples = _sample_bilinear(gray, points[:, 0:1] + offsets[:, 0], points[:, 1:2] + offsets[:, 1])
+        a, b, c, d, e = projection @ samples.T
+        # 鞍點: [2a b; b 2c] [x y]^T = -[d e]^T，且行列式為負
+        det = 4.0 * a * c - b * b
+        valid = det < 0
+        det = np.where(valid, det, 1.0)
+        step = np.stack([(b * e - 2.0 * c * d) / det, (b * d - 2.0 * a * e) / det], axis=1)
+        valid &= np.abs(step).max(axis=1) <= 1.0
+        step[~valid] = 0.0
+        points += step
+        if np.abs(step).max() < SADDLE_EPS:
+            break
+
+    return points.reshape(-1, 1, 2).astype(np.float32)
+
+
+def refine_corners(gray, corners, board_size, method="adaptive"):
+    """
+    依指定方式精修角點
+
+    參數:
+        gray: 灰階影像
+        corners: findChessboardCorners 的角點座標 (N,1,2)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        method: REFINE_METHODS 之一
+
+    回傳:
+        corners: 精修後的角點座標 (N,1,2)
+    """
+    if method == "adaptive":
+        return refine_subpix(gray, corners, board_size)
+    if method == "saddle":
+        return refine_saddle(gray, corners, board_size)
+    if method == "fixed":
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER,) + FIXED_CRITERIA
+        return cv2.cornerSubPix(gray, corners, FIXED_WINDOW, (-1, -1), criteria)
+    raise ValueError(f"未知的角點精修方式: {method} (可用: {', '.join(REFINE_METHODS)})")
+
+
+def benchmark(calibrator, image_files, methods=REFINE_METHODS, repeat=3):
+    """
+    比較各精修方式: 每張影像只檢測一次，再以各方式精修同一組初始角點
+
+    準確度以標定的RMS重投影誤差比較 (實拍影像沒有真實角點位置)，
+    另列出與固定視窗結果的平均差異。
+
+    參數:
+        calibrator: CameraCalibration 物件 (提供標定板設定與標定)
+        image_files: 影像路徑列表
+        methods: 要比較的精修方式
+        repeat: 計時重複次數 (取最短時間)
+
+    回傳:
+        results: 每個方式一個字典 (method, ms_per_view, rms, mean_shift, half_window)
+    """
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FILTER_QUADS
+    views = []
+    for image_path in image_files:
+        gray = read_gray_image(image_path)
+        if gray is None:
+            continue
+        found, corners = cv2.findChessboardCorners(gray, calibrator.board_size, flags)
+        if found:
+            calibrator.image_size = (gray.shape[1], gray.shape[0])
+            views.append((os.path.basename(image_path), gray, corners))
+
+    results = []
+    reference = None
+    for method in methods:
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            refined = [refine_corners(gray, corners.copy(), calibrator.board_size, method)
+                       for _, gray, corners in views]
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+
+        if method == "fixed":
+            reference = refined
+        mean_shift = None
+        if reference is not None and method != "fixed":
+            mean_shift = float(np.mean([np.linalg.norm(a.reshape(-1, 2) - b.reshape(-1, 2), axis=1).mean()
+                                        for a, b in zip(refined, reference)]))
+
+        calibrator.corner_store.clear()
+        for (name, _, _), corners in zip(views, refined):
+            calibrator.add_view(corners, name)
+        rms = None
+        if len(calibrator.corner_store) >= calibrator.min_images and calibrator.calibrate_camera(calibrator.image_size):
+            rms = float(calibrator.rms_error)
+
+        square = np.median([measure_square_size(corners, calibrator.board_size) for _, _, corners in views])
+        half = (FIXED_WINDOW[0] if method == "fixed" else
+                half_window_size(square, SADDLE_RATIO, SADDLE_MAX_HALF_WINDOW) if method == "saddle" else
+                half_window_size(square))
+        results.append({
+            "method": method,
+            "ms_per_view": best / max(len(views), 1) * 1000,
+            "rms": rms,
+            "mean_shift": mean_shift,
+            "half_window": half
+        })
+    return results, len(views)
+
+
+def main():
+    """
+    主程式: 比較角點精修方式的時間與標定結果
+    """
+    parser = argparse.ArgumentParser(description="角點亞像素精修方式比較")
+    parser.add_argument("--images", help="標定影像資料夾 (預設為程式目錄中的image資料夾)")
+    parser.add_argument("--repeat", type=int, default=3, help="計時重複次數 (取最短時間)")
+    args = parser.parse_args()
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    images_folder = args.images or os.path.join(script_dir, "image")
+    image_files = collect_image_files(images_folder)
+    if not image_files:
+        print("錯誤: 在指定資料夾中找不到影像檔案")
+        return
+
+    calibrator = CameraCalibration(verbose=False)
+    results, view_count = benchmark(calibrator, image_files, repeat=max(1, args.repeat))
+    if not view_count:
+        print("錯誤: 沒有成功檢測到角點的影像")
+        return
+
+    print(f"\n{view_count} 個視角，棋盤格 {calibrator.board_size[0]}x{calibrator.board_size[1]}，"
+          f"畸變係數 {calibrator.distortion_coeffs_count} 項")
+    print(f"{'方式':<10}{'半視窗':>8}{'每視角(ms)':>12}{'RMS':>10}{'與fixed差異':>14}")
+    for result in results:
+        rms = f"{result['rms']:.4f}" if result["rms"] is not None else "-"
+        shift = f"{result['mean_shift']:.4f}" if result["mean_shift"] is not None else "-"
+        print(f"{result['method']:<10}{result['half_window']:>8}{result['ms_per_view']:>12.2f}{rms:>10}{shift:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 除錯影像輸出
+
+作者: Toby
+描述: 在背景執行緒中繪製並寫入標註影像 (檢測角點、重投影點、殘差向量)，
+      工作佇列有上限且提交時不會阻塞，標定結果不需等待影像編碼與寫檔
+日期: 2026/10/18
+"""
+
+import os
+import queue
+import posixpath
+import threading
+
+from camera_calibration import cv2, np
+
+
+# 支援的輸出格式
+DEBUG_FORMATS = ("jpg", "png")
+
+# 殘差向量的放大倍率 (亞像素殘差放大後才看得見)
+RESIDUAL_SCALE = 20.0
+
+
+class DebugImageWriter:
+    """
+    背景除錯影像寫入器
+
+    以固定數量的工作執行緒 (OpenCV 繪圖與編碼時會釋放GIL) 處理有上限的工作佇列；
+    佇列已滿或已達張數上限時直接捨棄，不會讓呼叫端等待。
+    """
+
+    def __init__(self, output_dir, workers=2, queue_size=16, image_format="jpg",
+                 jpeg_quality=90, png_compression=1, max_images=None):
+        """
+        初始化寫入器並啟動工作執行緒
+
+        參數:
+            output_dir: 除錯影像輸出資料夾
+            workers: 工作執行緒數量
+            queue_size: 佇列上限 (等待寫入的影像數)
+            image_format: "jpg" (最快) 或 "png" (無損，使用低壓縮等級)
+            jpeg_quality: JPEG 品質 (0-100)
+            png_compression: PNG 壓縮等級 (0-9，越小越快)
+            max_images: 最多寫入的影像數 (None 表示不限制)
+        """
+        if image_format not in DEBUG_FORMATS:
+            raise ValueError(f"不支援的除錯影像格式: {image_format}，支援: {', '.join(DEBUG_FORMATS)}")
+
+        self.output_dir = output_dir
+        self.image_format = image_format
+        self.max_images = max_images
+        if image_format == "jpg":
+            self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        else:
+            self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+
+        self.accepted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._feeders = []
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"debug-writer-{index}", daemon=True)
+            for index in range(max(1, int(workers)))
+        ]
+        for thread in self._workers:
+            thread.start()
+
+    def submit(self, name, render, *args, block=False):
+        """
+        提交一個除錯影像工作
+
+        參數:
+            name: 輸出檔名 (不含副檔名)
+            render: 在工作執行緒中呼叫的繪圖函式，回傳 BGR 影像或 None
+            *args: 傳給 render 的參數
+            block: 佇列已滿時是否等待 (只應在背景執行緒中使用)
+
+        回傳:
+            accepted: 是否已排入佇列 (達上限或佇列已滿時為 False)
+        """
+        with self._lock:
+            if self.max_images is not None and self.accepted >= self.max_images:
+                self.dropped += 1
+                return False
+            self.accepted += 1
+
+        try:
+            self._queue.put((name, render, args), block=block)
+        except queue.Full:
+            with self._lock:
+                self.accepted -= 1
+                self.dropped += 1
+            return False
+        return True
+
+    def submit_all(self, jobs):
+        """
+        由背景執行緒依序提交多個工作 (佇列滿時等待的是背景執行緒，不是呼叫端)
+
+        參數:
+            jobs: (name, render, args) 的可迭代物件
+        """
+        def feed():
+            for name, render, args in jobs:
+                self.submit(name, render, *args, block=True)
+
+        feeder = threading.Thread(target=feed, name="debug-feeder", daemon=True)
+        self._feeders.append(feeder)
+        feeder.start()
+
+    def _worker(self):
+        """
+        工作執行緒: 繪圖、編碼並寫入檔案
+        """
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            name, render, args = job
+            try:
+                image = render(*args)
+                if image is None:
+                    raise ValueError("無法繪製影像")
+                ok, encoded = cv2.imencode(f".{self.image_format}", image, self.encode_params)
+                if not ok:
+                    raise ValueError("影像編碼失敗")
+                with open(os.path.join(self.output_dir, f"{name}.{self.image_format}"), "wb") as f:
+                    f.write(encoded.tobytes())
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"除錯影像寫入失敗 ({name}): {e}")
+
+    def close(self):
+        """
+        等待已提交的工作完成並結束工作執行緒
+
+        回傳:
+            stats: 包含 written, dropped, failed 的字典
+        """
+        for feeder in self._feeders:
+            feeder.join()
+        for _ in self._workers:
+            self._queue.put(None)
+        for thread in self._workers:
+            thread.join()
+        return {"written": self.written, "dropped": self.dropped, "failed": self.failed}
+
+
+def render_view_debug(image_path, board_size, corners, object_points, rvec, tvec,
+                      camera_matrix, distortion_coeffs, residual_scale=RESIDUAL_SCALE):
+    """
+    繪製單一視角的標註影像
+
+    綠色為檢測角點 (OpenCV 棋盤格樣式)，紅色圓點為重投影點，
+    黃色箭頭為殘差向量 (放大 residual_scale 倍)，左上角顯示此視角的 RMS。
+
+    參數:
+        image_path: 原始影像路徑，或已編碼的影像資料 (bytes)、已解碼的影像 (壓縮檔輸入時)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        corners: 檢測到的角點 (N,1,2)
+        object_points: 棋盤格三維座標 (N,3)
+        rvec, tvec: 此視角的外參
+        camera_matrix, distortion_coeffs: 標定結果
+
+    回傳:
+        image: 標註後的 BGR 影像，無法讀取時為 None
+    """
+    if isinstance(image_path, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image_path, np.uint8), cv2.IMREAD_COLOR)
+    elif isinstance(image_path, np.ndarray):
+        image = cv2.cvtColor(image_path, cv2.COLOR_GRAY2BGR) if image_path.ndim == 2 else image_path.copy()
+    else:
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+
+    detected = np.asarray(corners, dtype=np.float32).reshape(-1, 1, 2)
+    projected, _ = cv2.projectPoints(
+        np.asarray(object_points, dtype=np.float64),
+        np.asarray(rvec, dtype=np.float64),
+        np.asarray(tvec, dtype=np.float64),
+        camera_matrix,
+        distortion_coeffs
+    )
+    detected = detected.reshape(-1, 2)
+    projected = projected.reshape(-1, 2)
+    residuals = projected - detected
+    rms = float(np.sqrt((residuals ** 2).sum(axis=1).mean()))
+
+    cv2.drawChessboardCorners(image, tuple(board_size), detected.reshape(-1, 1, 2), True)
+    for start, point, residual in zip(detected, projected, residuals):
+        end = start + residual * residual_scale
+        cv2.arrowedLine(image, tuple(int(v) for v in np.round(start)), tuple(int(v) for v in np.round(end)),
+                        (0, 255, 255), 1, cv2.LINE_AA, tipLength=0.3)
+        cv2.circle(image, tuple(int(v) for v in np.round(point)), 2, (0, 0, 255), -1, cv2.LINE_AA)
+
+    cv2.putText(image, f"RMS {rms:.3f}px  (residual x{residual_scale:g})", (10, 25),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2, cv2.LINE_AA)
+    return image
+
+
+def queue_calibration_debug(calibrator, images_folder, writer):
+    """
+    將已完成標定的所有視角排入除錯影像寫入器 (立即返回)
+
+    參數:
+        calibrator: 已完成標定的 CameraCalibration
+        images_folder: 標定影像資料夾，或壓縮檔/多頁TIFF (以視角名稱找回原始影像)
+        writer: DebugImageWriter
+    """
+    camera_matrix = calibrator.camera_matrix.copy()
+    distortion_coeffs = calibrator.distortion_coeffs.copy()
+    points = calibrator.corner_store.valid_points().copy()
+    names = calibrator.corner_store.valid_names()
+    rvecs = calibrator.rvecs.copy()
+    tvecs = calibrator.tvecs.copy()
+    object_points = calibrator.objp.copy()
+    board_size = tuple(calibrator.board_size)
+
+    # 同一張影像的第 k 個標定板命名為 "影像名稱#k"，依影像檔名分組
+    views_by_file = {}
+    for index, name in enumerate(names):
+        views_by_file.setdefault(name.split("#")[0], []).append(index)
+
+    def sources():
+        if os.path.isfile(images_folder):
+            # 壓縮檔在背景執行緒中循序重新讀取，只取出有視角的成員
+            from image_archive import read_archive_images, load_source
+            for member, source in read_archive_images(images_folder):
+                file_name = posixpath.basename(member.replace("\\", "/"))
+                if file_name in views_by_file:
+                    yield file_name, load_source(source)
+        else:
+            for file_name in list(views_by_file):
+                yield file_name, os.path.join(images_folder, file_name)
+
+    def jobs():
+        for file_name, source in sources():
+            stem = os.path.splitext(file_name)[0]
+            for index in views_by_file.pop(file_name, []):
+                suffix = names[index][len(file_name):].replace("#", "_")
+                yield (f"{stem}{suffix}_debug", render_view_debug, (
+                    source,
+                    board_size,
+                    points[index],
+                    object_points,
+                    rvecs[index],
+                    tvecs[index],
+                    camera_matrix,
+                    distortion_coeffs
+                ))
+
+    writer.submit_all(jobs())
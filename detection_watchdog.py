@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 角點檢測看門狗
+
+作者: Toby
+描述: 每個檢測工作程序一次只處理一張影像，並設有單張影像的時間上限。
+      超過時限 (例如雜亂的非標定板影像讓 findChessboardCorners 耗時數十秒)
+      或程序本身異常結束 (例如損壞的檔案讓解碼器崩潰) 的影像，
+      會終止該程序並標記失敗原因，重新啟動程序後繼續處理其餘影像；
+      最差情況的總時間為 ceil(影像數 / 程序數) x 時限
+日期: 2026/10/18
+"""
+
+import os
+import math
+import itertools
+import time
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+
+def watchdog_worker(conn, board_size, max_boards, refine_method="adaptive", raw_mode="off"):
+    """
+    檢測工作程序: 載入套件後回報就緒，接著逐一接收影像來源並回傳檢測結果
+
+    參數:
+        conn: 與主程序連接的 Pipe 端點
+        board_size: 棋盤格內角點數量 (寬, 高)
+        max_boards: 每張影像最多尋找的棋盤格數量
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        raw_mode: 原始影像輸入模式 (RAW_MODES 之一)
+    """
+    from camera_calibration import cv2, detect_boards
+    from image_archive import load_source
+
+    # 先完成 OpenCV 載入，避免載入時間算進第一張影像的時限
+    cv2.__version__
+    conn.send(("ready", None))
+    board_size = tuple(board_size)
+    while True:
+        try:
+            source = conn.recv()
+        except EOFError:
+            return
+        if source is None:
+            return
+        try:
+            # 壓縮檔成員 (bytes) 與TIFF頁面也在工作程序中解碼，解碼器崩潰同樣被隔離
+            source = load_source(source, raw_mode != "off")
+            if source is None:
+                conn.send(("done", ([], None)))
+                continue
+            boards, image_size = detect_boards(source, board_size, max_boards, refine_method, raw_mode)
+            conn.send(("done", (boards, image_size)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _WorkerSlot:
+    """
+    一個檢測工作程序與其目前的工作
+    """
+
+    def __init__(self, context, board_size, max_boards, refine_method, raw_mode):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=watchdog_worker,
+                                       args=(child_conn, board_size, max_boards, refine_method, raw_mode),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.name = None
+        self.deadline = None
+
+    def kill(self):
+        """
+        強制結束工作程序
+        """
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        """
+        通知工作程序結束 (沒有回應時強制結束)
+        """
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1.0)
+        self.kill()
+
+
+class DetectionWatchdog:
+    """
+    有時間上限與崩潰隔離的角點檢測程序池
+    """
+
+    def __init__(self, board_size, max_boards=1, timeout=10.0, workers=None, refine_method="adaptive",
+                 raw_mode="off"):
+        """
+        參數:
+            board_size: 棋盤格內角點數量 (寬, 高)
+            max_boards: 每張影像最多尋找的棋盤格數量
+            timeout: 單張影像的檢測時限 (秒)
+            workers: 工作程序數量 (None 表示CPU核心數)
+            refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+            raw_mode: 原始影像輸入模式 (RAW_MODES 之一)
+        """
+        self.board_size = tuple(board_size)
+        self.max_boards = int(max_boards)
+        self.timeout = float(timeout)
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.refine_method = refine_method
+        self.raw_mode = raw_mode
+        self.restarts = 0
+
+    def worst_case_seconds(self, image_count):
+        """
+        所有影像都用滿時限時的檢測總時間 (不含程序重新啟動的時間)
+        """
+        return math.ceil(image_count / self.workers) * self.timeout
+
+    def run(self, items, cancel_event=None):
+        """
+        檢測所有影像
+
+        參數:
+            items: (名稱, 影像來源) 的列表或產生器；影像來源為檔案路徑、已編碼的影像資料 (bytes)
+                   或 TiffPage。產生器只在有閒置程序時才取出下一項，可依先前的結果決定是否繼續
+            cancel_event: threading.Event (可選)，設定後終止所有工作程序並停止
+
+        回傳 (產生器，依完成順序):
+            (名稱, 角點座標列表, 影像尺寸, 失敗原因): 成功時失敗原因為 None
+        """
+        context = mp.get_context()
+        worker_count = min(self.workers, len(items)) if hasattr(items, "__len__") else self.workers
+        items = iter(items)
+        pending = deque()
+
+        def has_pending():
+            if not pending:
+                pending.extend(itertools.islice(items, 1))
+            return bool(pending)
+
+        slots = [_WorkerSlot(context, self.board_size, self.max_boards, self.refine_method, self.raw_mode)
+                 for _ in range(worker_count)]
+
+        try:
+            while any(slot.name is not None for slot in slots) or has_pending():
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+
+                # 把影像分派給已就緒且閒置的程序，時限從送出時開始計算
+                for slot in slots:
+                    if slot.ready and slot.name is None and has_pending():
+                        slot.name, source = pending.popleft()
+                        slot.deadline = time.monotonic() + self.timeout
+                        slot.conn.send(source)
+
+                deadlines = [slot.deadline for slot in slots if slot.name is not None]
+                wait_time = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                if cancel_event is not None:
+                    wait_time = 0.2 if wait_time is None else min(wait_time, 0.2)
+                wait([slot.conn for slot in slots] + [slot.process.sentinel for slot in slots], wait_time)
+
+                for index, slot in enumerate(slots):
+                    was_ready = slot.ready
+                    result = self._check_slot(slot)
+                    if result is not None and result is not True:
+                        yield result
+                    if slot.conn.closed:
+                        if not was_ready:
+                            raise RuntimeError(f"檢測程序無法啟動 (結束代碼 {slot.process.exitcode})")
+                        # 程序已被終止或異常結束，還有影像時重新啟動後繼續
+                        if has_pending():
+                            self.restarts += 1
+                            slots[index] = _WorkerSlot(context, self.board_size, self.max_boards,
+                                                       self.refine_method, self.raw_mode)
+                slots = [slot for slot in slots if not slot.conn.closed]
+        finally:
+            for slot in slots:
+                slot.stop()
+
+    def _check_slot(self, slot):
+        """
+        檢查單一程序的狀態
+
+        回傳:
+            None: 沒有變化
+            True: 程序已就緒 (或已結束但沒有進行中的影像)
+            (名稱, 角點座標列表, 影像尺寸, 失敗原因): 一張影像處理完成或失敗
+        """
+        message = None
+        try:
+            if slot.conn.poll():
+                message = slot.conn.recv()
+        except (EOFError, OSError):
+            message = None
+
+        if message is not None:
+            kind, payload = message
+            if kind == "ready":
+                slot.ready = True
+                return True
+            name, slot.name, slot.deadline = slot.name, None, None
+            if kind == "error":
+                return name, [], None, f"檢測錯誤 ({payload})"
+            boards, image_size = payload
+            return name, boards, image_size, None if image_size is not None else "無法讀取影像"
+
+        if not slot.process.is_alive():
+            slot.kill()
+            name, slot.name = slot.name, None
+            if name is None:
+                return True
+            return name, [], None, f"檢測程序異常結束 (結束代碼 {slot.process.exitcode})"
+
+        if slot.name is not None and time.monotonic() >= slot.deadline:
+            slot.kill()
+            name, slot.name = slot.name, None
+            return name, [], None, f"逾時 (超過 {self.timeout:g} 秒)"
+
+        return None
+
+
+def process_with_watchdog(calibrator, image_files, progress_callback=None, cancel_event=None, workers=None):
+    """
+    以看門狗程序池檢測所有影像 (CameraCalibration.process_images 在設定檢測時限時使用)
+
+    逾時、崩潰或無法讀取的影像記錄在 calibrator.detection_failures；
+    視角依影像路徑排序加入，與一般處理的順序相同。
+
+    參數:
+        calibrator: CameraCalibration 物件 (detection_timeout 必須大於0)
+        image_files: 排序後的影像路徑列表
+        progress_callback: 同 process_images
+        cancel_event: 同 process_images
+        workers: 工作程序數量 (None 表示CPU核心數)
+
+    回傳:
+        successful_images: 成功檢測到角點的影像數量
+    """
+    from camera_calibration import CalibrationCancelled
+
+    detections = {}
+    results = calibrator.iter_views([(path, path) for path in image_files], cancel_event, workers)
+    try:
+        for index, (image_path, views) in enumerate(results):
+            detections[image_path] = views
+            if progress_callback is not None:
+                progress_callback(index + 1, len(image_files), image_path, views[0][1] if views else None)
+    finally:
+        results.close()
+
+    if cancel_event is not None and cancel_event.is_set():
+        calibrator._log("影像處理已取消")
+        raise CalibrationCancelled("影像處理已取消")
+
+    for image_path in sorted(detections):
+        for view_name, corners in detections[image_path]:
+            calibrator.add_view(corners, view_name)
+
+    if calibrator.detection_failures:
+        calibrator._log(f"檢測失敗 {len(calibrator.detection_failures)} 張影像")
+    return sum(1 for views in detections.values() if views)
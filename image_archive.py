@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 壓縮檔與多頁TIFF影像來源
+
+作者: Toby
+描述: 直接從 zip/tar 壓縮檔讀取影像成員到記憶體交給 cv2.imdecode，或逐頁讀取多頁TIFF，
+      不需先解壓縮到磁碟。依儲存順序循序讀取 (壓縮的tar只能循序讀)，
+      預讀數量有上限，解碼與角點檢測交給執行緒池平行處理；
+      視角最後依成員名稱排序加入，結果與解壓縮到資料夾後處理相同
+日期: 2026/10/18
+"""
+
+import os
+import fnmatch
+import posixpath
+import tarfile
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from camera_calibration import cv2, IMAGE_EXTENSIONS, CalibrationCancelled, detect_boards, board_view_name
+
+
+# 支援的壓縮檔格式 (tar 可為 gzip/bz2/xz 壓縮)
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+# 多頁TIFF的一頁 (由工作執行緒解碼)
+TiffPage = namedtuple("TiffPage", ["path", "index"])
+
+
+def is_image_archive(path):
+    """
+    判斷路徑是否為壓縮檔或 (多頁) TIFF 檔案，資料夾回傳 False
+    """
+    if not os.path.isfile(path):
+        return False
+    return path.lower().endswith(ARCHIVE_EXTENSIONS + TIFF_EXTENSIONS)
+
+
+def is_image_member(member_name):
+    """
+    判斷壓縮檔成員是否為支援格式的影像
+
+    與 collect_image_files 的 glob 規則相同: 副檔名全小寫或全大寫，略過隱藏檔 (含 macOS 的 __MACOSX)
+    """
+    parts = member_name.replace("\\", "/").split("/")
+    base = parts[-1]
+    if not base or base.startswith(".") or "__MACOSX" in parts:
+        return False
+    return any(fnmatch.fnmatchcase(base, pattern) or fnmatch.fnmatchcase(base, pattern.upper())
+               for pattern in IMAGE_EXTENSIONS)
+
+
+def tiff_page_names(path, count):
+    """
+    多頁TIFF每一頁的名稱 (等同逐頁另存為 名稱_p001.tif ...)
+    """
+    stem, extension = os.path.splitext(os.path.basename(path))
+    width = max(3, len(str(count)))
+    return [f"{stem}_p{index + 1:0{width}d}{extension}" for index in range(count)]
+
+
+def count_archive_images(path):
+    """
+    計算壓縮檔或多頁TIFF中的影像數量
+
+    zip 與 TIFF 只讀取目錄；tar 需要掃描一次所有標頭 (壓縮的tar需要完整解壓縮一次)。
+    """
+    lower = path.lower()
+    if lower.endswith(TIFF_EXTENSIONS):
+        return int(cv2.imcount(path))
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist() if not info.is_dir() and is_image_member(info.filename))
+    with tarfile.open(path, "r|*") as archive:
+        return sum(1 for member in archive if member.isfile() and is_image_member(member.name))
+
+
+def read_archive_images(path):
+    """
+    依儲存順序逐一讀出壓縮檔中的影像
+
+    回傳 (產生器):
+        (成員名稱, 影像來源): zip/tar 為編碼後的 bytes，多頁TIFF為 TiffPage (由 load_source 解碼)
+    """
+    lower = path.lower()
+    if lower.endswith(TIFF_EXTENSIONS):
+        count = int(cv2.imcount(path))
+        for index, name in enumerate(tiff_page_names(path, count)):
+            yield name, TiffPage(path, index)
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and is_image_member(info.filename):
+                    yield info.filename, archive.read(info)
+    else:
+        # 串流模式只循序讀取一次，不在壓縮資料中來回搜尋
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and is_image_member(member.name):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def load_source(source, unchanged=False):
+    """
+    將影像來源轉為 detect_corners 可接受的形式 (TiffPage 在此解碼為BGR影像)
+
+    參數:
+        source: read_archive_images 產生的影像來源
+        unchanged: TiffPage 以原始位元深度與通道數解碼 (原始影像模式使用)
+    """
+    if isinstance(source, TiffPage):
+        # 與 cv2.imread 預設相同以彩色讀取，再由 read_gray_image 轉灰階，結果與逐頁另存的檔案一致
+        flags = cv2.IMREAD_UNCHANGED if unchanged else cv2.IMREAD_COLOR
+        ok, pages = cv2.imreadmulti(source.path, source.index, 1, flags=flags)
+        return pages[0] if ok and pages else None
+    return source
+
+
+def iter_archive_detections(path, board_size, max_boards=1, workers=None, read_ahead=8,
+                            refine_method="adaptive", raw_mode="off"):
+    """
+    循序讀取壓縮檔，平行解碼並檢測角點
+
+    主執行緒讀取下一個成員時，工作執行緒同時解碼與檢測先前的成員；
+    尚未處理完的影像最多 workers + read_ahead 張，記憶體用量與壓縮檔大小無關。
+
+    參數:
+        path: 壓縮檔或多頁TIFF路徑
+        board_size: 棋盤格內角點數量 (寬, 高)
+        max_boards: 每張影像最多尋找的棋盤格數量
+        workers: 解碼/檢測執行緒數量 (None 表示CPU核心數)
+        read_ahead: 除了正在處理的影像外，最多預先讀入的影像數量
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        raw_mode: 原始影像輸入模式 (RAW_MODES 之一)
+
+    回傳 (產生器，依讀取順序):
+        (成員名稱, 角點座標列表, 影像尺寸): 無法解碼時影像尺寸為 None
+    """
+    board_size = tuple(board_size)
+    workers = workers or os.cpu_count() or 1
+
+    def detect(source):
+        source = load_source(source, raw_mode != "off")
+        if source is None:
+            return [], None
+        return detect_boards(source, board_size, max_boards, refine_method, raw_mode)
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for name, source in read_archive_images(path):
+                pending.append((name, executor.submit(detect, source)))
+                # 預讀已滿時先取出最早的結果，讀取才繼續
+                while len(pending) > workers + read_ahead or (pending and pending[0][1].done()):
+                    name_done, future = pending.popleft()
+                    yield (name_done,) + future.result()
+            while pending:
+                name_done, future = pending.popleft()
+                yield (name_done,) + future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def iter_archive_views(calibrator, archive_path, workers=None, read_ahead=8):
+    """
+    以 iter_archive_detections 在本程序中檢測壓縮檔，產生與 CameraCalibration.iter_views 相同格式的結果
+
+    參數:
+        calibrator: CameraCalibration 物件
+        archive_path: 壓縮檔或多頁TIFF路徑
+        workers: 解碼/檢測執行緒數量 (None 表示CPU核心數)
+        read_ahead: 最多預先讀入的影像數量
+
+    回傳 (產生器，依讀取順序):
+        (成員名稱, 視角列表): 視角列表同 CameraCalibration.detect_views
+    """
+    detection_iter = iter_archive_detections(archive_path, calibrator.board_size, calibrator.max_boards,
+                                             workers=workers, read_ahead=read_ahead,
+                                             refine_method=calibrator.corner_refinement,
+                                             raw_mode=calibrator.raw_mode)
+    try:
+        for member, boards, image_size in detection_iter:
+            name = posixpath.basename(member.replace("\\", "/"))
+            if image_size is None:
+                calibrator._log(f"錯誤: 無法讀取影像 {member}")
+            else:
+                calibrator.image_size = image_size
+                if boards:
+                    suffix = f" ({len(boards)} 個標定板)" if calibrator.max_boards > 1 else ""
+                    calibrator._log(f"角點檢測成功: {name}{suffix}")
+                else:
+                    calibrator._log(f"未找到角點: {name}")
+            yield member, [(board_view_name(name, board_index), corners)
+                           for board_index, corners in enumerate(boards)]
+    finally:
+        detection_iter.close()
+
+
+def process_archive(calibrator, archive_path, progress_callback=None, cancel_event=None,
+                    workers=None, read_ahead=8):
+    """
+    處理壓縮檔或多頁TIFF中的所有影像 (CameraCalibration.process_images 遇到檔案時使用)
+
+    參數:
+        calibrator: CameraCalibration 物件
+        archive_path: 壓縮檔或多頁TIFF路徑
+        progress_callback: 同 process_images，影像路徑為 "壓縮檔路徑/成員名稱"
+        cancel_event: 同 process_images
+        workers: 解碼/檢測執行緒數量 (None 表示CPU核心數)
+        read_ahead: 最多預先讀入的影像數量
+
+    回傳:
+        成功數量與影像總數 (successful_images, total_images)
+    """
+    # 只有需要進度時才先計算總數 (tar 需要多掃描一次)
+    total = count_archive_images(archive_path) if progress_callback is not None else None
+
+    calibrator.corner_store.clear()
+    detections = {}
+
+    if calibrator.detection_timeout > 0:
+        # 每個成員在看門狗程序中解碼與檢測，逾時或崩潰的影像記錄在 detection_failures
+        detection_iter = calibrator.iter_views(read_archive_images(archive_path), cancel_event, workers)
+    else:
+        detection_iter = iter_archive_views(calibrator, archive_path, workers, read_ahead)
+    try:
+        for index, (member, views) in enumerate(detection_iter):
+            if cancel_event is not None and cancel_event.is_set():
+                calibrator._log("影像處理已取消")
+                raise CalibrationCancelled("影像處理已取消")
+
+            detections[member] = views
+            if progress_callback is not None:
+                progress_callback(index + 1, max(total, index + 1), f"{archive_path}/{member}",
+                                  views[0][1] if views else None)
+    finally:
+        detection_iter.close()
+
+    if cancel_event is not None and cancel_event.is_set():
+        calibrator._log("影像處理已取消")
+        raise CalibrationCancelled("影像處理已取消")
+
+    # 依名稱排序後加入，與解壓縮到資料夾後 (collect_image_files 排序) 的視角順序相同
+    for member in sorted(detections):
+        for view_name, corners in detections[member]:
+            calibrator.add_view(corners, view_name)
+
+    successful_images = sum(1 for views in detections.values() if views)
+    return successful_images, len(detections)
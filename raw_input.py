@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - Bayer 原始影像與高位元深度影像輸入
+
+作者: Toby
+描述: 機器視覺相機輸出的 Bayer 原始影像或16位元單色影像，不經過去馬賽克與8位元轉換：
+      Bayer 影像直接取每個2x2單元中兩個綠色像素的平均，得到半解析度的亮度影像；
+      以取樣百分位數的線性映射快速轉為8位元，只供 findChessboardCorners 檢測使用，
+      亞像素精修在保留完整位元深度的浮點亮度影像上進行，角點最後換算回全解析度座標
+日期: 2026/10/18
+"""
+
+from camera_calibration import cv2, np, find_all_chessboard_corners
+
+
+# 支援的 Bayer 排列 (感測器左上角2x2單元，依列由左至右)
+BAYER_PATTERNS = ("RGGB", "BGGR", "GRBG", "GBRG")
+
+# 8位元映射: 取樣亮度的百分位數對應到 0 與 255，超出範圍的像素飽和
+TONE_MAP_PERCENTILES = (0.5, 99.5)
+TONE_MAP_SAMPLE_STEP = 8
+
+
+def read_raw_image(source):
+    """
+    以原始位元深度讀取影像 (不做8位元轉換)
+
+    參數:
+        source: 影像檔案路徑、已編碼的影像資料 (bytes)，或已解碼的影像 (numpy陣列)
+
+    回傳:
+        raw: 單通道影像 (uint8/uint16/float)，彩色影像轉為相同位元深度的灰階；無法讀取時為 None
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        raw = cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_UNCHANGED)
+    elif isinstance(source, np.ndarray):
+        raw = source
+    else:
+        raw = cv2.imread(source, cv2.IMREAD_UNCHANGED)
+    if raw is None:
+        return None
+    if raw.ndim == 3:
+        # 已去馬賽克的彩色影像 (例如相機已輸出RGB)
+        code = cv2.COLOR_BGRA2GRAY if raw.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        raw = cv2.cvtColor(raw, code)
+    return raw
+
+
+def green_sites(pattern):
+    """
+    2x2單元中兩個綠色像素的位置
+
+    回傳:
+        sites: [(列, 行), (列, 行)]
+    """
+    return [divmod(index, 2) for index, color in enumerate(pattern) if color == "G"]
+
+
+def raw_luminance(raw, raw_mode):
+    """
+    由原始影像產生亮度影像 (float32，保留完整位元深度)
+
+    Bayer 模式下兩個綠色像素永遠位於2x2單元的對角，平均值的位置為單元中心，
+    半解析度像素 (i, j) 對應全解析度座標 (2j + 0.5, 2i + 0.5)。
+
+    參數:
+        raw: read_raw_image 讀取的單通道影像
+        raw_mode: "mono" 或 BAYER_PATTERNS 之一
+
+    回傳:
+        luma: 亮度影像 (float32)
+        binned: 是否為半解析度 (角點需以 to_full_resolution 換算)
+    """
+    if raw_mode not in BAYER_PATTERNS:
+        return raw.astype(np.float32), False
+
+    (r0, c0), (r1, c1) = green_sites(raw_mode)
+    height, width = raw.shape[0] // 2 * 2, raw.shape[1] // 2 * 2
+    luma = raw[r0:height:2, c0:width:2].astype(np.float32)
+    luma += raw[r1:height:2, c1:width:2]
+    luma *= 0.5
+    return luma, True
+
+
+def tone_map_8bit(luma):
+    """
+    快速轉為8位元檢測影像
+
+    只在稀疏取樣上計算百分位數，再以一次線性映射轉換整張影像；
+    10/12位元資料存放於16位元容器時也能使用完整的8位元範圍。
+    """
+    low, high = np.percentile(luma[::TONE_MAP_SAMPLE_STEP, ::TONE_MAP_SAMPLE_STEP], TONE_MAP_PERCENTILES)
+    scale = 255.0 / max(float(high - low), 1e-6)
+    mapped = np.subtract(luma, low, dtype=np.float32)
+    mapped *= scale
+    np.clip(mapped, 0, 255, out=mapped)
+    return mapped.astype(np.uint8)
+
+
+def to_full_resolution(corners):
+    """
+    半解析度 (綠色像素平均) 座標換算為全解析度座標
+    """
+    return (corners.reshape(-1, 1, 2) * 2.0 + 0.5).astype(np.float32)
+
+
+def raw_detection_image(source, raw_mode):
+    """
+    產生8位元檢測影像 (自動偵測內角點數量等只需檢測影像時使用)
+
+    回傳:
+        detect: 8位元灰階影像 (Bayer 模式為半解析度)，無法讀取時為 None
+    """
+    raw = read_raw_image(source)
+    if raw is None:
+        return None
+    luma, _ = raw_luminance(raw, raw_mode)
+    return tone_map_8bit(luma)
+
+
+def detect_raw_corners(source, board_size, raw_mode, refine_method="adaptive", max_boards=1):
+    """
+    讀取原始影像並檢測棋盤格角點
+
+    參數:
+        source: 影像檔案路徑、已編碼的影像資料 (bytes)，或已解碼的影像 (numpy陣列)
+        board_size: 棋盤格內角點數量 (寬, 高)
+        raw_mode: "mono" 或 BAYER_PATTERNS 之一
+        refine_method: 亞像素精修方式 (REFINE_METHODS 之一)
+        max_boards: 最多尋找的棋盤格數量
+
+    回傳:
+        boards: 全解析度的角點座標 (N,1,2) 列表，未找到時為空列表
+        image_size: 原始影像尺寸 (寬度, 高度)，無法讀取時為 None
+    """
+    raw = read_raw_image(source)
+    if raw is None:
+        return [], None
+
+    luma, binned = raw_luminance(raw, raw_mode)
+    detect = tone_map_8bit(luma)
+    boards = find_all_chessboard_corners(detect, tuple(board_size), max_boards, refine_method, refine_image=luma)
+    if binned:
+        boards = [to_full_resolution(corners) for corners in boards]
+    return boards, (raw.shape[1], raw.shape[0])
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 縮圖瀏覽
+
+作者: Toby
+描述: 於背景執行緒產生標定影像縮圖 (含角點與檢測結果標記)，以記憶體LRU快取與磁碟快取加速瀏覽
+日期: 2026/10/18
+"""
+
+import os
+import math
+import queue
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import tkinter as tk
+from tkinter import ttk
+
+from camera_calibration import cv2, np
+
+
+# 縮圖尺寸與格子配置 (像素)
+THUMB_WIDTH = 160
+THUMB_HEIGHT = 120
+CELL_PADDING = 8
+LABEL_HEIGHT = 18
+CELL_WIDTH = THUMB_WIDTH + CELL_PADDING
+CELL_HEIGHT = THUMB_HEIGHT + LABEL_HEIGHT + CELL_PADDING
+
+# 快取數量上限
+PHOTO_CACHE_SIZE = 200   # 主執行緒中的 PhotoImage
+BASE_CACHE_SIZE = 100    # 背景執行緒中尚未加上標記的縮圖
+
+# 檢測狀態
+STATE_PENDING = "pending"
+STATE_OK = "ok"
+STATE_FAIL = "fail"
+
+
+class LRUCache:
+    """
+    有數量上限的LRU快取 (執行緒安全)
+    """
+
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class ThumbnailRenderer:
+    """
+    背景縮圖產生器
+
+    以縮小解碼讀取影像並存入磁碟快取，再依檢測結果畫上角點與標記，
+    產生的PNG資料放入結果佇列，由主執行緒建立 PhotoImage。
+    """
+
+    def __init__(self, cache_dir, workers=2):
+        """
+        初始化縮圖產生器
+
+        參數:
+            cache_dir: 磁碟快取資料夾
+            workers: 背景執行緒數量
+        """
+        self.cache_dir = cache_dir
+        self.results = queue.Queue()
+        self.base_cache = LRUCache(BASE_CACHE_SIZE)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def submit(self, key, image_path, state, corners, image_size, is_wanted):
+        """
+        排入縮圖產生工作
+
+        參數:
+            key: 結果識別鍵
+            image_path: 影像路徑
+            state: 檢測狀態 (pending / ok / fail)
+            corners: 角點座標 (原始影像像素座標，可為 None)
+            image_size: 原始影像尺寸 (寬, 高)
+            is_wanted: 回傳該縮圖是否仍需要的函式，捲動離開後的工作會直接略過
+        """
+        self.executor.submit(self._render, key, image_path, state, corners, image_size, is_wanted)
+
+    def shutdown(self):
+        """
+        停止背景執行緒
+        """
+        self.executor.shutdown(wait=False)
+
+    def _disk_cache_path(self, image_path):
+        """
+        取得影像對應的磁碟快取路徑 (檔案修改後自動失效)
+        """
+        stat = os.stat(image_path)
+        signature = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{THUMB_WIDTH}x{THUMB_HEIGHT}"
+        digest = hashlib.sha1(signature.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.png")
+
+    def base_thumbnail(self, image_path):
+        """
+        取得未加標記的縮圖 (記憶體快取 → 磁碟快取 → 縮小解碼)
+
+        參數:
+            image_path: 影像路徑
+
+        回傳:
+            thumb: BGR縮圖，讀取失敗時為 None
+        """
+        thumb = self.base_cache.get(image_path)
+        if thumb is not None:
+            return thumb
+
+        cache_path = self._disk_cache_path(image_path)
+        if os.path.exists(cache_path):
+            thumb = cv2.imread(cache_path)
+
+        if thumb is None:
+            # 縮小解碼，大檔案直接以1/8解析度解碼
+            reduce_flag = cv2.IMREAD_REDUCED_COLOR_8 if os.path.getsize(image_path) > 4 * 1024 * 1024 \
+                else cv2.IMREAD_REDUCED_COLOR_4
+            img = cv2.imread(image_path, reduce_flag)
+            if img is None:
+                return None
+
+            scale = min(THUMB_WIDTH / img.shape[1], THUMB_HEIGHT / img.shape[0])
+            size = (max(1, int(img.shape[1] * scale)), max(1, int(img.shape[0] * scale)))
+            thumb = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+            # 先寫暫存檔再取代，避免其他執行緒讀到不完整的檔案
+            ok, buffer = cv2.imencode(".png", thumb)
+            if ok:
+                temp_path = cache_path + f".{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(buffer.tobytes())
+                os.replace(temp_path, cache_path)
+
+        self.base_cache.put(image_path, thumb)
+        return thumb
+
+    def _render(self, key, image_path, state, corners, image_size, is_wanted):
+        """
+        產生縮圖 (背景執行緒)，無論成功與否都會放入一筆結果
+        """
+        data = None
+        try:
+            if is_wanted(key):
+                data = self._render_png(image_path, state, corners, image_size)
+        except Exception as e:
+            print(f"縮圖產生錯誤 {os.path.basename(image_path)}: {e}")
+        finally:
+            self.results.put((key, data))
+
+    def _render_png(self, image_path, state, corners, image_size):
+        """
+        產生加上角點與檢測標記的縮圖
+
+        回傳:
+            data: base64編碼的PNG資料
+        """
+        try:
+            base = self.base_thumbnail(image_path)
+        except (OSError, cv2.error):
+            base = None
+
+        if base is None:
+            # 無法讀取的影像以灰底顯示
+            thumb = np.full((THUMB_HEIGHT // 2, THUMB_WIDTH, 3), 80, np.uint8)
+            state = STATE_FAIL
+        else:
+            thumb = base.copy()
+
+        if state == STATE_OK and corners is not None and image_size:
+            scale = thumb.shape[1] / image_size[0]
+            points = np.round(np.asarray(corners, dtype=np.float32).reshape(-1, 2) * scale).astype(np.int32)
+            # 縮圖上以細線連接角點順序，並以小圓點標示角點位置
+            cv2.polylines(thumb, [points.reshape(-1, 1, 2)], False, (0, 200, 255), 1, cv2.LINE_AA)
+            for x, y in points:
+                cv2.circle(thumb, (int(x), int(y)), 2, (0, 0, 255), -1, cv2.LINE_AA)
+
+        if state != STATE_PENDING:
+            color = (60, 170, 60) if state == STATE_OK else (50, 50, 220)
+            text = "OK" if state == STATE_OK else "NG"
+            cv2.rectangle(thumb, (0, 0), (30, 16), color, -1)
+            cv2.putText(thumb, text, (4, 13), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+
+        ok, buffer = cv2.imencode(".png", thumb)
+        return base64.b64encode(buffer.tobytes()).decode('ascii') if ok else None
+
+
+class ThumbnailPanel(ttk.Frame):
+    """
+    縮圖瀏覽面板
+
+    只為可見範圍內的影像產生縮圖，PhotoImage 以LRU快取保留，
+    捲動數百張影像時不會阻塞介面。
+    """
+
+    def __init__(self, parent, cache_dir):
+        """
+        初始化縮圖面板
+
+        參數:
+            parent: 父元件
+            cache_dir: 縮圖磁碟快取資料夾
+        """
+        super().__init__(parent)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.summary_label = ttk.Label(self, text="", font=('Microsoft YaHei', 9))
+        self.summary_label.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
+
+        self.canvas = tk.Canvas(self, background="#f0f0f0", highlightthickness=0)
+        self.canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        scrollbar.grid(row=1, column=1, sticky=(tk.N, tk.S))
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self._scroll(-1))
+        self.canvas.bind("<Button-5>", lambda event: self._scroll(1))
+
+        self.renderer = ThumbnailRenderer(cache_dir)
+        self.photo_cache = LRUCache(PHOTO_CACHE_SIZE)
+        self.items = []          # 每張影像: {"path", "state", "corners"}
+        self.index = {}          # 影像路徑 -> items 索引
+        self.image_size = None
+        self.requested = set()   # 已排入產生工作的鍵
+        self.wanted = set()      # 目前可見範圍內的鍵
+        self.generation = 0      # 每次重設影像或檢測結果時遞增，舊的縮圖不再使用
+        self.columns = 1
+
+        self.bind("<Destroy>", lambda event: self.renderer.shutdown() if event.widget is self else None)
+        self._poll_results()
+
+    def set_images(self, image_paths):
+        """
+        設定要顯示的影像 (全部重設為未檢測)
+
+        參數:
+            image_paths: 影像路徑列表
+        """
+        self._new_generation()
+        self.items = [{"path": path, "state": STATE_PENDING, "corners": None} for path in image_paths]
+        self.index = {path: i for i, path in enumerate(image_paths)}
+        self.canvas.yview_moveto(0)
+        self._update_summary()
+        self.refresh()
+
+    def add_image(self, image_path):
+        """
+        加入一張影像 (已存在時不處理)
+
+        參數:
+            image_path: 影像路徑
+        """
+        if image_path in self.index:
+            return
+        self.index[image_path] = len(self.items)
+        self.items.append({"path": image_path, "state": STATE_PENDING, "corners": None})
+        self._update_summary()
+        self.refresh()
+
+    def reset_states(self):
+        """
+        將所有影像重設為未檢測
+        """
+        self._new_generation()
+        for item in self.items:
+            item["state"] = STATE_PENDING
+            item["corners"] = None
+        self._update_summary()
+        self.refresh()
+
+    def set_result(self, image_path, corners, image_size):
+        """
+        更新單張影像的檢測結果
+
+        參數:
+            image_path: 影像路徑
+            corners: 角點座標 (未找到角點為 None)
+            image_size: 原始影像尺寸 (寬, 高)
+        """
+        i = self.index.get(image_path)
+        if i is None:
+            return
+        self.items[i]["state"] = STATE_OK if corners is not None else STATE_FAIL
+        self.items[i]["corners"] = corners
+        self.image_size = image_size
+        self._update_summary()
+        if self._is_visible(i):
+            self.refresh()
+
+    def _update_summary(self):
+        passed = sum(1 for item in self.items if item["state"] == STATE_OK)
+        failed = sum(1 for item in self.items if item["state"] == STATE_FAIL)
+        self.summary_label.config(text=f"共 {len(self.items)} 張  ✅ 通過 {passed}  ❌ 失敗 {failed}")
+
+    def _new_generation(self):
+        """
+        捨棄先前產生的縮圖 (影像檔案可能已被覆寫，角點也會重新檢測)
+
+        尚在產生中的舊工作完成後只會放入舊的鍵，不會顯示出來。
+        """
+        self.generation += 1
+        self.photo_cache.clear()
+        self.requested.clear()
+        self.renderer.base_cache.clear()
+
+    def _key(self, item):
+        return (self.generation, item["path"], item["state"])
+
+    def _visible_range(self):
+        """
+        計算可見範圍內的影像索引 (前後各多一列)
+        """
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // CELL_HEIGHT) - 1)
+        last_row = int(bottom // CELL_HEIGHT) + 1
+        return range(first_row * self.columns, min(len(self.items), (last_row + 1) * self.columns))
+
+    def _is_visible(self, i):
+        return i in self._visible_range()
+
+    def refresh(self):
+        """
+        重新繪製可見範圍內的縮圖，缺少的縮圖排入背景產生
+        """
+        width = max(self.canvas.winfo_width(), CELL_WIDTH)
+        self.columns = max(1, width // CELL_WIDTH)
+        rows = math.ceil(len(self.items) / self.columns)
+        self.canvas.configure(scrollregion=(0, 0, width, rows * CELL_HEIGHT))
+        self.canvas.delete("cell")
+
+        visible = self._visible_range()
+        self.wanted = {self._key(self.items[i]) for i in visible}
+
+        for i in visible:
+            item = self.items[i]
+            key = self._key(item)
+            x = (i % self.columns) * CELL_WIDTH + CELL_PADDING // 2
+            y = (i // self.columns) * CELL_HEIGHT + CELL_PADDING // 2
+
+            photo = self.photo_cache.get(key)
+            if photo is not None:
+                self.canvas.create_image(x, y, image=photo, anchor=tk.NW, tags="cell")
+            else:
+                self.canvas.create_rectangle(x, y, x + THUMB_WIDTH, y + THUMB_HEIGHT,
+                                             outline="#cccccc", fill="#e4e4e4", tags="cell")
+                if key not in self.requested:
+                    self.requested.add(key)
+                    self.renderer.submit(key, item["path"], item["state"], item["corners"],
+                                         self.image_size, lambda key: key in self.wanted)
+
+            self.canvas.create_text(x, y + THUMB_HEIGHT + 2, text=os.path.basename(item["path"]),
+                                    anchor=tk.NW, font=('Consolas', 8), tags="cell")
+
+    def _poll_results(self):
+        """
+        取出背景產生的縮圖並建立 PhotoImage (主執行緒)
+        """
+        updated = False
+        try:
+            while True:
+                key, data = self.renderer.results.get_nowait()
+                self.requested.discard(key)
+                if data is not None:
+                    self.photo_cache.put(key, tk.PhotoImage(data=data, format="png"))
+                    updated = updated or key in self.wanted
+        except queue.Empty:
+            pass
+
+        if updated:
+            self.refresh()
+        self.after(30, self._poll_results)
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+
+    def _scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self.refresh()
+
+    def _on_mousewheel(self, event):
+        self._scroll(-1 if event.delta > 0 else 1)
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相機內參標定工具 - 去畸變查表
+
+作者: Toby
+描述: 由標定結果預先計算像素 -> 去畸變正規化座標 (光線方向) 的密集查表，
+      以雙線性內插批次查詢，取代每次都需迭代求反函數的 cv2.undistortPoints
+日期: 2026/10/18
+
+查表存為 .npy (可直接以 memmap 開啟)，放在結果JSON旁，
+查表參數與最大內插誤差記錄在結果JSON的 "去畸變查表" 欄位。
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+
+try:
+    from camera_calibration import cv2, np, load_calibration_result
+except ImportError as e:
+    print(f"導入錯誤: {e}")
+    print("請確保已安裝 opencv-python 和 numpy，並且 camera_calibration.py 存在")
+    sys.exit(1)
+
+
+# 預設的查表節點間距 (像素)
+DEFAULT_STEP = 8
+
+# 批次查詢時每次處理的點數
+LOOKUP_BLOCK = 8192
+
+# 牛頓法單步的最大變化量 (正規化座標)
+MAX_NEWTON_STEP = 0.05
+
+
+def distort_normalized(normalized, camera_matrix, distortion_coeffs):
+    """
+    正規化座標 -> 像素座標 (畸變模型的正向計算)
+
+    參數:
+        normalized: (N, 2) 去畸變正規化座標
+
+    回傳:
+        pixels: (N, 2) 像素座標
+    """
+    normalized = np.asarray(normalized, dtype=np.float64).reshape(-1, 2)
+    points = np.concatenate([normalized, np.ones((len(normalized), 1))], axis=1).reshape(-1, 1, 3)
+    zero = np.zeros(3)
+    pixels, _ = cv2.projectPoints(points, zero, zero, camera_matrix, distortion_coeffs)
+    return pixels.reshape(-1, 2)
+
+
+def exact_undistort(points, camera_matrix, distortion_coeffs, tolerance=1e-9, max_iterations=20):
+    """
+    精確計算去畸變正規化座標
+
+    cv2.undistortPoints 的定點迭代在畸變較大 (例如12、14項模型的影像邊緣) 時可能不收斂，
+    因此以其結果為初始值，再以正向模型做牛頓法修正，直到重投影誤差小於 tolerance。
+
+    參數:
+        points: (N, 2) 像素座標
+        tolerance: 收斂條件 (像素)
+        max_iterations: 牛頓法最多迭代次數
+
+    回傳:
+        normalized: (N, 2) 去畸變正規化座標 (光線方向為 (x, y, 1))
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    normalized = cv2.undistortPoints(points.reshape(-1, 1, 2), camera_matrix, distortion_coeffs).reshape(-1, 2)
+
+    # 定點迭代發散的點改以不含畸變的座標作為初始值
+    linear = (points - camera_matrix[:2, 2]) / np.diag(camera_matrix)[:2]
+    with np.errstate(invalid='ignore', over='ignore'):
+        error = np.hypot(*(distort_normalized(normalized, camera_matrix, distortion_coeffs) - points).T)
+        linear_error = np.hypot(*(distort_normalized(linear, camera_matrix, distortion_coeffs) - points).T)
+    use_linear = ~(error <= linear_error)
+    normalized[use_linear] = linear[use_linear]
+
+    active = np.arange(len(points))
+    eps = 1e-7
+    for _ in range(max_iterations):
+        current = normalized[active]
+        base = distort_normalized(current, camera_matrix, distortion_coeffs)
+        residual = base - points[active]
+        converged = np.hypot(residual[:, 0], residual[:, 1]) < tolerance
+        if converged.all():
+            break
+        active, current, base, residual = active[~converged], current[~converged], base[~converged], residual[~converged]
+
+        # 數值微分求 2x2 Jacobian，逐點解線性方程式
+        jx = (distort_normalized(current + [eps, 0.0], camera_matrix, distortion_coeffs) - base) / eps
+        jy = (distort_normalized(current + [0.0, eps], camera_matrix, distortion_coeffs) - base) / eps
+        det = jx[:, 0] * jy[:, 1] - jy[:, 0] * jx[:, 1]
+        # 畸變模型不可逆之處 (det 為 0) 保留目前的值
+        det = np.where(np.abs(det) > 1e-12, det, np.inf)
+        dx = (jy[:, 1] * residual[:, 0] - jy[:, 0] * residual[:, 1]) / det
+        dy = (jx[:, 0] * residual[:, 1] - jx[:, 1] * residual[:, 0]) / det
+        delta = np.stack([dx, dy], axis=1)
+
+        # 限制步長，並只接受使誤差變小的步驟，避免在模型的奇異點附近發散
+        length = np.hypot(dx, dy)[:, None]
+        delta *= np.minimum(1.0, MAX_NEWTON_STEP / np.maximum(length, 1e-300))
+        candidate = current - delta
+        new_residual = distort_normalized(candidate, camera_matrix, distortion_coeffs) - points[active]
+        improved = np.hypot(new_residual[:, 0], new_residual[:, 1]) < np.hypot(residual[:, 0], residual[:, 1])
+        normalized[active[improved]] = candidate[improved]
+        active = active[improved]
+        if len(active) == 0:
+            break
+
+    return normalized
+
+
+class UndistortLUT:
+    """
+    去畸變查表
+
+    節點位於像素座標 (0, step, 2*step, ...)，涵蓋整張影像；
+    查詢時以雙線性內插計算，整批點一次完成。
+    """
+
+    def __init__(self, table, step, image_size):
+        """
+        參數:
+            table: (節點列數, 節點行數, 2) float32 正規化座標
+            step: 節點間距 (像素)
+            image_size: 影像尺寸 (寬度, 高度)
+        """
+        self.table = table
+        self.step = float(step)
+        self.image_size = tuple(image_size)
+
+    @classmethod
+    def build(cls, camera_matrix, distortion_coeffs, image_size, step=DEFAULT_STEP):
+        """
+        由內參與畸變係數建立查表
+
+        參數:
+            camera_matrix: 相機內參矩陣
+            distortion_coeffs: 畸變係數
+            image_size: 影像尺寸 (寬度, 高度)
+            step: 節點間距 (像素)，越小越精確但查表越大
+        """
+        width, height = image_size
+        columns = int(np.ceil((width - 1) / step)) + 1
+        rows = int(np.ceil((height - 1) / step)) + 1
+        grid_x, grid_y = np.meshgrid(np.arange(columns) * step, np.arange(rows) * step)
+        nodes = np.stack([grid_x, grid_y], axis=-1).reshape(-1, 2)
+
+        table = exact_undistort(nodes, camera_matrix, distortion_coeffs)
+        return cls(table.reshape(rows, columns, 2).astype(np.float32), step, image_size)
+
+    @classmethod
+    def load(cls, lut_path, step, image_size, mmap=True):
+        """
+        讀取查表檔案
+
+        參數:
+            lut_path: .npy 檔案路徑
+            step: 節點間距 (像素)
+            image_size: 影像尺寸 (寬度, 高度)
+            mmap: 是否以 memmap 開啟 (多個程序可共用同一份記憶體)
+        """
+        table = np.load(lut_path, mmap_mode='r' if mmap else None)
+        return cls(table, step, image_size)
+
+    @classmethod
+    def from_result(cls, result_path, mmap=True):
+        """
+        依結果JSON中記錄的查表資訊讀取查表
+
+        參數:
+            result_path: 標定結果JSON檔案路徑
+        """
+        with open(result_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)["去畸變查表"]
+        lut_path = os.path.join(os.path.dirname(os.path.abspath(result_path)), info["檔案"])
+        return cls.load(lut_path, info["節點間距_像素"], info["影像尺寸"], mmap)
+
+    def save(self, lut_path):
+        """
+        儲存查表 (.npy)
+        """
+        np.save(lut_path, np.ascontiguousarray(self.table))
+
+    def lookup(self, points, out=None):
+        """
+        批次查詢去畸變正規化座標
+
+        參數:
+            points: (N, 2) 像素座標 (超出影像範圍的點以邊緣節點外插)
+            out: 輸出陣列 (N, 2) float32 (可選，重複使用以避免配置記憶體)
+
+        回傳:
+            normalized: (N, 2) float32 去畸變正規化座標，光線方向為 (x, y, 1)
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        if out is None:
+            out = np.empty_like(points)
+
+        # 分塊處理，讓中間陣列留在CPU快取中
+        for start in range(0, len(points), LOOKUP_BLOCK):
+            block = slice(start, start + LOOKUP_BLOCK)
+            out[block] = self._lookup_block(points[block])
+        return out
+
+    def _lookup_block(self, points):
+        rows, columns = self.table.shape[:2]
+        flat = self.table.reshape(-1, 2)
+
+        scale = np.float32(1.0 / self.step)
+        gx = points[:, 0] * scale
+        gy = points[:, 1] * scale
+        ix = np.clip(np.floor(gx).astype(np.int32), 0, columns - 2)
+        iy = np.clip(np.floor(gy).astype(np.int32), 0, rows - 2)
+        tx = (gx - ix)[:, None]
+        ty = (gy - iy)[:, None]
+
+        # 以一維索引取出四個相鄰節點 (np.take 比多維花式索引快)
+        index = iy * columns + ix
+        p00 = np.take(flat, index, axis=0)
+        p01 = np.take(flat, index + 1, axis=0)
+        p10 = np.take(flat, index + columns, axis=0)
+        p11 = np.take(flat, index + columns + 1, axis=0)
+        top = p00 + (p01 - p00) * tx
+        bottom = p10 + (p11 - p10) * tx
+        return top + (bottom - top) * ty
+
+    def lookup_rays(self, points):
+        """
+        批次查詢單位光線方向
+
+        回傳:
+            rays: (N, 3) 單位向量
+        """
+        normalized = self.lookup(points)
+        rays = np.concatenate([normalized, np.ones((len(normalized), 1), dtype=normalized.dtype)], axis=1)
+        return rays / np.linalg.norm(rays, axis=1, keepdims=True)
+
+    def max_error(self, camera_matrix, distortion_coeffs, samples=200000, seed=0):
+        """
+        估計內插誤差
+
+        在每個網格中心 (雙線性內插誤差最大處) 與隨機位置比較查表與精確值，
+        正規化座標的差異乘上焦距換算為 (去畸變影像上的) 像素。
+
+        回傳:
+            max_error: 最大誤差 (像素)
+            mean_error: 平均誤差 (像素)
+        """
+        width, height = self.image_size
+        rows, columns = self.table.shape[:2]
+        centers_x, centers_y = np.meshgrid((np.arange(columns - 1) + 0.5) * self.step,
+                                           (np.arange(rows - 1) + 0.5) * self.step)
+        centers = np.stack([centers_x, centers_y], axis=-1).reshape(-1, 2)
+        random_points = np.random.default_rng(seed).uniform((0, 0), (width - 1, height - 1), (samples, 2))
+        points = np.concatenate([centers, random_points])
+        points = points[(points[:, 0] <= width - 1) & (points[:, 1] <= height - 1)]
+
+        difference = self.lookup(points) - exact_undistort(points, camera_matrix, distortion_coeffs)
+        pixel_error = np.hypot(difference[:, 0] * camera_matrix[0, 0], difference[:, 1] * camera_matrix[1, 1])
+        return float(pixel_error.max()), float(pixel_error.mean())
+
+
+def generate_for_result(result_path, step=DEFAULT_STEP, image_size=None):
+    """
+    為標定結果產生查表，存在結果JSON旁並將查表資訊寫回結果JSON
+
+    參數:
+        result_path: 標定結果JSON檔案路徑
+        step: 節點間距 (像素)
+        image_size: 影像尺寸 (結果檔案未記錄影像尺寸時必須提供)
+
+    回傳:
+        lut: UndistortLUT
+        info: 寫入結果JSON的查表資訊
+    """
+    camera_matrix, distortion_coeffs, calibration_data = load_calibration_result(result_path)
+    image_size = image_size or calibration_data.get("影像尺寸")
+    if image_size is None:
+        raise ValueError("結果檔案未記錄影像尺寸，請以 --size 指定")
+
+    start_time = time.perf_counter()
+    lut = UndistortLUT.build(camera_matrix, distortion_coeffs, image_size, step)
+    build_seconds = time.perf_counter() - start_time
+    max_error, mean_error = lut.max_error(camera_matrix, distortion_coeffs)
+
+    lut_name = os.path.splitext(os.path.basename(result_path))[0] + "_lut.npy"
+    lut.save(os.path.join(os.path.dirname(os.path.abspath(result_path)), lut_name))
+
+    info = {
+        "檔案": lut_name,
+        "影像尺寸": [int(image_size[0]), int(image_size[1])],
+        "節點間距_像素": step,
+        "節點數量": [int(lut.table.shape[1]), int(lut.table.shape[0])],
+        "最大內插誤差_像素": max_error,
+        "平均內插誤差_像素": mean_error,
+        "內容": "每個節點為去畸變正規化座標 (x, y)，光線方向為 (x, y, 1)，以雙線性內插查詢"
+    }
+    calibration_data["去畸變查表"] = info
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(calibration_data, f, ensure_ascii=False, indent=4)
+
+    print(f"查表建立完成 ({build_seconds:.2f} 秒): {info['節點數量'][0]}x{info['節點數量'][1]} 個節點")
+    print(f"最大內插誤差: {max_error:.5f} 像素，平均: {mean_error:.5f} 像素")
+    return lut, info
+
+
+def benchmark(lut, camera_matrix, distortion_coeffs, count=1000000):
+    """
+    比較查表與 cv2.undistortPoints 的處理速度與誤差
+    """
+    width, height = lut.image_size
+    points = np.random.default_rng(1).uniform((0, 0), (width - 1, height - 1), (count, 2)).astype(np.float32)
+
+    exact = exact_undistort(points, camera_matrix, distortion_coeffs)
+    focal = np.array([camera_matrix[0, 0], camera_matrix[1, 1]])
+
+    def measure(function):
+        start_time = time.perf_counter()
+        normalized = function().reshape(-1, 2)
+        seconds = time.perf_counter() - start_time
+        error = np.hypot(*((normalized - exact) * focal).T)
+        return seconds, float(np.nanmax(error))
+
+    criteria = (cv2.TERM_CRITERIA_COUNT | cv2.TERM_CRITERIA_EPS, 20, 1e-9)
+    results = [
+        ("cv2.undistortPoints (預設5次迭代)",
+         measure(lambda: cv2.undistortPoints(points.reshape(-1, 1, 2), camera_matrix, distortion_coeffs))),
+        ("cv2.undistortPoints (20次迭代)",
+         measure(lambda: cv2.undistortPoints(points.reshape(-1, 1, 2), camera_matrix, distortion_coeffs,
+                                             criteria=criteria) if not hasattr(cv2, "undistortPointsIter") else
+                 cv2.undistortPointsIter(points.reshape(-1, 1, 2), camera_matrix, distortion_coeffs,
+                                         None, None, criteria))),
+        ("查表", measure(lambda: lut.lookup(points)))
+    ]
+
+    print(f"\n{count} 個點的處理時間與最大誤差:")
+    for name, (seconds, error) in results:
+        print(f"  {name}: {seconds * 1000:.1f} ms，最大誤差 {error:.4f} 像素")
+
+
+def main():
+    """
+    查表產生主程式
+    """
+    parser = argparse.ArgumentParser(description="由標定結果產生去畸變查表")
+    parser.add_argument("result", help="標定結果JSON檔案")
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP, help="節點間距 (像素，預設8)")
+    parser.add_argument("--size", help="影像尺寸 寬x高 (結果檔案未記錄影像尺寸時使用)，例如 1920x1080")
+    parser.add_argument("--benchmark", action="store_true", help="與 cv2.undistortPoints 比較速度")
+    args = parser.parse_args()
+
+    image_size = None
+    if args.size:
+        image_size = [int(v) for v in args.size.lower().split("x")]
+
+    try:
+        lut, info = generate_for_result(args.result, args.step, image_size)
+    except (ValueError, KeyError, FileNotFoundError) as e:
+        print(f"錯誤: {e}")
+        return
+
+    print(f"查表已儲存至: {info['檔案']}")
+
+    if args.benchmark:
+        camera_matrix, distortion_coeffs, _ = load_calibration_result(args.result)
+        benchmark(lut, camera_matrix, distortion_coeffs)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print(f"\n\n程式被使用者中斷")